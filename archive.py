@@ -0,0 +1,136 @@
+"""Move appointments older than a horizon from the live table into appointments_archive.
+
+    python archive.py --horizon-days 365 --batch-size 1000 --pause 0.05
+
+Rows move in batches of one short transaction each, oldest first, so live
+traffic only ever waits on a small batch. Every batch is complete or not applied
+at all, and the next run starts from whatever is still older than the horizon:
+an interrupted run just needs to be started again. Queries that need history
+(full history listings, exports, get_many) read the appointments_history view,
+which unions both tables.
+
+Cancelling an appointment never touches the archive. Archived rows are only
+removed by an explicit purge, in the same kind of batches:
+
+    python archive.py --purge --horizon-days 3650
+
+The search indexes' change log (repositories.prune_search_changes) is trimmed the
+same way; an index that had not caught up with the pruned entries rebuilds:
+
+    python archive.py --search-log --horizon-days 7
+"""
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from repositories import AppointmentRepository, prune_search_changes
+
+DEFAULT_HORIZON_DAYS = int(os.getenv('ARCHIVE_HORIZON_DAYS', '365'))
+DEFAULT_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+
+
+@dataclass
+class ArchiveReport:
+    cutoff: datetime
+    rows_moved: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows_moved / self.elapsed if self.elapsed else 0.0
+
+
+def _run_batches(step: Callable[[datetime, int], list], horizon_days: int, batch_size: int, pause: float,
+                 max_batches: Optional[int], now: Optional[datetime],
+                 progress: Optional[Callable[[ArchiveReport], None]]) -> ArchiveReport:
+    if batch_size < 1:
+        raise ValueError('batch_size must be at least 1')
+    report = ArchiveReport((now or datetime.now()) - timedelta(days=horizon_days))
+    started = time.perf_counter()
+    while max_batches is None or report.batches < max_batches:
+        moved = step(report.cutoff, batch_size)
+        if not moved:
+            break
+        report.rows_moved += len(moved)
+        report.batches += 1
+        report.elapsed = time.perf_counter() - started
+        if progress:
+            progress(report)
+        if len(moved) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def archive_appointments(horizon_days: int = DEFAULT_HORIZON_DAYS, batch_size: int = DEFAULT_BATCH_SIZE,
+                         pause: float = 0.0, max_batches: Optional[int] = None,
+                         now: Optional[datetime] = None,
+                         progress: Optional[Callable[[ArchiveReport], None]] = None) -> ArchiveReport:
+    # The booking index only holds appointments from a day back, so the horizon must
+    # leave at least that much in the live table.
+    if horizon_days < 1:
+        raise ValueError('horizon_days must be at least 1')
+    return _run_batches(AppointmentRepository.archive_batch, horizon_days, batch_size, pause, max_batches, now,
+                        progress)
+
+
+def purge_archive(horizon_days: int, batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0.0,
+                  max_batches: Optional[int] = None, now: Optional[datetime] = None,
+                  progress: Optional[Callable[[ArchiveReport], None]] = None) -> ArchiveReport:
+    """Permanently delete archived appointments scheduled more than horizon_days ago;
+    rows_moved in the report counts the rows deleted."""
+    if horizon_days < 1:
+        raise ValueError('horizon_days must be at least 1')
+    return _run_batches(AppointmentRepository.purge_archived_batch, horizon_days, batch_size, pause, max_batches,
+                        now, progress)
+
+
+def prune_search_log(horizon_days: int, batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0.0,
+                     max_batches: Optional[int] = None, now: Optional[datetime] = None,
+                     progress: Optional[Callable[[ArchiveReport], None]] = None) -> ArchiveReport:
+    """Delete search index change log entries older than horizon_days; rows_moved in
+    the report counts the entries deleted."""
+    if horizon_days < 1:
+        raise ValueError('horizon_days must be at least 1')
+    return _run_batches(prune_search_changes, horizon_days, batch_size, pause, max_batches, now, progress)
+
+
+def _print_progress(report: ArchiveReport):
+    print(f'\r{report.rows_moved:,} rows in {report.batches} batches, {report.rows_per_sec:,.0f} rows/s',
+          end='', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archive appointments older than a horizon.')
+    parser.add_argument('--horizon-days', type=int, default=DEFAULT_HORIZON_DAYS)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds to wait between batches')
+    parser.add_argument('--max-batches', type=int, help='stop after this many; rerun to continue')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--purge', action='store_true',
+                      help='delete archived appointments older than the horizon instead of archiving')
+    mode.add_argument('--search-log', action='store_true',
+                      help="delete the search indexes' change log entries older than the horizon instead")
+    args = parser.parse_args(argv)
+
+    run = purge_archive if args.purge else prune_search_log if args.search_log else archive_appointments
+    try:
+        report = run(args.horizon_days, args.batch_size, args.pause, args.max_batches, progress=_print_progress)
+    except ValueError as e:
+        parser.error(str(e))
+    print()
+    what = 'search log entries' if args.search_log else 'appointments'
+    print(f'✅ {"Archived" if run is archive_appointments else "Purged"} {report.rows_moved:,} {what} before '
+          f'{report.cutoff:%Y-%m-%d %H:%M} in {report.elapsed:.2f}s ({report.rows_per_sec:,.0f} rows/s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Asyncio counterparts of the services.
+
+Blocking repository calls run on a thread pool sized to the connection pool, so
+a worker never waits on pool checkout. At most ASYNC_MAX_PENDING calls may be
+queued or running; further callers wait, and after ASYNC_QUEUE_TIMEOUT seconds
+get ServiceBusy instead of piling up. Cancelling a caller drops its call if it
+has not started yet; one that is already running finishes in the background
+but its result is discarded.
+
+    patient, doctor, upcoming = await asyncio.gather(
+        AsyncPatientService.get_by_id(1),
+        AsyncDoctorService.get_by_id(2),
+        AsyncAppointmentService.list_upcoming(limit=20),
+    )
+"""
+import asyncio
+import functools
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import database
+from services import PatientService, DoctorService, AppointmentService
+
+MAX_PENDING = int(os.getenv('ASYNC_MAX_PENDING', str(database.POOL_MAX_SIZE * 8)))
+QUEUE_TIMEOUT = float(os.getenv('ASYNC_QUEUE_TIMEOUT', '30'))
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphores = weakref.WeakKeyDictionary()     # event loop -> asyncio.Semaphore
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=database.POOL_MAX_SIZE, thread_name_prefix='db')
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(MAX_PENDING)
+    return sem
+
+
+def shutdown(wait: bool = True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    sem = _get_semaphore()
+    try:
+        await asyncio.wait_for(sem.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ServiceBusy(f'{MAX_PENDING} database calls already pending') from None
+
+    def free_slot(_):
+        try:
+            loop.call_soon_threadsafe(sem.release)
+        except RuntimeError:
+            pass    # loop already closed
+
+    # The call sees this task's context (read-your-writes, primary_reads) rather than
+    # whatever the pool thread ran last, and its commits count for this task.
+    ctx = database.handoff_context()
+    job = _get_executor().submit(ctx.run, functools.partial(fn, *args, **kwargs))
+    # The slot is freed when the thread is done, not when the caller stops waiting,
+    # so cancelled-but-running calls still count against the limit.
+    job.add_done_callback(free_slot)
+    try:
+        return await asyncio.wrap_future(job)
+    except asyncio.CancelledError:
+        job.cancel()
+        raise
+    finally:
+        if job.done() and not job.cancelled():
+            database.take_back(ctx)
+
+
+def _async(fn: Callable):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_blocking(fn, *args, **kwargs)
+    return staticmethod(wrapper)
+
+
+class AsyncPatientService:
+    create = _async(PatientService.create)
+    list_all = _async(PatientService.list_all)
+    get_by_id = _async(PatientService.get_by_id)
+    get_many = _async(PatientService.get_many)
+    search = _async(PatientService.search)
+    search_similar = _async(PatientService.search_similar)
+    find_duplicates = _async(PatientService.find_duplicates)
+    update = _async(PatientService.update)
+    delete = _async(PatientService.delete)
+
+
+class AsyncDoctorService:
+    create = _async(DoctorService.create)
+    list_all = _async(DoctorService.list_all)
+    get_by_id = _async(DoctorService.get_by_id)
+    get_many = _async(DoctorService.get_many)
+    search = _async(DoctorService.search)
+    search_similar = _async(DoctorService.search_similar)
+    update = _async(DoctorService.update)
+    delete = _async(DoctorService.delete)
+
+
+class AsyncAppointmentService:
+    schedule = _async(AppointmentService.schedule)
+    schedule_many = _async(AppointmentService.schedule_many)
+    find_next_free_slot = _async(AppointmentService.find_next_free_slot)
+    list_upcoming = _async(AppointmentService.list_upcoming)
+    list_detailed = _async(AppointmentService.list_detailed)
+    list_for_doctor = _async(AppointmentService.list_for_doctor)
+    list_for_patient = _async(AppointmentService.list_for_patient)
+    list_for_specialty = _async(AppointmentService.list_for_specialty)
+    get_many = _async(AppointmentService.get_many)
+    with_names = _async(AppointmentService.with_names)
+    cancel = _async(AppointmentService.cancel)
@@ -0,0 +1,418 @@
+"""Storage backends behind the repositories: SQL Server over pyodbc, and embedded SQLite.
+
+Repository SQL is shared; a backend supplies the connection and the few pieces
+whose syntax differs (schema DDL, row limits, identity retrieval, bulk insert,
+migration locking, date truncation and the reporting upsert), and how to reach
+an optional read-only endpoint. database.py picks one from DB_BACKEND.
+"""
+import os
+import pathlib
+import sqlite3
+from datetime import date, datetime
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from utils import chunked
+
+# insert_many's per-batch hook: (cursor, batch rows, their ids), called after the
+# batch's INSERT and before its commit; it may return a callable to run once the
+# batch has committed. A row skipped by insert_many's `unless` has None for its id.
+BatchHook = Callable[[object, List[tuple], List[int]], Optional[Callable[[], None]]]
+
+
+class SqlServerBackend:
+    name = 'sqlserver'
+
+    CONN_STR_TEMPLATE = (
+        'DRIVER={driver};'
+        'SERVER={server};'
+        'DATABASE={database};'
+        'Trusted_Connection=Yes;'
+        'Encrypt={encrypt};'
+        'TrustServerCertificate=yes'
+    )
+
+    schema = (
+        '''
+            IF NOT EXISTS(
+                SELECT 1 FROM information_schema.tables WHERE table_name = 'patients'
+            )
+            CREATE TABLE patients(
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                age INT NULL,
+                gender VARCHAR(20) NULL,
+                created_at DATETIME2 DEFAULT GETDATE()
+            )
+        ''',
+        '''
+            IF NOT EXISTS(
+                SELECT 1 FROM information_schema.tables WHERE table_name = 'doctors'
+            )
+            CREATE TABLE doctors(
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                specialty VARCHAR(100) NULL,
+                created_at DATETIME2 DEFAULT GETDATE()
+            )
+        ''',
+        '''
+            IF NOT EXISTS(
+                SELECT 1 FROM information_schema.tables WHERE table_name = 'appointments'
+            )
+            CREATE TABLE appointments(
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                patient_id INT NOT NULL,
+                doctor_id INT NOT NULL,
+                scheduled_at DATETIME2 NOT NULL,
+                notes VARCHAR(500) NULL,
+                created_at DATETIME2 DEFAULT GETDATE(),
+                duration_minutes INT NOT NULL CONSTRAINT DF_App_Duration DEFAULT 30,
+                CONSTRAINT FK_App_Patient FOREIGN KEY (patient_id) REFERENCES patients(id),
+                CONSTRAINT FK_App_Doctor FOREIGN KEY (doctor_id) REFERENCES doctors(id)
+            )
+        ''',
+    )
+
+    version_table_ddl = '''
+        IF NOT EXISTS(
+            SELECT 1 FROM information_schema.tables WHERE table_name = 'schema_version'
+        )
+        CREATE TABLE schema_version(
+            version INT PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at DATETIME2 DEFAULT GETDATE()
+        )
+    '''
+
+    fingerprint_table_ddl = '''
+        IF NOT EXISTS(
+            SELECT 1 FROM information_schema.tables WHERE table_name = 'schema_fingerprint'
+        )
+        CREATE TABLE schema_fingerprint(
+            fingerprint CHAR(64) NOT NULL,
+            updated_at DATETIME2 DEFAULT GETDATE()
+        )
+    '''
+
+    def __init__(self, driver: str, server: str, database: str, encrypt: str, read_server: str = '',
+                 read_intent: bool = True):
+        self.driver = driver
+        self.server = server
+        self.database = database
+        self.encrypt = encrypt
+        # Read-only endpoint: an availability group listener with ApplicationIntent=ReadOnly
+        # (read_server may then equal server), or a separate replica server.
+        self.read_endpoint = read_server
+        self.read_intent = read_intent
+        # The DB-API connect function; swap it for a fake driver to inject failures.
+        # pyodbc is only imported when it is first needed.
+        self.driver_connect: Optional[Callable] = None
+
+    def _driver(self) -> Callable:
+        if self.driver_connect is None:
+            import pyodbc
+            self.driver_connect = pyodbc.connect
+        return self.driver_connect
+
+    def conn_str(self, server: str, database: str, read_only: bool = False) -> str:
+        conn_str = self.CONN_STR_TEMPLATE.format(
+            driver=self.driver, server=self.read_endpoint if read_only else server, database=database,
+            encrypt=self.encrypt
+        )
+        if read_only and self.read_intent:
+            conn_str += ';ApplicationIntent=ReadOnly'
+        return conn_str
+
+    def connect(self, server: str, database: str, read_only: bool = False):
+        return self._driver()(self.conn_str(server, database, read_only))
+
+    def prepare(self):
+        with self._driver()(self.conn_str(self.server, 'master'), autocommit=True) as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT 1 FROM sys.databases WHERE name = ?', (self.database,))
+            if not cur.fetchone():
+                cur.execute(f'CREATE DATABASE [{self.database}]')
+
+    @staticmethod
+    def apply_limit(sql: str, params: list, limit: Optional[int]) -> Tuple[str, list]:
+        # `sql` carries a {top} placeholder right after SELECT.
+        if limit is None:
+            return sql.format(top=''), params
+        return sql.format(top='TOP (?) '), [limit] + params
+
+    @staticmethod
+    def last_insert_id(cur) -> int:
+        cur.execute('SELECT CAST(SCOPE_IDENTITY() AS INT)')
+        return cur.fetchone()[0]
+
+    @staticmethod
+    def day(column: str) -> str:
+        return f'CAST({column} AS DATE)'
+
+    @staticmethod
+    def add_minutes(column: str, minutes: str) -> str:
+        return f'DATEADD(minute, {minutes}, {column})'
+
+    @staticmethod
+    def locked(table: str, alias: str = '') -> str:
+        # A read that holds its key range until commit, so a concurrent insert into the
+        # range waits for it (or the other way round).
+        return f'{table} {alias} WITH (UPDLOCK, HOLDLOCK)' if alias else f'{table} WITH (UPDLOCK, HOLDLOCK)'
+
+    @staticmethod
+    def bump_daily_stats(cur, doctor_id: int, day: date, appointments: int, minutes: int):
+        # UPDLOCK + SERIALIZABLE holds the key range, so two sessions cannot both insert.
+        cur.execute(
+            '''
+            UPDATE appointment_stats_daily WITH (UPDLOCK, SERIALIZABLE)
+                SET appointments = appointments + ?, minutes = minutes + ?
+                WHERE doctor_id = ? AND day = ?;
+            IF @@ROWCOUNT = 0
+                INSERT INTO appointment_stats_daily (doctor_id, day, appointments, minutes) VALUES (?, ?, ?, ?);
+            ''',
+            (appointments, minutes, doctor_id, day, doctor_id, day, appointments, minutes)
+        )
+
+    @staticmethod
+    def insert_many(conn, table: str, columns: Sequence[str], rows: Iterable[tuple],
+                    batch_size: int, on_batch: Optional[BatchHook] = None,
+                    unless: Optional[str] = None) -> List[Optional[int]]:
+        # Rows are bulk-copied into a session temp table with fast_executemany, then moved
+        # with one INSERT ... SELECT ... ORDER BY seq. SQL Server assigns IDENTITY values in
+        # ORDER BY order, so the sorted OUTPUT ids line up with the input rows. `unless` is
+        # a condition on a candidate row, aliased `new`: rows matching it are deleted from
+        # the stage first, in one statement per batch, and get None for an id.
+        cols = ', '.join(columns)
+        marks = ', '.join('?' for _ in columns)
+        ids = []
+        cur = conn.cursor()
+        cur.fast_executemany = True
+        for batch in chunked(rows, batch_size):
+            cur.execute("IF OBJECT_ID('tempdb..#bulk_stage') IS NOT NULL DROP TABLE #bulk_stage")
+            cur.execute(f'SELECT TOP 0 {cols}, CAST(0 AS INT) AS seq INTO #bulk_stage FROM {table}')
+            cur.executemany(
+                f'INSERT INTO #bulk_stage ({cols}, seq) VALUES ({marks}, ?)',
+                [tuple(r) + (i,) for i, r in enumerate(batch)]
+            )
+            skipped = set()
+            if unless:
+                cur.execute(f'DELETE new OUTPUT DELETED.seq FROM #bulk_stage AS new WHERE {unless}')
+                skipped = {r[0] for r in cur.fetchall()}
+            cur.execute(
+                f'INSERT INTO {table} ({cols}) OUTPUT INSERTED.id '
+                f'SELECT {cols} FROM #bulk_stage ORDER BY seq'
+            )
+            inserted = iter(sorted(r[0] for r in cur.fetchall()))
+            batch_ids = [None if i in skipped else next(inserted) for i in range(len(batch))]
+            cur.execute('DROP TABLE #bulk_stage')
+            after = on_batch(cur, batch, batch_ids) if on_batch else None
+            conn.commit()
+            if after:
+                after()
+            ids.extend(batch_ids)
+        return ids
+
+    @staticmethod
+    def lock_migrations(cur):
+        cur.execute(
+            "EXEC sp_getapplock @Resource = 'schema_migrations', @LockMode = 'Exclusive', "
+            "@LockOwner = 'Transaction', @LockTimeout = 60000"
+        )
+
+    @staticmethod
+    def migration_statements(migration) -> Tuple[str, ...]:
+        return migration.statements
+
+
+def _adapt_datetime(value: datetime) -> str:
+    return value.isoformat(' ')
+
+
+def _convert_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+def _adapt_date(value: date) -> str:
+    return value.isoformat()
+
+
+def _convert_date(value: bytes) -> date:
+    return date.fromisoformat(value.decode())
+
+
+# DATETIME2 and DATE columns round-trip as datetime and date, like they do through pyodbc.
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('DATETIME2', _convert_datetime)
+sqlite3.register_adapter(date, _adapt_date)
+sqlite3.register_converter('DATE', _convert_date)
+
+_SQLITE_NOW = "(datetime('now', 'localtime'))"
+
+
+class SqliteBackend:
+    name = 'sqlite'
+
+    PRAGMAS = (
+        ('journal_mode', 'WAL'),           # readers never block the writer
+        ('synchronous', 'NORMAL'),         # safe with WAL, fsync only at checkpoints
+        ('foreign_keys', 'ON'),
+        ('busy_timeout', '5000'),
+        ('cache_size', '-65536'),          # 64 MiB page cache per connection
+        ('temp_store', 'MEMORY'),
+        ('mmap_size', str(256 * 2 ** 20)),
+    )
+
+    schema = (
+        f'''
+            CREATE TABLE IF NOT EXISTS patients(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name VARCHAR(100) NOT NULL,
+                age INT NULL,
+                gender VARCHAR(20) NULL,
+                created_at DATETIME2 DEFAULT {_SQLITE_NOW}
+            )
+        ''',
+        f'''
+            CREATE TABLE IF NOT EXISTS doctors(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name VARCHAR(100) NOT NULL,
+                specialty VARCHAR(100) NULL,
+                created_at DATETIME2 DEFAULT {_SQLITE_NOW}
+            )
+        ''',
+        f'''
+            CREATE TABLE IF NOT EXISTS appointments(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patient_id INT NOT NULL,
+                doctor_id INT NOT NULL,
+                scheduled_at DATETIME2 NOT NULL,
+                notes VARCHAR(500) NULL,
+                created_at DATETIME2 DEFAULT {_SQLITE_NOW},
+                duration_minutes INT NOT NULL DEFAULT 30,
+                CONSTRAINT FK_App_Patient FOREIGN KEY (patient_id) REFERENCES patients(id),
+                CONSTRAINT FK_App_Doctor FOREIGN KEY (doctor_id) REFERENCES doctors(id)
+            )
+        ''',
+    )
+
+    version_table_ddl = f'''
+        CREATE TABLE IF NOT EXISTS schema_version(
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at DATETIME2 DEFAULT {_SQLITE_NOW}
+        )
+    '''
+
+    fingerprint_table_ddl = f'''
+        CREATE TABLE IF NOT EXISTS schema_fingerprint(
+            fingerprint CHAR(64) NOT NULL,
+            updated_at DATETIME2 DEFAULT {_SQLITE_NOW}
+        )
+    '''
+
+    def __init__(self, path: str, pragmas: Sequence[Tuple[str, str]] = PRAGMAS, read_path: str = ''):
+        self.path = path
+        self.pragmas = pragmas
+        self.driver_connect: Callable = sqlite3.connect
+        # A second database file standing in for a read replica; opened read-only so a
+        # write routed there by mistake fails instead of diverging.
+        self.read_endpoint = read_path
+
+    def connect(self, server: str = None, database: str = None, read_only: bool = False):
+        # server/database are SQL Server notions; the file path identifies the database.
+        # Pooled connections move between threads, one at a time.
+        if read_only:
+            conn = self.driver_connect(f'{pathlib.Path(os.path.abspath(self.read_endpoint)).as_uri()}?mode=ro',
+                                       uri=True, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        else:
+            conn = self.driver_connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                       check_same_thread=False)
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def prepare(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def apply_limit(sql: str, params: list, limit: Optional[int]) -> Tuple[str, list]:
+        if limit is None:
+            return sql.format(top=''), params
+        return sql.format(top='') + ' LIMIT ?', params + [limit]
+
+    @staticmethod
+    def last_insert_id(cur) -> int:
+        return cur.lastrowid
+
+    @staticmethod
+    def day(column: str) -> str:
+        return f'date({column})'
+
+    @staticmethod
+    def add_minutes(column: str, minutes: str) -> str:
+        # Same text layout as _adapt_datetime for whole-second values.
+        return f"datetime({column}, ({minutes}) || ' minutes')"
+
+    @staticmethod
+    def locked(table: str, alias: str = '') -> str:
+        # An INSERT ... SELECT takes the database write lock before it reads.
+        return f'{table} {alias}' if alias else table
+
+    @staticmethod
+    def bump_daily_stats(cur, doctor_id: int, day: date, appointments: int, minutes: int):
+        cur.execute(
+            'INSERT INTO appointment_stats_daily (doctor_id, day, appointments, minutes) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (doctor_id, day) DO UPDATE SET '
+            'appointments = appointments + excluded.appointments, minutes = minutes + excluded.minutes',
+            (doctor_id, day, appointments, minutes)
+        )
+
+    @staticmethod
+    def insert_many(conn, table: str, columns: Sequence[str], rows: Iterable[tuple],
+                    batch_size: int, on_batch: Optional[BatchHook] = None,
+                    unless: Optional[str] = None) -> List[Optional[int]]:
+        # Embedded: a prepared INSERT per row costs microseconds, and lastrowid gives
+        # each id directly. One commit per batch, as on SQL Server. With `unless`, each
+        # row goes in through INSERT ... SELECT, and is skipped when the condition holds.
+        cols = ', '.join(columns)
+        if unless:
+            sql = (f'INSERT INTO {table} ({cols}) SELECT {cols} FROM '
+                   f'(SELECT {", ".join(f"? AS {c}" for c in columns)}) AS new WHERE NOT {unless}')
+        else:
+            sql = f'INSERT INTO {table} ({cols}) VALUES ({", ".join("?" for _ in columns)})'
+        ids = []
+        cur = conn.cursor()
+        for batch in chunked(rows, batch_size):
+            batch_ids = []
+            for r in batch:
+                cur.execute(sql, tuple(r))
+                batch_ids.append(cur.lastrowid if cur.rowcount > 0 else None)
+            after = on_batch(cur, batch, batch_ids) if on_batch else None
+            conn.commit()
+            if after:
+                after()
+            ids.extend(batch_ids)
+        return ids
+
+    @staticmethod
+    def lock_migrations(cur):
+        # Takes the database write lock now rather than at the first write.
+        cur.execute('BEGIN IMMEDIATE')
+
+    @staticmethod
+    def migration_statements(migration) -> Tuple[str, ...]:
+        return migration.sqlite_statements
+
+
+BACKENDS = ('sqlserver', 'sqlite')
+
+
+def create_backend(name: str, **settings):
+    if name == 'sqlserver':
+        return SqlServerBackend(settings['driver'], settings['server'], settings['database'],
+                                settings['encrypt'], settings.get('read_server', ''),
+                                settings.get('read_intent', True))
+    if name == 'sqlite':
+        return SqliteBackend(settings['path'], read_path=settings.get('read_path', ''))
+    raise ValueError(f'Unknown DB_BACKEND {name!r}; expected one of {", ".join(BACKENDS)}')
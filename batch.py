@@ -0,0 +1,314 @@
+"""Scripted console: run JSONL commands and write one JSONL result per command.
+
+    python main.py --batch commands.jsonl --output results.jsonl --commit-every 100
+    cat commands.jsonl | python main.py --batch -
+
+Each input line is an object with an "op" and its arguments, plus an optional
+"ref" echoed back in the result, e.g.
+
+    {"op": "add_patient", "name": "Ann Lee", "age": 34, "gender": "F", "ref": "row-1"}
+    {"op": "schedule", "patient_id": 1, "doctor_id": 2, "scheduled_at": "2030-01-07 09:00"}
+
+Commands run in order on this process's connection pool. By default each command
+commits on its own, as in the menu: every repository call checks a connection out
+of the pool and returns it, so a command costs a checkout (and a rollback on
+return), not a new connection. The pool hands out its most recently returned
+connection first, so a run uses one pooled connection throughout, yet one that
+drops mid-run is replaced at the next checkout. With --commit-every N they run in
+transactions of N commands, each on one connection held for the whole group. A
+failed command rolls back its whole group, and every result of that group says
+so. Results carry the time each command took, and a summary line with throughput
+and per-operation latency closes the output.
+"""
+import dataclasses
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from database import transaction
+from instrumentation import Histogram
+from services import PatientService, DoctorService, AppointmentService
+from utils import parse_datetime
+
+PAGE_SIZE = 20
+
+
+class _Rollback(Exception):
+    # Raised inside a group's transaction to roll it back after a failed command.
+    pass
+
+
+def _raw(cmd: dict, key: str, default: str = '') -> str:
+    # The services validate raw console input, so arguments go in as text.
+    value = cmd.get(key)
+    return default if value is None else str(value)
+
+
+def _int(cmd: dict, key: str) -> Optional[int]:
+    value = cmd.get(key)
+    return None if value is None else int(value)
+
+
+def _limit(cmd: dict) -> int:
+    limit = _int(cmd, 'limit')
+    if limit is None:
+        return PAGE_SIZE
+    if limit <= 0:
+        raise ValueError('limit must be a positive integer')
+    return limit
+
+
+def _time(cmd: dict, key: str) -> Optional[datetime]:
+    # Console formats, or the ISO timestamps this module writes (with seconds).
+    value = cmd.get(key)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return parse_datetime(str(value))
+
+
+def _page(rows: list, limit: int, next_key: Callable) -> dict:
+    # `next` holds the keyset arguments of the following page, None on the last one.
+    return {'rows': rows, 'next': next_key(rows[-1]) if len(rows) == limit else None}
+
+
+def _listing(service, cmd: dict) -> dict:
+    limit = _limit(cmd)
+    return _page(service.list_all(_int(cmd, 'after_id'), limit), limit, lambda r: {'after_id': r.id})
+
+
+def _search(service, cmd: dict) -> dict:
+    limit = _limit(cmd)
+    rows = service.search(_raw(cmd, 'q'), _int(cmd, 'after_id'), limit)
+    page = _page(rows, limit, lambda r: {'after_id': r.id})
+    if not rows and cmd.get('after_id') is None:
+        page['similar'] = service.search_similar(_raw(cmd, 'q'))
+    return page
+
+
+def _by_time(cmd: dict, fetch: Callable, key: Callable) -> dict:
+    limit = _limit(cmd)
+    rows = fetch(_time(cmd, 'after_scheduled_at'), _int(cmd, 'after_id'), limit=limit)
+    return _page(rows, limit, lambda r: {'after_scheduled_at': key(r)[0], 'after_id': key(r)[1]})
+
+
+def _window(cmd: dict, fetch: Callable, key: str) -> dict:
+    # start/end as in the console; no end means the day starting at start.
+    return _by_time(cmd, lambda after, after_id, limit: fetch(
+        _raw(cmd, key), _raw(cmd, 'start'), _raw(cmd, 'end'), after, after_id, limit,
+        bool(cmd.get('include_archived'))), lambda a: (a.scheduled_at, a.id))
+
+
+def _free_slot(cmd: dict) -> Optional[dict]:
+    slot = AppointmentService.find_next_free_slot(
+        _raw(cmd, 'doctor_id'), cmd.get('specialty'), _raw(cmd, 'after'), _raw(cmd, 'duration')
+    )
+    return {'scheduled_at': slot[0], 'doctor_id': slot[1]} if slot else None
+
+
+# op -> handler(command) -> JSON-serializable result; the same actions as the menu.
+COMMANDS: Dict[str, Callable[[dict], object]] = {
+    'add_patient': lambda c: {'id': PatientService.create(
+        _raw(c, 'name'), _raw(c, 'age'), _raw(c, 'gender'), bool(c.get('allow_duplicate')))},
+    'list_patients': lambda c: _listing(PatientService, c),
+    'search_patients': lambda c: _search(PatientService, c),
+    'update_patient': lambda c: {'updated': PatientService.update(
+        int(c['id']), _raw(c, 'name'), _raw(c, 'age'), _raw(c, 'gender'))},
+    'delete_patient': lambda c: {'deleted': PatientService.delete(int(c['id']))},
+    'add_doctor': lambda c: {'id': DoctorService.create(_raw(c, 'name'), _raw(c, 'specialty'))},
+    'list_doctors': lambda c: _listing(DoctorService, c),
+    'search_doctors': lambda c: _search(DoctorService, c),
+    'schedule': lambda c: {'id': AppointmentService.schedule(
+        _raw(c, 'patient_id'), _raw(c, 'doctor_id'), _raw(c, 'scheduled_at'), c.get('notes') or None,
+        _raw(c, 'duration'))},
+    'list_upcoming': lambda c: _by_time(c, AppointmentService.list_upcoming, lambda a: (a.scheduled_at, a.id)),
+    'list_detailed': lambda c: _by_time(
+        c, AppointmentService.list_detailed, lambda d: (d.scheduled_at, d.appointment_id)),
+    'cancel': lambda c: {'cancelled': AppointmentService.cancel(_raw(c, 'id'))},
+    'doctor_calendar': lambda c: _window(c, AppointmentService.list_for_doctor, 'doctor_id'),
+    'patient_calendar': lambda c: _window(c, AppointmentService.list_for_patient, 'patient_id'),
+    'specialty_calendar': lambda c: _window(c, AppointmentService.list_for_specialty, 'specialty'),
+    'find_free_slot': _free_slot,
+}
+
+
+# op -> arguments it cannot run without; checked before dispatch, so a KeyError
+# raised while a command runs is reported as the error it is.
+REQUIRED: Dict[str, Tuple[str, ...]] = {
+    'add_patient': ('name', 'age', 'gender'),
+    'search_patients': ('q',),
+    'update_patient': ('id', 'name', 'age', 'gender'),
+    'delete_patient': ('id',),
+    'add_doctor': ('name', 'specialty'),
+    'search_doctors': ('q',),
+    'schedule': ('patient_id', 'doctor_id', 'scheduled_at'),
+    'cancel': ('id',),
+    'doctor_calendar': ('doctor_id', 'start'),
+    'patient_calendar': ('patient_id', 'start'),
+    'specialty_calendar': ('specialty', 'start'),
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    return str(value)
+
+
+def read_commands(stream: TextIO) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(line number, command, parse error) for each non-blank line."""
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            cmd = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(cmd, dict) or cmd.get('op') not in COMMANDS:
+            op = cmd.get('op') if isinstance(cmd, dict) else None
+            yield line_no, cmd if isinstance(cmd, dict) else None, f'Unknown op: {op!r}'
+            continue
+        yield line_no, cmd, None
+
+
+@dataclasses.dataclass
+class BatchSummary:
+    commands: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    rolled_back: int = 0
+    elapsed: float = 0.0
+    latency: Dict[str, Histogram] = dataclasses.field(default_factory=dict)
+
+    @property
+    def commands_per_sec(self) -> float:
+        return self.commands / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'commands': self.commands, 'succeeded': self.succeeded, 'failed': self.failed,
+            'rolled_back': self.rolled_back, 'elapsed_s': round(self.elapsed, 3),
+            'commands_per_sec': round(self.commands_per_sec, 1),
+            'ops': {op: {'count': h.count, 'mean_ms': round(h.total / h.count * 1000, 3),
+                         'p95_ms': round(h.quantile(0.95) * 1000, 3), 'max_ms': round(h.max * 1000, 3)}
+                    for op, h in sorted(self.latency.items())},
+        }
+
+
+def _header(line_no: int, cmd: Optional[dict]) -> dict:
+    result = {'line': line_no}
+    if cmd is not None:
+        result['op'] = cmd.get('op')
+        if 'ref' in cmd:
+            result['ref'] = cmd['ref']
+    return result
+
+
+def _execute(line_no: int, cmd: Optional[dict], error: Optional[str], summary: BatchSummary) -> dict:
+    result = _header(line_no, cmd)
+    if error is None:
+        missing = [key for key in REQUIRED.get(cmd['op'], ()) if cmd.get(key) is None]
+        if missing:
+            error = f'Missing argument: {", ".join(missing)}'
+            result['error_type'] = 'MissingArgument'
+    if error is None:
+        t0 = time.perf_counter()
+        try:
+            result['result'] = COMMANDS[cmd['op']](cmd)
+            result['ok'] = True
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            result['error_type'] = type(e).__name__
+        seconds = time.perf_counter() - t0
+        result['ms'] = round(seconds * 1000, 3)
+        summary.latency.setdefault(cmd['op'], Histogram()).observe(seconds)
+    if error is not None:
+        result['ok'] = False
+        result['error'] = error
+    summary.commands += 1
+    return result
+
+
+def _run_group(group: List[tuple], summary: BatchSummary, transactional: bool) -> List[dict]:
+    if not transactional:
+        return [_execute(*item, summary) for item in group]
+    results = []
+    try:
+        with transaction():
+            for item in group:
+                results.append(_execute(*item, summary))
+                if not results[-1]['ok']:
+                    raise _Rollback
+        return results
+    except _Rollback:
+        reason = f'line {results[-1]["line"]} failed'
+        rolled_back = results[:-1]
+    except Exception as e:
+        # The commit itself failed: nothing in the group was applied.
+        reason = f'commit failed: {e}'
+        rolled_back = results
+    for r in rolled_back:
+        r.pop('result', None)
+        r.update(ok=False, rolled_back=True, error=f'rolled back: {reason}')
+    for line_no, cmd, _ in group[len(results):]:
+        results.append(dict(_header(line_no, cmd), ok=False, rolled_back=True, error=f'skipped: {reason}'))
+        summary.commands += 1
+    return results
+
+
+def run(commands: Iterable[Tuple[int, Optional[dict], Optional[str]]], out: TextIO, commit_every: int = 0,
+        stop_on_error: bool = False) -> BatchSummary:
+    """Execute commands in order and write each result to `out` as it completes
+    (in transactional mode, once its group has committed or rolled back)."""
+    summary = BatchSummary()
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_json_default).encode
+    started = time.perf_counter()
+    group = []
+
+    def flush() -> bool:
+        results = _run_group(group, summary, commit_every > 0)
+        group.clear()
+        for r in results:
+            if r['ok']:
+                summary.succeeded += 1
+            elif r.get('rolled_back'):
+                summary.rolled_back += 1
+            else:
+                summary.failed += 1
+            out.write(encode(r) + '\n')
+        out.flush()
+        return all(r['ok'] for r in results)
+
+    for item in commands:
+        group.append(item)
+        if len(group) >= max(commit_every, 1) and not flush() and stop_on_error:
+            break
+    if group:
+        flush()
+    summary.elapsed = time.perf_counter() - started
+    out.write(encode({'summary': summary.to_dict()}) + '\n')
+    out.flush()
+    return summary
+
+
+def main(path: str, output: Optional[str] = None, commit_every: int = 0, stop_on_error: bool = False) -> int:
+    source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    sink = sys.stdout if output in (None, '-') else open(output, 'w', encoding='utf-8')
+    try:
+        summary = run(read_commands(source), sink, commit_every, stop_on_error)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    print(f'{summary.commands:,} commands in {summary.elapsed:.2f}s ({summary.commands_per_sec:,.0f}/s): '
+          f'{summary.succeeded:,} ok, {summary.failed:,} failed, {summary.rolled_back:,} rolled back',
+          file=sys.stderr)
+    return 0 if not summary.failed and not summary.rolled_back else 1
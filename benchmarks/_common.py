@@ -0,0 +1,44 @@
+import statistics
+import time
+from typing import Callable, Dict, List
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    total = sum(s)
+    return {
+        'n': len(s),
+        'mean_ms': statistics.fmean(s) * 1000 if s else 0.0,
+        'p50_ms': percentile(s, 50) * 1000,
+        'p95_ms': percentile(s, 95) * 1000,
+        'p99_ms': percentile(s, 99) * 1000,
+        'ops_per_sec': len(s) / total if total else 0.0,
+    }
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 3) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]):
+    print(f'\n{title}')
+    print(f'{"operation":<40}{"n":>8}{"mean ms":>12}{"p50 ms":>12}{"p95 ms":>12}{"p99 ms":>12}{"ops/s":>12}')
+    for name, r in rows.items():
+        print(f'{name:<40}{r["n"]:>8}{r["mean_ms"]:>12.3f}{r["p50_ms"]:>12.3f}'
+              f'{r["p95_ms"]:>12.3f}{r["p99_ms"]:>12.3f}{r["ops_per_sec"]:>12.1f}')
@@ -0,0 +1,122 @@
+"""Hot-path query latency before and after archiving a multi-year dataset.
+
+Seeds appointments spread over --years (skip with --no-seed on reruns), measures,
+archives everything older than --horizon-days, measures again, then moves the
+archived rows back (--keep-archived leaves them archived):
+
+    python -m benchmarks.bench_archive --appointments 1000000 --years 3 --horizon-days 90
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import database
+import datagen
+from archive import archive_appointments
+from database import get_connection, initialize_db
+from instrumentation import metrics
+from repositories import AppointmentRepository
+from benchmarks._common import measure, print_table
+
+
+def table_counts() -> dict:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        counts = {}
+        for table in ('appointments', 'appointments_archive'):
+            cur.execute(f'SELECT COUNT(*) FROM {table}')
+            counts[table] = cur.fetchone()[0]
+        return counts
+
+
+def restore():
+    # Moves archived rows back under their original ids.
+    cols = 'id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes'
+    sqlserver = database.backend.name == 'sqlserver'
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if sqlserver:
+            cur.execute('SET IDENTITY_INSERT appointments ON')
+        cur.execute(f'INSERT INTO appointments ({cols}) SELECT {cols} FROM appointments_archive')
+        if sqlserver:
+            cur.execute('SET IDENTITY_INSERT appointments OFF')
+        cur.execute('DELETE FROM appointments_archive')
+        conn.commit()
+    AppointmentRepository.index.reset()
+
+
+def query(sql: str, params=()):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def run_queries(iterations: int, doctor_id: int) -> dict:
+    now = datetime.now()
+    index = AppointmentRepository.index
+
+    def load_booking_index():
+        index.reset()
+        index.conflicts(doctor_id, now + timedelta(days=1), 30)
+
+    return {
+        'upcoming page (20)': measure(lambda: AppointmentRepository.list_all(True, limit=20), iterations),
+        'detailed page (20)': measure(lambda: AppointmentRepository.get_detailed_list(limit=20), iterations),
+        'detailed page from now (20)': measure(
+            lambda: AppointmentRepository.get_detailed_list(now, limit=20), iterations),
+        'history page (20)': measure(lambda: AppointmentRepository.list_all(limit=20), iterations),
+        'booking index load': measure(load_booking_index, max(3, iterations // 10), warmup=1),
+        'next free slot': measure(
+            lambda: AppointmentRepository.find_next_free_slot([doctor_id], now, 30), iterations),
+        # Anything that walks the live table or one doctor's whole schedule scales with its size.
+        'doctor schedule count': measure(
+            lambda: query('SELECT COUNT(*) FROM appointments WHERE doctor_id = ?', (doctor_id,)), iterations),
+        'live table scan (per doctor)': measure(
+            lambda: query('SELECT doctor_id, SUM(duration_minutes) FROM appointments GROUP BY doctor_id'),
+            max(3, iterations // 10), warmup=1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=1000000)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--years', type=float, default=3.0, help='history before today')
+    parser.add_argument('--horizon-days', type=int, default=90)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true', help='reuse data from a previous run')
+    parser.add_argument('--keep-archived', action='store_true')
+    args = parser.parse_args()
+
+    metrics.slow_query_seconds = float('inf')
+    initialize_db()
+    if not args.no_seed:
+        start = datetime.now() - timedelta(days=365 * args.years)
+        datagen.load(args.appointments // 5, args.doctors, args.appointments, args.seed, start=start,
+                     progress=True)
+    doctor_id = AppointmentRepository.list_all(True, limit=1)[0].doctor_id
+
+    before_counts = table_counts()
+    before = run_queries(args.iterations, doctor_id)
+    report = archive_appointments(args.horizon_days, args.batch_size)
+    after_counts = table_counts()
+    after = run_queries(args.iterations, doctor_id)
+
+    print_table(f'before archiving ({before_counts["appointments"]:,} live rows)', before)
+    print_table(f'after archiving ({after_counts["appointments"]:,} live, '
+                f'{after_counts["appointments_archive"]:,} archived)', after)
+    print(f'\narchived {report.rows_moved:,} rows in {report.batches} batches, {report.elapsed:.1f}s '
+          f'({report.rows_per_sec:,.0f} rows/s)')
+    print(f'\n{"query":<32}{"p50 before":>12}{"p50 after":>12}{"speedup":>10}')
+    for name in before:
+        b, a = before[name]['p50_ms'], after[name]['p50_ms']
+        print(f'{name:<32}{b:>12.3f}{a:>12.3f}{b / a if a else float("inf"):>9.1f}x')
+
+    if not args.keep_archived:
+        restore()
+
+
+if __name__ == '__main__':
+    main()
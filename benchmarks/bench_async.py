@@ -0,0 +1,81 @@
+"""Async service throughput and latency as concurrency grows.
+
+Each simulated client loops over a read-heavy mix (patient + doctor lookup fanned
+out with gather, a name search, an upcoming-appointments page):
+
+    python -m benchmarks.bench_async --requests 2000 --concurrency 1,4,16,64
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from async_services import (AsyncPatientService, AsyncDoctorService, AsyncAppointmentService,
+                            shutdown)
+from database import initialize_db
+from models import Patient, Doctor
+from repositories import PatientRepository, DoctorRepository
+from benchmarks._common import summarize
+
+
+async def _visit(rng, pids, dids):
+    op = rng.random()
+    if op < 0.5:
+        await asyncio.gather(
+            AsyncPatientService.get_by_id(rng.choice(pids)),
+            AsyncDoctorService.get_by_id(rng.choice(dids)),
+            AsyncAppointmentService.list_upcoming(limit=10),
+        )
+    elif op < 0.8:
+        await AsyncPatientService.search('load', limit=20)
+    else:
+        await AsyncAppointmentService.list_detailed(limit=20)
+
+
+async def _run_level(concurrency: int, requests: int, pids, dids, seed: int):
+    latencies = []
+    remaining = requests
+
+    async def client(n: int):
+        nonlocal remaining
+        rng = random.Random(seed + n)
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            await _visit(rng, pids, dids)
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    wall = time.perf_counter() - started
+    stats = summarize(latencies)
+    stats['throughput'] = len(latencies) / wall
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32,64')
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    initialize_db()
+    pids = PatientRepository.add_many(Patient(None, f'load test {i}', 30, 'O') for i in range(200))
+    dids = DoctorRepository.add_many(Doctor(None, f'load test {i}', 'Load') for i in range(20))
+
+    print(f'{"clients":>8}{"req/s":>12}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    try:
+        for level in (int(c) for c in args.concurrency.split(',')):
+            s = asyncio.run(_run_level(level, args.requests, pids, dids, args.seed))
+            print(f'{level:>8}{s["throughput"]:>12.1f}{s["p50_ms"]:>10.2f}{s["p95_ms"]:>10.2f}{s["p99_ms"]:>10.2f}')
+    finally:
+        shutdown()
+        for pid in pids:
+            PatientRepository.delete(pid)
+        for did in dids:
+            DoctorRepository.delete(did)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Per-operation latency on each storage backend, side by side.
+
+Each backend runs in its own process with DB_BACKEND set, so the rest of the
+environment (.env, DB_PATH, DB_SERVER) applies as usual:
+
+    python -m benchmarks.bench_backends --backends sqlserver,sqlite --iterations 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _child(iterations: int):
+    from database import initialize_db
+    from models import Patient, Doctor
+    from repositories import PatientRepository, DoctorRepository, AppointmentRepository
+    from services import AppointmentService
+    from benchmarks._common import measure
+
+    initialize_db()
+    PatientRepository.cache.enabled = DoctorRepository.cache.enabled = False
+    pid = PatientRepository.add(Patient(None, 'backend bench', 40, 'F'))
+    did = DoctorRepository.add(Doctor(None, 'backend bench', 'Benchmarking'))
+    added = []
+    slot = [datetime.now().replace(second=0, microsecond=0) + timedelta(days=3650)]
+
+    def schedule_cancel():
+        slot[0] += timedelta(hours=1)
+        aid = AppointmentService.schedule(str(pid), str(did), slot[0].strftime('%Y-%m-%d %H:%M'))
+        AppointmentRepository.delete(aid)
+
+    results = {
+        'patient add': measure(lambda: added.append(PatientRepository.add(Patient(None, 'bb', 1, 'M'))),
+                               iterations),
+        'patient get_by_id (uncached)': measure(lambda: PatientRepository.get_by_id(pid), iterations),
+        'patient list page (20)': measure(lambda: PatientRepository.list_all(limit=20), iterations),
+        'patient search (LIKE)': measure(lambda: PatientRepository.search_by_name('backend', limit=20),
+                                         iterations),
+        'upcoming page (20)': measure(lambda: AppointmentRepository.list_all(True, limit=20), iterations),
+        'schedule + cancel': measure(schedule_cancel, iterations),
+        'add_many 1000 patients': measure(
+            lambda: added.extend(PatientRepository.add_many(Patient(None, 'bb', 1, 'M') for _ in range(1000))),
+            max(1, iterations // 100), warmup=1),
+    }
+    for p in added:
+        PatientRepository.delete(p)
+    PatientRepository.delete(pid)
+    DoctorRepository.delete(did)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', default='sqlserver,sqlite')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.iterations)
+        return
+
+    backends = args.backends.split(',')
+    results = {}
+    for name in backends:
+        env = dict(os.environ, DB_BACKEND=name)
+        proc = subprocess.run([sys.executable, '-m', 'benchmarks.bench_backends', '--child',
+                               '--iterations', str(args.iterations)],
+                              cwd=ROOT, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f'{name}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ""}')
+            continue
+        results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if not results:
+        return
+    ran = list(results)
+    print(f'{"operation (p50 ms / p99 ms)":<32}' + ''.join(f'{n:>24}' for n in ran))
+    for op in results[ran[0]]:
+        cells = ''.join(f'{results[n][op]["p50_ms"]:>13.3f} /{results[n][op]["p99_ms"]:>8.3f}' for n in ran)
+        print(f'{op:<32}{cells}')
+
+
+if __name__ == '__main__':
+    main()
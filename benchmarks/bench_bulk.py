@@ -0,0 +1,46 @@
+"""Row-at-a-time add() vs batched add_many() insert throughput.
+
+    python -m benchmarks.bench_bulk --rows 5000
+"""
+import argparse
+import time
+
+from database import initialize_db, get_connection
+from models import Patient
+from repositories import PatientRepository
+
+
+def _cleanup(ids):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for i in range(0, len(ids), 1000):
+            chunk = ids[i:i + 1000]
+            cur.execute(f'DELETE FROM patients WHERE id IN ({", ".join("?" for _ in chunk)})', chunk)
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    initialize_db()
+    patients = [Patient(None, f'bulk bench {i}', 20 + i % 60, 'MF'[i % 2]) for i in range(args.rows)]
+
+    t0 = time.perf_counter()
+    ids = [PatientRepository.add(p) for p in patients]
+    single = time.perf_counter() - t0
+    _cleanup(ids)
+
+    t0 = time.perf_counter()
+    ids = PatientRepository.add_many(patients, batch_size=args.batch_size)
+    bulk = time.perf_counter() - t0
+    _cleanup(ids)
+
+    print(f'add()      : {args.rows / single:>12,.0f} rows/s ({single:.2f}s)')
+    print(f'add_many() : {args.rows / bulk:>12,.0f} rows/s ({bulk:.2f}s, batch size {args.batch_size})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Repeated get_by_id latency with the entity cache on and off.
+
+    python -m benchmarks.bench_cache --iterations 2000 --distinct 50
+"""
+import argparse
+import random
+
+from database import initialize_db
+from models import Patient, Doctor
+from repositories import PatientRepository, DoctorRepository
+from services import PatientService, DoctorService
+from benchmarks._common import measure, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--distinct', type=int, default=50, help='number of distinct ids looked up')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    initialize_db()
+    pids = PatientRepository.add_many(Patient(None, f'cache bench {i}', 30, 'F') for i in range(args.distinct))
+    dids = DoctorRepository.add_many(Doctor(None, f'cache bench {i}', 'Benchmarking') for i in range(args.distinct))
+    rng = random.Random(args.seed)
+
+    try:
+        for enabled in (False, True):
+            for repo in (PatientRepository, DoctorRepository):
+                repo.cache.enabled = enabled
+                repo.cache.clear()
+            if enabled:
+                PatientRepository.warm_cache()
+                DoctorRepository.warm_cache()
+            results = {
+                'PatientService.get_by_id': measure(lambda: PatientService.get_by_id(rng.choice(pids)), args.iterations),
+                'DoctorService.get_by_id': measure(lambda: DoctorService.get_by_id(rng.choice(dids)), args.iterations),
+            }
+            print_table('cache on' if enabled else 'cache off', results)
+        print('\npatient cache:', PatientRepository.cache.stats())
+        print('doctor cache:', DoctorRepository.cache.stats())
+    finally:
+        for pid in pids:
+            PatientRepository.delete(pid)
+        for did in dids:
+            DoctorRepository.delete(did)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Calendar windows: a doctor's day and week, a patient's history and a specialty's
+day, from index range scans against scanning every appointment and filtering in
+Python, plus doctor days of the current week served from the day-bucket cache.
+
+Seeds a dataset with datagen starting --weeks-back weeks before this week (skip
+with --no-seed on reruns):
+
+    python -m benchmarks.bench_calendar --appointments 1000000
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+from itertools import cycle, takewhile
+
+import datagen
+from database import initialize_db
+from instrumentation import metrics
+from repositories import AppointmentRepository, DoctorRepository
+from benchmarks._common import measure, print_table
+
+
+def naive(start: datetime, end: datetime, doctor_id: int = None, patient_id: int = None) -> list:
+    # What a calendar cost before: every appointment, filtered in Python.
+    return [a for a in AppointmentRepository.iter_all()
+            if start <= a.scheduled_at < end and doctor_id in (None, a.doctor_id)
+            and patient_id in (None, a.patient_id)]
+
+
+def midnight(d: date) -> datetime:
+    return datetime.combine(d, datetime.min.time())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=1000000)
+    parser.add_argument('--weeks-back', type=int, default=2, help='weeks of history before this week')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true', help='reuse data from a previous run')
+    args = parser.parse_args()
+
+    metrics.slow_query_seconds = float('inf')
+    initialize_db()
+    monday = date.today() - timedelta(days=date.today().weekday())
+    if not args.no_seed:
+        datagen.load(max(1, args.appointments // 5), max(1, args.appointments // 200), args.appointments,
+                     args.seed, start=midnight(monday - timedelta(weeks=args.weeks_back)), progress=True)
+
+    # Probe (doctor, patient, day) triples taken from real appointments, so windows are not empty.
+    rng = random.Random(args.seed)
+    history = AppointmentRepository.iter_all(False, midnight(monday + timedelta(days=7)))    # newest first
+    week = list(takewhile(lambda a: a.scheduled_at >= midnight(monday), history))
+    history.close()
+    if not week:
+        raise SystemExit('no appointments this week; reseed with a larger --weeks-back or --appointments')
+    probes = rng.sample(week, min(len(week), args.iterations))
+    specialties = {d.id: d.specialty for d in DoctorRepository.list_all()}
+
+    def day_of(a):
+        return midnight(a.scheduled_at.date()), midnight(a.scheduled_at.date() + timedelta(days=1))
+
+    def week_of(a):
+        start = midnight(a.scheduled_at.date() - timedelta(days=a.scheduled_at.weekday()))
+        return start, start + timedelta(days=7)
+
+    def runner(fn):
+        probe = cycle(probes)
+        return lambda: fn(next(probe))
+
+    cache = AppointmentRepository.day_cache
+    scans = max(1, args.iterations // 50)
+    results = {
+        'doctor day, full scan': measure(runner(lambda a: naive(*day_of(a), doctor_id=a.doctor_id)), scans, 1),
+        'doctor day, range scan': measure(runner(lambda a: list(AppointmentRepository.iter_for_doctor(
+            a.doctor_id, *day_of(a)))), args.iterations),
+        'doctor week, range scan': measure(runner(lambda a: list(AppointmentRepository.iter_for_doctor(
+            a.doctor_id, *week_of(a)))), args.iterations),
+        'patient history, full scan': measure(runner(lambda a: naive(
+            datetime.min, datetime.max, patient_id=a.patient_id)), scans, 1),
+        'patient history, range scan': measure(runner(lambda a: AppointmentRepository.list_for_patient(
+            a.patient_id, datetime.min, datetime.max, include_archived=True)), args.iterations),
+        'specialty day, range scan': measure(runner(lambda a: AppointmentRepository.list_for_specialty(
+            specialties[a.doctor_id], *day_of(a))), args.iterations),
+    }
+    if cache.enabled:
+        results['doctor week, cold cache'] = measure(
+            runner(lambda a: (cache.clear(), AppointmentRepository.list_for_doctor(a.doctor_id, *week_of(a)))),
+            args.iterations)
+        for a in probes:
+            AppointmentRepository.list_for_doctor(a.doctor_id, *week_of(a))
+        results['doctor day, cached'] = measure(
+            runner(lambda a: AppointmentRepository.list_for_doctor(a.doctor_id, *day_of(a))), args.iterations)
+        results['doctor week, cached'] = measure(
+            runner(lambda a: AppointmentRepository.list_for_doctor(a.doctor_id, *week_of(a))), args.iterations)
+    print_table(f'calendar windows ({args.appointments:,} appointments)', results)
+    if cache.enabled:
+        stats = cache.stats()
+        print(f'day cache: {stats["size"]:,} doctor-days, hit ratio {stats["hit_ratio"]:.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Duplicate-patient detection: the blocking index against scoring every patient, and
+the offline dedup.py clustering, serial and across a process pool.
+
+Seeds patients with datagen plus --duplicates near-copies of random patients (a
+typo in one name token, age off by up to a year) first; skip with --no-seed on
+reruns. Memory is the tracemalloc peak in this process; with workers, the largest
+worker's max RSS where the platform reports it.
+
+    python -m benchmarks.bench_dedup --patients 1000000 --workers 4
+"""
+import argparse
+import logging
+import random
+import time
+import tracemalloc
+from itertools import cycle
+
+import datagen
+import dedup
+import services
+from blocking import DEDUP_THRESHOLD, ages_close, gender_key, name_tokens, score
+from database import initialize_db, transaction
+from instrumentation import metrics
+from models import Patient
+from repositories import PatientRepository
+from services import PatientService
+from benchmarks._common import measure, print_table
+
+
+def near_copy(p: Patient, rng: random.Random) -> Patient:
+    tokens = p.name.split()
+    i = rng.randrange(len(tokens))
+    word = tokens[i]
+    if word.isalpha() and len(word) > 3:
+        k = rng.randrange(1, len(word))
+        tokens[i] = word[:k] + rng.choice('aeiou') + word[k + 1:]
+    return Patient(None, ' '.join(tokens), max(1, p.age + rng.choice((-1, 0, 1))), p.gender)
+
+
+def seed(patients: int, duplicates: int, seed_: int):
+    datagen.load(patients, 1, 0, seed_, progress=True)
+    rng = random.Random(seed_)
+    originals = PatientRepository.get_many(rng.sample(range(1, patients + 1), duplicates))
+    PatientRepository.add_many(near_copy(p, rng) for p in originals.values())
+
+
+def naive_find(rows: list, name: str, age: int, gender: str) -> list:
+    # What a check costs without blocking: score the new patient against everyone.
+    sorted_name, g = ' '.join(name_tokens(name)), gender_key(gender)
+    return [pid for pid, other, other_age, other_gender in rows
+            if gender_key(other_gender) == g and ages_close(age, other_age)
+            and score(sorted_name, age, other, other_age) >= DEDUP_THRESHOLD]
+
+
+def traced(fn):
+    """(result, seconds, peak MiB) of one call."""
+    tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - t0
+        return result, seconds, tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def create_cost(iterations: int, probes: list) -> dict:
+    # Each create is rolled back, so the dataset stays as it was.
+    probe = cycle(probes)
+
+    def create():
+        p = next(probe)
+        try:
+            with transaction():
+                PatientService.create(p.name, str(p.age), p.gender, allow_duplicate=False)
+                raise LookupError
+        except LookupError:
+            pass
+
+    results, configured = {}, services.DEDUP_MODE
+    try:
+        for mode in ('off', 'warn'):
+            services.DEDUP_MODE = mode
+            results[f'create, dedup {mode}'] = measure(create, iterations)
+    finally:
+        services.DEDUP_MODE = configured
+    return results
+
+
+def _args(p: Patient) -> tuple:
+    return p.name, p.age, p.gender
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=200000)
+    parser.add_argument('--duplicates', type=int, help='near-copies to add (default 1%% of --patients)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--partitions', type=int, default=dedup.DEFAULT_PARTITIONS)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true', help='reuse data from a previous run')
+    args = parser.parse_args()
+
+    metrics.slow_query_seconds = float('inf')
+    logging.getLogger('hospital.dedup').disabled = True
+    initialize_db()
+    if not args.no_seed:
+        seed(args.patients, args.duplicates or max(1, args.patients // 100), args.seed)
+    rng = random.Random(args.seed)
+    probes = [near_copy(p, rng) for p in PatientRepository.get_many(
+        rng.sample(range(1, args.patients + 1), min(args.iterations, args.patients))).values()]
+
+    # --- online: the check PatientService.create makes --- #
+    index = PatientRepository.dedup_index
+    index.reset()
+    _, _, load_mib = traced(lambda: index.candidates('', None, None))
+    index.reset()
+    t0 = time.perf_counter()
+    index.candidates('', None, None)
+    load_seconds = time.perf_counter() - t0
+    stats = index.stats()
+    rows = list(PatientRepository.iter_dedup_rows())
+    probe = cycle(probes)
+    naive_iterations = max(1, args.iterations // 50)
+    results = {
+        'check, blocking index': measure(
+            lambda: index.find(*_args(next(probe)), DEDUP_THRESHOLD), args.iterations - 3, warmup=3),
+        'check, score every patient': measure(
+            lambda: naive_find(rows, *_args(probes[0])), naive_iterations, warmup=1),
+    }
+    results.update(create_cost(args.iterations, probes))
+    print_table(f'online check ({stats["records"]:,} patients)', results)
+    print(f'index load {load_seconds:.2f}s, {load_mib:,.1f} MiB; {stats["blocks"]:,} blocks, largest '
+          f'{stats["largest_block"]}, {stats["comparisons_per_check"]:.1f} comparisons per check '
+          f'against {len(rows):,} without blocking')
+
+    # --- offline: dedup.py --- #
+    print(f'\n{"offline run":<24}{"seconds":>10}{"rows/s":>12}{"comparisons":>14}{"clusters":>10}'
+          f'{"peak MiB":>10}{"worker MiB":>12}')
+    for workers in (1, args.workers):
+        clusters, report = dedup.find_clusters(workers, args.partitions)
+        _, _, peak_mib = traced(lambda: dedup.find_clusters(workers, args.partitions))
+        worker_mib = f'{report.workers_max_rss_kib / 1024:,.1f}' if report.workers_max_rss_kib else '-'
+        print(f'{f"{workers} worker(s)":<24}{report.elapsed:>10.2f}{report.rows_per_sec:>12,.0f}'
+              f'{report.comparisons:>14,}{report.clusters:>10,}{peak_mib:>10,.1f}{worker_mib:>12}')
+    print(f'all-pairs scoring would make {report.rows * (report.rows - 1) // 2:,} comparisons')
+
+
+if __name__ == '__main__':
+    main()
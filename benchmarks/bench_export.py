@@ -0,0 +1,91 @@
+"""Export throughput and peak memory for each output format, against the
+materialize-then-serialize approach (get_detailed_list, then one json.dump).
+
+Peak memory of the streaming export depends on the chunk size, not the row count:
+compare runs with --limit-days to see it stay flat. Seeds a dataset with datagen
+first (skip with --no-seed on reruns):
+
+    python -m benchmarks.bench_export --appointments 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import datagen
+import exporter
+from database import initialize_db
+from instrumentation import metrics
+from repositories import AppointmentRepository
+
+
+def traced(fn):
+    """(rows, seconds, peak bytes); timed untraced, peak from a second, traced run."""
+    t0 = time.perf_counter()
+    rows = fn()
+    seconds = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=exporter.EXPORT_CHUNK_SIZE)
+    parser.add_argument('--limit-days', type=int, help='export only this many days from the first appointment')
+    parser.add_argument('--skip-materialized', action='store_true', help='skip the fetch-everything baseline')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true', help='reuse data from a previous run')
+    args = parser.parse_args()
+
+    metrics.slow_query_seconds = float('inf')
+    initialize_db()
+    if not args.no_seed:
+        datagen.load(max(1, args.appointments // 5), max(1, args.appointments // 200), args.appointments,
+                     args.seed, progress=True)
+
+    filters = {}
+    if args.limit_days:
+        chunks = AppointmentRepository.iter_export(chunk_size=1)     # oldest first
+        start = next(chunks, [[None] * 7])[0][6] or datetime.now()
+        chunks.close()
+        filters = {'start': start, 'end': start + timedelta(days=args.limit_days)}
+
+    out_dir = tempfile.mkdtemp(prefix='bench_export_')
+    print(f'{"output":<24}{"rows":>12}{"rows/s":>12}{"MiB":>10}{"peak MiB":>10}')
+    try:
+        for name in ('export.csv', 'export.jsonl', 'export.csv.gz', 'export.jsonl.gz'):
+            path = os.path.join(out_dir, name)
+            rows, seconds, peak = traced(lambda: exporter.export_rows(
+                'appointments', path, filters=filters, chunk_size=args.chunk_size).rows_written)
+            print(f'{name:<24}{rows:>12,}{rows / seconds:>12,.0f}{os.path.getsize(path) / 2 ** 20:>10.1f}'
+                  f'{peak / 2 ** 20:>10.1f}')
+            os.remove(path)
+
+        if not args.skip_materialized:
+            path = os.path.join(out_dir, 'materialized.json')
+
+            def materialized():
+                rows = AppointmentRepository.get_detailed_list()
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump([{'appointment_id': d.appointment_id, 'patient_id': d.patient_id,
+                                'patient_name': d.patient_name, 'doctor_id': d.doctor_id,
+                                'doctor_name': d.doctor_name, 'scheduled_at': d.scheduled_at,
+                                'notes': d.notes} for d in rows], f, default=str)
+                return len(rows)
+            rows, seconds, peak = traced(materialized)
+            print(f'{"fetchall + json.dump":<24}{rows:>12,}{rows / seconds:>12,.0f}'
+                  f'{os.path.getsize(path) / 2 ** 20:>10.1f}{peak / 2 ** 20:>10.1f}')
+            os.remove(path)
+    finally:
+        os.rmdir(out_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Hot query latency and plans with and without the migration 2 indexes.
+
+Seeds a large dataset (skip with --no-seed on reruns), drops the indexes,
+measures, re-applies the migration and measures again. Plans come from
+SHOWPLAN_TEXT on SQL Server and EXPLAIN QUERY PLAN on SQLite:
+
+    python -m benchmarks.bench_indexes --appointments 1000000
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+import database
+from database import initialize_db, get_connection
+from migrations import migrate
+from models import Patient, Doctor, Appointment
+from repositories import PatientRepository, DoctorRepository, AppointmentRepository
+from benchmarks._common import measure, print_table
+
+INDEXES = {
+    'IX_appointments_scheduled_at': 'appointments',
+    'IX_appointments_doctor_scheduled': 'appointments',
+    'IX_appointments_patient': 'appointments',
+    'IX_doctors_specialty': 'doctors',
+}
+SPECIALTIES = ['Cardiology', 'Dermatology', 'Neurology', 'Oncology', 'Pediatrics', 'Orthopedics',
+               'Radiology', 'Psychiatry', 'Urology', 'Endocrinology']
+
+# Queries with a {top} placeholder get a limit of 50 from the backend.
+QUERIES = {
+    'upcoming (TOP 50)': (
+        'SELECT {top}id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes '
+        'FROM appointments WHERE scheduled_at >= ? ORDER BY scheduled_at, id', 'now'),
+    'detailed join (TOP 50)': (
+        'SELECT {top}a.id, p.id, p.name, d.id, d.name, a.scheduled_at, a.notes FROM appointments a '
+        'JOIN patients p ON a.patient_id = p.id JOIN doctors d ON a.doctor_id = d.id '
+        'ORDER BY a.scheduled_at, a.id', ()),
+    'doctor day': (
+        'SELECT id, scheduled_at, duration_minutes FROM appointments '
+        'WHERE doctor_id = ? AND scheduled_at >= ? AND scheduled_at < ?', None),
+    'patient history': (
+        'SELECT id, scheduled_at FROM appointments WHERE patient_id = ?', None),
+    'specialty LIKE': (
+        'SELECT id, name, specialty, created_at FROM doctors WHERE specialty LIKE ?', ('%ology%',)),
+}
+
+
+def seed(patients: int, doctors: int, appointments: int, seed_value: int):
+    rng = random.Random(seed_value)
+    PatientRepository.add_many(
+        (Patient(None, f'Patient {i}', rng.randint(1, 95), rng.choice('MF')) for i in range(patients)),
+        batch_size=5000
+    )
+    DoctorRepository.add_many(
+        (Doctor(None, f'Doctor {i}', rng.choice(SPECIALTIES)) for i in range(doctors)),
+        batch_size=5000
+    )
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT MIN(id), MAX(id) FROM patients')
+        pmin, pmax = cur.fetchone()
+        cur.execute('SELECT MIN(id), MAX(id) FROM doctors')
+        dmin, dmax = cur.fetchone()
+
+    start = datetime.now() - timedelta(days=3 * 365)
+    AppointmentRepository.add_many(
+        (Appointment(None, rng.randint(pmin, pmax), rng.randint(dmin, dmax),
+                     start + timedelta(minutes=30 * rng.randint(0, 4 * 365 * 48)), None)
+         for _ in range(appointments)),
+        batch_size=5000
+    )
+
+
+def drop_indexes():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for name, table in INDEXES.items():
+            if database.backend.name == 'sqlite':
+                cur.execute(f'DROP INDEX IF EXISTS {name}')
+            else:
+                cur.execute(f'DROP INDEX IF EXISTS {name} ON {table}')
+        cur.execute('DELETE FROM schema_version WHERE version >= 2')
+        # Forces the next startup through the full bootstrap if this run is interrupted.
+        cur.execute('DELETE FROM schema_fingerprint')
+        conn.commit()
+
+
+def sqlite_plan_summary(sql: str, params) -> str:
+    # e.g. "SEARCH appointments USING INDEX IX_appointments_patient (patient_id=?)"
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '; '.join(row[-1] for row in cur.fetchall())
+
+
+def plan_summary(sql: str, params) -> str:
+    # Estimated plan operators, e.g. "Index Seek" vs "Clustered Index Scan".
+    if database.backend.name == 'sqlite':
+        return sqlite_plan_summary(sql, params)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute('SET SHOWPLAN_TEXT ON')
+            cur.execute(sql, params)
+            ops = set()
+            while True:
+                for row in cur.fetchall():
+                    text = row[0]
+                    for op in ('Index Seek', 'Clustered Index Seek', 'Index Scan',
+                               'Clustered Index Scan', 'Table Scan', 'Sort'):
+                        if f'|--{op}' in text or text.lstrip().startswith(op):
+                            ops.add(op)
+                if not cur.nextset():
+                    break
+            return ', '.join(sorted(ops)) or '?'
+        except Exception as e:
+            return f'unavailable ({e.__class__.__name__})'
+        finally:
+            try:
+                cur.execute('SET SHOWPLAN_TEXT OFF')
+            except Exception:
+                pass
+
+
+def run_queries(iterations: int, day: datetime, doctor_id: int, patient_id: int):
+    results, plans = {}, {}
+    for name, (sql, params) in QUERIES.items():
+        if params is None:
+            params = (doctor_id, day, day + timedelta(days=1)) if name == 'doctor day' else (patient_id,)
+        elif params == 'now':
+            params = (datetime.now(),)
+        if '{top}' in sql:
+            sql, params = database.backend.apply_limit(sql, list(params), 50)
+
+        def run(sql=sql, params=params):
+            with get_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(sql, params)
+                cur.fetchall()
+
+        results[name] = measure(run, iterations)
+        plans[name] = plan_summary(sql, params)
+    return results, plans
+
+
+def migrate_latest():
+    with get_connection() as conn:
+        migrate(conn, database.backend)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--doctors', type=int, default=2000)
+    parser.add_argument('--appointments', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-seed', action='store_true', help='reuse data from a previous run')
+    args = parser.parse_args()
+
+    initialize_db()
+    if not args.no_seed:
+        seed(args.patients, args.doctors, args.appointments, args.seed)
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(*database.backend.apply_limit(
+            'SELECT {top}doctor_id, patient_id FROM appointments ORDER BY id', [], 1))
+        doctor_id, patient_id = cur.fetchone()
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    drop_indexes()
+    before, before_plans = run_queries(args.iterations, day, doctor_id, patient_id)
+    migrate_ms = measure(migrate_latest, 1, warmup=0)['mean_ms']
+    after, after_plans = run_queries(args.iterations, day, doctor_id, patient_id)
+
+    print_table('without indexes', before)
+    print_table('with indexes', after)
+    print(f'\nindex build: {migrate_ms / 1000:.1f}s')
+    print(f'\n{"query":<28}{"speedup":>10}  plan before -> after')
+    for name in QUERIES:
+        speedup = before[name]['p50_ms'] / after[name]['p50_ms'] if after[name]['p50_ms'] else float('inf')
+        print(f'{name:<28}{speedup:>9.1f}x  {before_plans[name]} -> {after_plans[name]}')
+
+
+if __name__ == '__main__':
+    main()
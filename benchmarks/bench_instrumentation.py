@@ -0,0 +1,104 @@
+"""Per-statement cost of the instrumentation proxies, measured against an in-memory
+fake driver so only the wrapper overhead shows up:
+
+    python -m benchmarks.bench_instrumentation --statements 100000 --budget-us 10
+
+Exits non-zero when the mean overhead per statement (execute + fetches + method
+label) exceeds the budget.
+"""
+import argparse
+import sys
+import time
+
+from instrumentation import InstrumentedConnection, Metrics, instrument
+
+
+class FakeCursor:
+    rowcount = 1
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._pos = 0
+
+    def execute(self, sql, *params):
+        self._pos = 0
+        return self
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        self._pos += 1
+        return self._rows[self._pos - 1]
+
+    def fetchmany(self, size=1):
+        chunk = self._rows[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def cursor(self):
+        return FakeCursor(self._rows)
+
+
+SQL = 'SELECT id, name, age, gender FROM patients WHERE id = ?'
+
+
+def _workload(conn):
+    def lookup(i):
+        cur = conn.cursor()
+        cur.execute(SQL, (i,))
+        return cur.fetchone()
+
+    def page(i):
+        cur = conn.cursor()
+        cur.execute(SQL, (i,))
+        return cur.fetchmany(20)
+
+    return lookup, page
+
+
+def _run(fn, statements: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(statements):
+        fn(i)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--statements', type=int, default=100000)
+    parser.add_argument('--budget-us', type=float, default=10.0,
+                        help='allowed mean overhead per statement in microseconds')
+    args = parser.parse_args()
+
+    rows = [(i, f'patient {i}', 40, 'F') for i in range(20)]
+    registry = Metrics(slow_query_seconds=60)
+    raw = FakeConnection(rows)
+    wrapped = InstrumentedConnection(FakeConnection(rows), registry)
+
+    worst = 0.0
+    print(f'{"workload":<12}{"raw us":>10}{"instr us":>10}{"overhead us":>14}')
+    for name, raw_fn, inst_fn in zip(('lookup', 'page'), _workload(raw), _workload(wrapped)):
+        inst_fn = instrument(f'Bench.{name}', inst_fn, registry)
+        for fn in (raw_fn, inst_fn):
+            _run(fn, min(1000, args.statements))         # warm-up
+        base = _run(raw_fn, args.statements) / args.statements * 1e6
+        inst = _run(inst_fn, args.statements) / args.statements * 1e6
+        wrapped.finish()
+        worst = max(worst, inst - base)
+        print(f'{name:<12}{base:>10.2f}{inst:>10.2f}{inst - base:>14.2f}')
+
+    status = 'within' if worst <= args.budget_us else 'OVER'
+    print(f'\nworst overhead {worst:.2f} us/statement, {status} budget of {args.budget_us:.2f} us')
+    sys.exit(0 if worst <= args.budget_us else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Memory per row and build time of large appointment reads, for each result shape.
+
+"Before" rows are the previous shapes (plain dataclasses, a dict per detailed
+row); the others are the slotted models, frozen slotted models and columnar mode.
+Seeds a dataset with datagen first (skip with --no-seed on reruns):
+
+    python -m benchmarks.bench_memory --rows 200000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import datagen
+from database import initialize_db
+from instrumentation import metrics
+from models import row_mapper
+from repositories import AppointmentRepository, _appointment, _appointment_detail, _iter_query, _values
+
+
+@dataclass
+class LegacyAppointment:
+    id: Optional[int]
+    patient_id: int
+    doctor_id: int
+    scheduled_at: datetime
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+    duration_minutes: int = 30
+
+
+@dataclass(slots=True, frozen=True)
+class FrozenAppointment:
+    id: Optional[int]
+    patient_id: int
+    doctor_id: int
+    scheduled_at: datetime
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+    duration_minutes: int = 30
+
+
+def _legacy_detail(*r) -> dict:
+    return {'appointment_id': r[0], 'patient_id': r[1], 'patient_name': r[2], 'doctor_id': r[3],
+            'doctor_name': r[4], 'scheduled_at': r[5], 'notes': r[6]}
+
+
+def traced(fn):
+    """(result, bytes still allocated by fn, seconds). Timed on a separate untraced
+    run, since tracing slows allocation down."""
+    t0 = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - t0
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true', help='reuse data from a previous run')
+    args = parser.parse_args()
+
+    metrics.slow_query_seconds = float('inf')     # large reads are the point here
+    initialize_db()
+    if not args.no_seed:
+        datagen.load(max(1, args.rows // 5), max(1, args.rows // 200), args.rows, args.seed, progress=True)
+
+    all_query = AppointmentRepository._all_query(False, None, None, args.rows)
+    detail_query = AppointmentRepository._detailed_query(None, None, args.rows)
+    frozen = row_mapper(FrozenAppointment)
+    # Rows are built through the same fetch loop, so only the shape differs.
+    shapes = {
+        'appointments: dataclass (before)': lambda: list(_iter_query(*all_query, LegacyAppointment)),
+        'appointments: slotted': lambda: list(_iter_query(*all_query, _appointment)),
+        'appointments: slotted, frozen': lambda: list(_iter_query(*all_query, frozen)),
+        'appointments: columnar': lambda: AppointmentRepository.list_all(limit=args.rows, columnar=True),
+        'detailed: dict (before)': lambda: list(_iter_query(*detail_query, _legacy_detail)),
+        'detailed: slotted': lambda: list(_iter_query(*detail_query, _appointment_detail)),
+        'detailed: columnar': lambda: AppointmentRepository.get_detailed_list(limit=args.rows, columnar=True),
+    }
+
+    raw, raw_size, _ = traced(lambda: list(_iter_query(*all_query, _values)))
+    n = len(raw)
+    print(f'{n:,} rows; plain tuples take {raw_size / n:.0f} bytes/row')
+    del raw
+    print(f'{"shape":<36}{"bytes/row":>12}{"build ms":>12}')
+    for name, fn in shapes.items():
+        result, size, seconds = traced(fn)
+        print(f'{name:<36}{size / max(len(result), 1):>12.0f}{seconds * 1000:>12.0f}')
+        del result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Resolving batches of ids: a get_by_id loop against get_many, cold and cached.
+
+    python -m benchmarks.bench_multiget --sizes 10,100,1000,10000
+"""
+import argparse
+import random
+
+from database import initialize_db
+from datagen import generate_patients
+from repositories import PatientRepository
+from benchmarks._common import measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--missing', type=float, default=0.05, help='share of requested ids that do not exist')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    initialize_db()
+    pids = PatientRepository.add_many(generate_patients(max(sizes), args.seed))
+    rng = random.Random(args.seed)
+    cache = PatientRepository.cache
+    enabled = cache.enabled
+
+    def batch(n):
+        ids = rng.sample(pids, n)
+        for i in range(int(n * args.missing)):
+            ids[i] = -1 - i
+        return ids
+
+    print(f'{"ids":>7}{"loop p50 ms":>14}{"get_many p50 ms":>17}{"cached p50 ms":>15}{"speedup":>10}')
+    try:
+        for n in sizes:
+            ids = batch(n)
+            cache.enabled = False
+            loop = measure(lambda: [PatientRepository.get_by_id(i) for i in ids],
+                           max(3, args.iterations // 4), warmup=1)
+            cold = measure(lambda: PatientRepository.get_many(ids), args.iterations, warmup=1)
+            cache.enabled = True
+            cache.clear()
+            PatientRepository.get_many(ids)
+            warm = measure(lambda: PatientRepository.get_many(ids), args.iterations, warmup=1)
+            print(f'{n:>7}{loop["p50_ms"]:>14.2f}{cold["p50_ms"]:>17.2f}{warm["p50_ms"]:>15.2f}'
+                  f'{loop["p50_ms"] / cold["p50_ms"]:>9.0f}x')
+    finally:
+        cache.enabled = enabled
+        for pid in pids:
+            PatientRepository.delete(pid)
+
+
+if __name__ == '__main__':
+    main()
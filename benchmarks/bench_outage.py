@@ -0,0 +1,130 @@
+"""Caller latency and driver load during a simulated outage, with and without the
+circuit breaker. Uses a fake driver, so no database is needed:
+
+    python -m benchmarks.bench_outage --outage 3 --clients 8
+
+Each client calls get_connection() in a loop. The fake server refuses
+connections for --outage seconds and then comes back.
+"""
+import argparse
+import threading
+import time
+
+import database
+from benchmarks._common import summarize
+from resilience import CircuitBreaker
+
+
+class FakeDriverError(Exception):
+    pass
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self._server = server
+
+    def execute(self, sql, *params):
+        self._server.check()
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self._server = server
+
+    def cursor(self):
+        return FakeCursor(self._server)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        self._server.check()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeServer:
+    def __init__(self, outage: float, connect_timeout: float):
+        self.down_until = time.monotonic() + outage
+        self.connect_timeout = connect_timeout
+        self.connects = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        if time.monotonic() < self.down_until:
+            time.sleep(self.connect_timeout)
+            raise FakeDriverError('08001', '[08001] Could not open a connection to SQL Server [53]. (53)')
+
+    def connect(self, conn_str, **kwargs):
+        with self._lock:
+            self.connects += 1
+        self.check()
+        return FakeConnection(self)
+
+
+def _run(label: str, args, breaker_threshold: int):
+    server = FakeServer(args.outage, args.connect_timeout)
+    database.backend.driver_connect = server.connect
+    database.close_pools()
+    with database._pools_lock:
+        database._breakers.clear()
+        database._breakers[database.SERVER] = CircuitBreaker(breaker_threshold, args.reset)
+
+    failures, successes = [], []
+    recovered_at = []
+    stop = time.monotonic() + args.outage + args.after
+
+    def client():
+        while time.monotonic() < stop:
+            t0 = time.perf_counter()
+            try:
+                with database.get_connection() as conn:
+                    conn.cursor().execute('SELECT 1').fetchone()
+            except Exception:
+                failures.append(time.perf_counter() - t0)
+            else:
+                successes.append(time.perf_counter() - t0)
+                if not recovered_at:
+                    recovered_at.append(time.monotonic())
+            time.sleep(args.think)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    f = summarize(failures)
+    recovery = recovered_at[0] - server.down_until if recovered_at else float('nan')
+    print(f'{label:<16}{len(failures):>10}{f["p50_ms"]:>10.1f}{f["p99_ms"]:>10.1f}'
+          f'{server.connects:>14}{recovery:>14.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--outage', type=float, default=3.0, help='seconds the server is down')
+    parser.add_argument('--after', type=float, default=2.0, help='seconds to keep running after recovery')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--connect-timeout', type=float, default=0.05, help='time a refused connect takes')
+    parser.add_argument('--think', type=float, default=0.01, help='pause between a client\'s requests')
+    parser.add_argument('--reset', type=float, default=0.5, help='breaker reset timeout for the run')
+    args = parser.parse_args()
+
+    database.AUTO_INIT = False
+    database.METRICS_ENABLED = False
+    print(f'{"mode":<16}{"failed":>10}{"p50 ms":>10}{"p99 ms":>10}{"connects":>14}{"recovery s":>14}')
+    _run('no breaker', args, breaker_threshold=10 ** 9)
+    _run('breaker', args, breaker_threshold=database.BREAKER_THRESHOLD)
+    database.close_pools()
+
+
+if __name__ == '__main__':
+    main()
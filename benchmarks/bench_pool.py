@@ -0,0 +1,53 @@
+"""Pooled vs unpooled latency of the repository methods.
+
+Run from the project root against a scratch database:
+
+    python -m benchmarks.bench_pool --iterations 200
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import database
+from database import initialize_db
+from models import Patient, Doctor, Appointment
+from repositories import PatientRepository, DoctorRepository, AppointmentRepository
+from benchmarks._common import measure, print_table
+
+
+def _operations(pid: int, did: int):
+    when = datetime.now() + timedelta(days=30)
+
+    def add_and_delete_appointment():
+        aid = AppointmentRepository.add(Appointment(None, pid, did, when, 'bench'))
+        AppointmentRepository.delete(aid)
+
+    return {
+        'PatientRepository.get_by_id': lambda: PatientRepository.get_by_id(pid),
+        'DoctorRepository.get_by_id': lambda: DoctorRepository.get_by_id(did),
+        'PatientRepository.search_by_name': lambda: PatientRepository.search_by_name('bench'),
+        'AppointmentRepository.add+delete': add_and_delete_appointment,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    initialize_db()
+    pid = PatientRepository.add(Patient(None, 'bench patient', 40, 'O'))
+    did = DoctorRepository.add(Doctor(None, 'bench doctor', 'Benchmarking'))
+
+    try:
+        for pooled in (False, True):
+            database.POOL_ENABLED = pooled
+            results = {name: measure(fn, args.iterations) for name, fn in _operations(pid, did).items()}
+            print_table('pooled' if pooled else 'unpooled (connect per call)', results)
+        print('\npool stats:', database.pool_stats())
+    finally:
+        PatientRepository.delete(pid)
+        DoctorRepository.delete(did)
+
+
+if __name__ == '__main__':
+    main()
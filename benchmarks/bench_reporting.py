@@ -0,0 +1,106 @@
+"""Reports from the daily summary table against scanning the appointments for each one.
+
+The naive side is what a report costs without the summary: iter_all() over the whole
+history and a Python tally. Also times reporting.rebuild() and the extra cost the
+summary upsert adds to a booking. Seeds a dataset with datagen first (skip with
+--no-seed on reruns):
+
+    python -m benchmarks.bench_reporting --appointments 1000000
+"""
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import datagen
+import reporting
+from database import initialize_db, transaction
+from instrumentation import metrics
+from models import Appointment
+from repositories import AppointmentRepository, DoctorRepository
+from benchmarks._common import measure, print_table
+
+
+def naive_per_doctor(start: date, end: date) -> dict:
+    counts, minutes = Counter(), Counter()
+    for a in AppointmentRepository.iter_all():
+        if start <= a.scheduled_at.date() < end:
+            counts[a.doctor_id] += 1
+            minutes[a.doctor_id] += a.duration_minutes
+    return {did: (counts[did], minutes[did]) for did in counts}
+
+
+def naive_per_specialty(start: date, end: date) -> dict:
+    specialty = {d.id: d.specialty for d in DoctorRepository.list_all()}
+    counts = Counter()
+    for a in AppointmentRepository.iter_all():
+        if start <= a.scheduled_at.date() < end:
+            counts[specialty.get(a.doctor_id)] += 1
+    return dict(counts)
+
+
+def naive_daily(start: date, end: date) -> dict:
+    return dict(Counter(d for d in (a.scheduled_at.date() for a in AppointmentRepository.iter_all())
+                        if start <= d < end))
+
+
+def booking_cost(iterations: int, doctor_id: int, patient_id: int) -> dict:
+    # Each booking is rolled back, so the dataset and the summary stay as they were.
+    slot = [datetime.now() + timedelta(days=3650)]
+
+    def book():
+        slot[0] += timedelta(minutes=30)
+        try:
+            with transaction():
+                AppointmentRepository.add(Appointment(None, patient_id, doctor_id, slot[0], 'bench', None, 30))
+                raise LookupError
+        except LookupError:
+            pass
+
+    results, configured = {}, reporting.ENABLED
+    try:
+        for enabled in (False, True):
+            reporting.ENABLED = enabled
+            results[f'add, summary {"on" if enabled else "off"}'] = measure(book, iterations)
+    finally:
+        reporting.ENABLED = configured
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=30, help='length of the reported range')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true', help='reuse data from a previous run')
+    args = parser.parse_args()
+
+    metrics.slow_query_seconds = float('inf')
+    initialize_db()
+    if not args.no_seed:
+        datagen.load(max(1, args.appointments // 5), max(1, args.appointments // 200), args.appointments,
+                     args.seed, progress=True)
+    first = AppointmentRepository.list_all(True, limit=1)[0]
+    start = first.scheduled_at.date()
+    end = start + timedelta(days=args.days)
+
+    if naive_per_doctor(start, end) != reporting.per_doctor(start, end):
+        raise SystemExit('summary table is out of date; run: python reporting.py rebuild')
+
+    scans = max(1, args.iterations // 10)
+    results = {
+        'per doctor, naive scan': measure(lambda: naive_per_doctor(start, end), scans, warmup=1),
+        'per doctor, summary': measure(lambda: reporting.per_doctor(start, end), args.iterations),
+        'per specialty, naive scan': measure(lambda: naive_per_specialty(start, end), scans, warmup=1),
+        'per specialty, summary': measure(lambda: reporting.per_specialty(start, end), args.iterations),
+        'daily volume, naive scan': measure(lambda: naive_daily(start, end), scans, warmup=1),
+        'daily volume, summary': measure(lambda: reporting.daily_volume(start, end), args.iterations),
+        'utilization, summary': measure(lambda: reporting.utilization(start, end), args.iterations),
+        'rebuild': measure(reporting.rebuild, max(1, scans // 2), warmup=0),
+    }
+    results.update(booking_cost(args.iterations * 4, first.doctor_id, first.patient_id))
+    print_table(f'reports over {args.days} days ({args.appointments:,} appointments)', results)
+
+
+if __name__ == '__main__':
+    main()
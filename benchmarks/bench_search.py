@@ -0,0 +1,81 @@
+"""Trigram index vs LIKE '%x%' for patient name search.
+
+Without --db only the in-memory index is exercised (build time, memory, query
+latency over synthetic names). With --db the names are also loaded into the
+patients table and every query is checked against the LIKE result:
+
+    python -m benchmarks.bench_search --rows 1000000
+    python -m benchmarks.bench_search --rows 1000000 --db
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks._common import measure, print_table
+from datagen import generate_patients
+from search_index import TrigramIndex
+
+QUERIES = ['john', 'smith', 'mar', 'patel', 'ez', 'zzz', 'yuki sa', 'olga petrova']
+FUZZY = ['jhon smith', 'patrica', 'willaims']
+
+
+def synthetic_names(rows: int, seed: int):
+    for i, p in enumerate(generate_patients(rows, seed), 1):
+        yield i, p.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=3)
+    parser.add_argument('--db', action='store_true', help='also compare against LIKE in the database')
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    index = TrigramIndex(lambda after_id: synthetic_names(args.rows, args.seed) if after_id is None else ())
+    index.search('warm')
+    build = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'index build: {args.rows:,} rows in {build:.2f}s, peak {peak / 2**20:.0f} MiB '
+          f'({peak / args.rows:.0f} B/row)')
+
+    results = {f'index search {q!r}': measure(lambda q=q: index.search(q), args.iterations) for q in QUERIES}
+    results.update({f'index similar {q!r}': measure(lambda q=q: index.similar(q), args.iterations) for q in FUZZY})
+    print_table('in-memory trigram index', results)
+
+    if args.db:
+        compare_with_like(args)
+
+
+def compare_with_like(args):
+    import repositories
+    from database import initialize_db
+    from models import Patient
+    from repositories import PatientRepository
+
+    initialize_db()
+    PatientRepository.add_many(
+        (Patient(None, name, 40, 'O') for _, name in synthetic_names(args.rows, args.seed)), batch_size=5000
+    )
+    PatientRepository.name_index.reset()
+
+    results = {}
+    for q in QUERIES:
+        repositories.SEARCH_INDEX_ENABLED = False
+        like_ids = [p.id for p in PatientRepository.iter_search_by_name(q)]
+        results[f'LIKE {q!r}'] = measure(lambda q=q: PatientRepository.search_by_name(q, limit=50),
+                                         args.iterations, warmup=1)
+        repositories.SEARCH_INDEX_ENABLED = True
+        index_ids = [p.id for p in PatientRepository.iter_search_by_name(q)]
+        results[f'index {q!r}'] = measure(lambda q=q: PatientRepository.search_by_name(q, limit=50),
+                                          args.iterations, warmup=1)
+        status = 'same' if like_ids == index_ids else f'DIFFERENT ({len(like_ids)} vs {len(index_ids)})'
+        print(f'{q!r}: {len(like_ids)} matches, index result {status}')
+    print_table('database: LIKE vs trigram index (first page of 50)', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Startup cost: full schema bootstrap vs fingerprint check vs --no-init.
+
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import database
+from benchmarks._common import measure, print_table
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Starts the console, makes one repository call (which triggers the lazy schema
+# check) and exits.
+FIRST_CALL = '3\nnobody-matches-this\n0\n'
+
+
+def _run_main(extra_args, stdin: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py', *extra_args], input=stdin, text=True,
+                   cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    database.initialize_db(force=True)
+
+    in_process = {
+        'initialize_db(force=True)': measure(lambda: database.initialize_db(force=True), args.runs, warmup=1),
+        'initialize_db() fingerprint hit': measure(database.initialize_db, args.runs, warmup=1),
+        'schema_is_current()': measure(database.schema_is_current, args.runs, warmup=1),
+    }
+    print_table('in process', in_process)
+
+    process = {}
+    for label, extra in (('main.py (lazy init)', []), ('main.py --no-init', ['--no-init'])):
+        process[label] = measure(lambda extra=extra: _run_main(extra, FIRST_CALL), args.runs, warmup=1)
+    print_table('process start to first query and exit', process)
+
+
+if __name__ == '__main__':
+    main()
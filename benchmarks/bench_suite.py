@@ -0,0 +1,344 @@
+"""Every service method at a chosen data scale and concurrency, with JSON results
+and a baseline comparison to catch regressions.
+
+Runs against a local SQLite file by default (seeded once with datagen and reused
+while the scale and seed match), so no server or network is needed:
+
+    python -m benchmarks.bench_suite --scale 10k --concurrency 1,8 --out baseline.json
+    python -m benchmarks.bench_suite --scale 10k --concurrency 1,8 --baseline baseline.json
+
+With --baseline the exit status is 1 when any operation's p95 latency or
+throughput is worse than the baseline by more than --tolerance.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks._common import summarize
+
+# scale -> (patients, doctors, appointments)
+SCALES = {
+    '10k': (2000, 50, 10000),
+    '100k': (20000, 200, 100000),
+    '1m': (200000, 2000, 1000000),
+    '10m': (2000000, 10000, 10000000),
+}
+FMT = '%Y-%m-%d %H:%M'
+
+
+class Workload:
+    """Shared state for the operations: id ranges, rows created for later updates and
+    deletes, and unique far-future slots so scheduling never conflicts."""
+
+    def __init__(self, patient_range, doctor_range, data_start: datetime):
+        self.patient_range = patient_range
+        self.doctor_range = doctor_range
+        self.data_start = data_start
+        self.created = {'patients': [], 'doctors': [], 'appointments': []}
+        self._slots = itertools.count()
+        self._slot_base = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=3650)
+        self._lock = threading.Lock()
+
+    def pid(self, rng):
+        return rng.randint(*self.patient_range)
+
+    def did(self, rng):
+        return rng.randint(*self.doctor_range)
+
+    def slot(self) -> str:
+        with self._lock:
+            n = next(self._slots)
+        return (self._slot_base + timedelta(minutes=30 * n)).strftime(FMT)
+
+    def keep(self, kind: str, ids):
+        with self._lock:
+            self.created[kind].extend(ids if isinstance(ids, list) else [ids])
+
+    def take(self, kind: str):
+        with self._lock:
+            return self.created[kind].pop() if self.created[kind] else None
+
+    def peek(self, kind: str, rng):
+        with self._lock:
+            items = self.created[kind]
+            return rng.choice(items) if items else None
+
+
+def operations(w: Workload):
+    from datagen import LAST_NAMES, SPECIALTIES
+    from services import PatientService, DoctorService, AppointmentService
+
+    def when(rng):
+        return (w.data_start + timedelta(days=rng.randint(0, 60), hours=rng.randint(8, 17))).strftime(FMT)
+
+    def update_patient(rng):
+        pid = w.peek('patients', rng)
+        if pid is not None:
+            PatientService.update(pid, f'suite patient {pid}', '41', 'M')
+
+    def update_doctor(rng):
+        did = w.peek('doctors', rng)
+        if did is not None:
+            DoctorService.update(did, f'suite doctor {did}', 'Benchmarking')
+
+    def delete(kind, fn):
+        def run(rng):
+            rid = w.take(kind)
+            if rid is not None:
+                fn(rid)
+        return run
+
+    # Creates run before the updates and deletes that consume their rows.
+    return {
+        'PatientService.validate': lambda rng: PatientService.validate('Ann Lee', '30', 'F'),
+        'PatientService.create': lambda rng: w.keep('patients', PatientService.create('suite patient', '40', 'F')),
+        'PatientService.get_by_id': lambda rng: PatientService.get_by_id(w.pid(rng)),
+        'PatientService.get_many': lambda rng: PatientService.get_many([w.pid(rng) for _ in range(100)]),
+        'PatientService.list_all': lambda rng: PatientService.list_all(after_id=w.pid(rng), limit=20),
+        'PatientService.search': lambda rng: PatientService.search(rng.choice(LAST_NAMES).lower(), limit=20),
+        'PatientService.search_similar': lambda rng: PatientService.search_similar(
+            rng.choice(LAST_NAMES)[:-1] + 'x'),
+        'PatientService.update': update_patient,
+        'PatientService.delete': delete('patients', PatientService.delete),
+        'DoctorService.validate': lambda rng: DoctorService.validate('Dr. Lee', 'Cardiology'),
+        'DoctorService.create': lambda rng: w.keep('doctors', DoctorService.create('suite doctor', 'Benchmarking')),
+        'DoctorService.get_by_id': lambda rng: DoctorService.get_by_id(w.did(rng)),
+        'DoctorService.get_many': lambda rng: DoctorService.get_many([w.did(rng) for _ in range(20)]),
+        'DoctorService.list_all': lambda rng: DoctorService.list_all(after_id=w.did(rng), limit=20),
+        'DoctorService.search': lambda rng: DoctorService.search(rng.choice(SPECIALTIES)[0][:5].lower(), limit=20),
+        'DoctorService.search_similar': lambda rng: DoctorService.search_similar('cardiolgy'),
+        'DoctorService.update': update_doctor,
+        'DoctorService.delete': delete('doctors', DoctorService.delete),
+        'AppointmentService.validate': lambda rng: AppointmentService.validate('1', '1', w.slot()),
+        'AppointmentService.schedule': lambda rng: w.keep('appointments', AppointmentService.schedule(
+            str(w.pid(rng)), str(w.did(rng)), w.slot())),
+        'AppointmentService.schedule_many': lambda rng: w.keep('appointments', AppointmentService.schedule_many(
+            [(str(w.pid(rng)), str(w.did(rng)), w.slot()) for _ in range(3)])),
+        'AppointmentService.find_next_free_slot': lambda rng: AppointmentService.find_next_free_slot(
+            str(w.did(rng)), after_raw=when(rng)),
+        'AppointmentService.list_upcoming': lambda rng: AppointmentService.list_upcoming(limit=20),
+        'AppointmentService.list_detailed': lambda rng: AppointmentService.list_detailed(limit=20),
+        'AppointmentService.with_names': lambda rng: AppointmentService.with_names(
+            AppointmentService.list_upcoming(limit=20)),
+        'AppointmentService.cancel': delete('appointments', lambda aid: AppointmentService.cancel(str(aid))),
+    }
+
+
+def run_level(fn, calls: int, concurrency: int, seed: int) -> dict:
+    latencies = []
+    errors = []
+    per_thread = [calls // concurrency + (1 if t < calls % concurrency else 0) for t in range(concurrency)]
+
+    def worker(t: int, n: int):
+        rng = random.Random(seed * 1000 + t)
+        local = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            try:
+                fn(rng)
+            except Exception as e:
+                errors.append(repr(e))
+            local.append(time.perf_counter() - t0)
+        latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(t, n)) for t, n in enumerate(per_thread)]
+    started = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - started
+    stats = summarize(latencies)
+    stats['throughput'] = len(latencies) / wall if wall else 0.0
+    stats['errors'] = len(errors)
+    if errors:
+        stats['first_error'] = errors[0]
+    return stats
+
+
+def peak_memory_kib(fn, calls: int, seed: int) -> float:
+    rng = random.Random(seed)
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            fn(rng)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _max_rss_kib():
+    try:
+        import resource
+    except ImportError:     # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 if sys.platform == 'darwin' else rss
+
+
+def prepare_data(args, counts) -> dict:
+    """Seed the database unless it already holds this scale and seed; returns dataset info."""
+    import database
+    import datagen
+    from database import get_connection, initialize_db
+
+    patients, doctors, appointments = counts
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    wanted = {'counts': list(counts), 'seed': args.seed}
+    meta_path = f'{database.SQLITE_PATH}.meta.json' if database.backend.name == 'sqlite' else None
+
+    existing = None
+    if meta_path and os.path.exists(meta_path) and not args.reseed:
+        with open(meta_path) as f:
+            existing = json.load(f)
+        if {k: existing.get(k) for k in wanted} != wanted:
+            existing = None
+    if meta_path and existing is None:
+        for suffix in ('', '-wal', '-shm', '.meta.json'):
+            if os.path.exists(database.SQLITE_PATH + suffix):
+                os.remove(database.SQLITE_PATH + suffix)
+
+    initialize_db()
+    if existing is None and (meta_path or args.reseed):
+        # Data starts a month back, so there is history and upcoming work.
+        start = today - timedelta(days=30)
+        info = datagen.load(patients, doctors, appointments, args.seed, start=start, progress=True)
+        existing = dict(wanted, data_start=start.strftime(FMT), load_seconds=info['seconds'])
+        if meta_path:
+            with open(meta_path, 'w') as f:
+                json.dump(existing, f)
+    elif existing is None:
+        existing = dict(wanted, data_start=(today - timedelta(days=30)).strftime(FMT))
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT MIN(id), MAX(id) FROM patients')
+        existing['patient_range'] = list(cur.fetchone())
+        cur.execute('SELECT MIN(id), MAX(id) FROM doctors')
+        existing['doctor_range'] = list(cur.fetchone())
+    return existing
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_ms: float) -> list:
+    regressions = []
+    print(f'\n{"operation":<42}{"clients":>8}{"p95 base":>10}{"p95 now":>10}{"tput base":>11}{"tput now":>11}')
+    for op, levels in results.items():
+        for level, now in levels.items():
+            base = baseline.get(op, {}).get(level)
+            if not base or level == 'peak_kib':
+                continue
+            slower = (now['p95_ms'] > base['p95_ms'] * (1 + tolerance)
+                      and now['p95_ms'] - base['p95_ms'] > min_ms)
+            fewer = now['throughput'] < base['throughput'] * (1 - tolerance)
+            flag = '  REGRESSION' if slower or fewer else ''
+            if flag:
+                regressions.append((op, level))
+            print(f'{op:<42}{level:>8}{base["p95_ms"]:>10.3f}{now["p95_ms"]:>10.3f}'
+                  f'{base["throughput"]:>11.0f}{now["throughput"]:>11.0f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    parser.add_argument('--patients', type=int, help='override the scale preset')
+    parser.add_argument('--doctors', type=int)
+    parser.add_argument('--appointments', type=int)
+    parser.add_argument('--concurrency', default='1,8')
+    parser.add_argument('--iterations', type=int, default=200, help='calls per operation and level')
+    parser.add_argument('--memory-calls', type=int, default=20, help='calls traced for peak memory')
+    parser.add_argument('--only', help='comma-separated substrings of operation names to run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--backend', default='sqlite', help='sqlite (default) or sqlserver')
+    parser.add_argument('--db-path', help='SQLite file (default bench_suite_<scale>.db)')
+    parser.add_argument('--reseed', action='store_true', help='regenerate the dataset')
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--baseline', help='compare against a previous --out file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--min-ms', type=float, default=0.1, help='ignore p95 changes smaller than this')
+    args = parser.parse_args()
+
+    # Must be set before database is imported.
+    os.environ['DB_BACKEND'] = args.backend
+    if args.backend == 'sqlite':
+        os.environ['DB_PATH'] = args.db_path or f'bench_suite_{args.scale}.db'
+
+    preset = SCALES[args.scale]
+    counts = (args.patients or preset[0], args.doctors or preset[1], args.appointments or preset[2])
+    dataset = prepare_data(args, counts)
+
+    w = Workload(dataset['patient_range'], dataset['doctor_range'],
+                 datetime.strptime(dataset['data_start'], FMT))
+    ops = operations(w)
+    if args.only:
+        wanted = args.only.split(',')
+        ops = {name: fn for name, fn in ops.items() if any(s in name for s in wanted)}
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    results = {}
+    print(f'{"operation":<42}{"clients":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"ops/s":>10}{"peak KiB":>10}')
+    for level in levels:
+        for name, fn in ops.items():
+            first = time.perf_counter()
+            fn(random.Random(args.seed))        # first call pays lazy index loads
+            first_ms = (time.perf_counter() - first) * 1000
+            stats = run_level(fn, args.iterations, level, args.seed)
+            stats['first_call_ms'] = first_ms
+            entry = results.setdefault(name, {})
+            entry[str(level)] = stats
+            if 'peak_kib' not in entry:
+                entry['peak_kib'] = peak_memory_kib(fn, args.memory_calls, args.seed)
+            print(f'{name:<42}{level:>8}{stats["p50_ms"]:>9.3f}{stats["p95_ms"]:>9.3f}{stats["p99_ms"]:>9.3f}'
+                  f'{stats["throughput"]:>10.0f}{entry["peak_kib"]:>10.0f}'
+                  + (f'  {stats["errors"]} errors, e.g. {stats["first_error"]}' if stats['errors'] else ''))
+
+    # Anything created and not consumed by the delete/cancel operations.
+    from repositories import PatientRepository, DoctorRepository, AppointmentRepository
+    for aid in w.created['appointments']:
+        AppointmentRepository.delete(aid)
+    for pid in w.created['patients']:
+        PatientRepository.delete(pid)
+    for did in w.created['doctors']:
+        DoctorRepository.delete(did)
+
+    report = {
+        'meta': {
+            'scale': args.scale,
+            'counts': dict(zip(('patients', 'doctors', 'appointments'), counts)),
+            'seed': args.seed,
+            'backend': args.backend,
+            'concurrency': levels,
+            'iterations': args.iterations,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'run_at': datetime.now().isoformat(timespec='seconds'),
+            'max_rss_kib': _max_rss_kib(),
+            'dataset': dataset,
+        },
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f'\nresults written to {args.out}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance, args.min_ms)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}')
+            sys.exit(1)
+        print('\nno regressions')
+
+
+if __name__ == '__main__':
+    main()
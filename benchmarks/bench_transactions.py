@@ -0,0 +1,79 @@
+"""Per-call commits vs one transaction for "create a patient, then book three appointments".
+
+    python -m benchmarks.bench_transactions --workflows 200
+
+Round trips are the statements sent plus commits, taken from the query metrics;
+checkouts are connection-pool checkouts.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import database
+from database import initialize_db, transaction
+from instrumentation import metrics
+from repositories import PatientRepository, DoctorRepository, AppointmentRepository
+from services import PatientService, DoctorService, AppointmentService
+
+
+def _workflow(n: int, did: int, base: datetime):
+    pid = PatientService.create(f'tx bench {n}', '40', 'F')
+    for k in range(3):
+        when = base + timedelta(hours=n * 3 + k)
+        AppointmentService.schedule(str(pid), str(did), when.strftime('%Y-%m-%d %H:%M'))
+    return pid
+
+
+def _checkouts() -> int:
+    return sum(s['checkouts'] for s in database.pool_stats().values())
+
+
+def _run(label: str, workflows: int, did: int, base: datetime, batched: bool):
+    metrics.reset()
+    checkouts = _checkouts()
+    pids = []
+    t0 = time.perf_counter()
+    for n in range(workflows):
+        if batched:
+            with transaction():
+                pids.append(_workflow(n, did, base))
+        else:
+            pids.append(_workflow(n, did, base))
+    wall = time.perf_counter() - t0
+    snap = metrics.snapshot()
+    statements = sum(s['count'] for s in snap['statements'])
+    commits = snap['commit']['count']
+    print(f'{label:<20}{wall:>10.2f}{workflows / wall:>14.1f}{(statements + commits) / workflows:>16.1f}'
+          f'{commits / workflows:>12.1f}{(_checkouts() - checkouts) / workflows:>14.1f}')
+    return pids
+
+
+def _cleanup(pids):
+    for a in AppointmentRepository.list_all():
+        if a.patient_id in pids:
+            AppointmentRepository.delete(a.id)
+    for pid in pids:
+        PatientRepository.delete(pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workflows', type=int, default=200)
+    args = parser.parse_args()
+
+    initialize_db()
+    did = DoctorService.create('tx bench', 'Benchmarking')
+    base = (datetime.now() + timedelta(days=365)).replace(minute=0, second=0, microsecond=0)
+
+    print(f'{"mode":<20}{"wall s":>10}{"workflows/s":>14}{"trips/workflow":>16}'
+          f'{"commits":>12}{"checkouts":>14}')
+    try:
+        for label, batched, offset in (('per-call commits', False, 0), ('transaction()', True, 1)):
+            pids = _run(label, args.workflows, did, base + timedelta(days=365 * offset), batched)
+            _cleanup(set(pids))
+    finally:
+        DoctorRepository.delete(did)
+
+
+if __name__ == '__main__':
+    main()
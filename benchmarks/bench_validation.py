@@ -0,0 +1,111 @@
+"""Validation throughput: the per-call service validators against validate_batch,
+serial and across a process pool, on import-style rows of strings.
+
+Datetimes are written in --datetime-format; the per-call parse_datetime tries the
+formats in order, so the later ones in utils.DATETIME_FORMATS cost it the most:
+
+    python -m benchmarks.bench_validation --rows 200000 --workers 4 --datetime-format "%d-%m-%Y %H:%M"
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from datagen import generate_appointments, generate_patients
+from services import AppointmentService, PatientService
+from utils import DatetimeParser, parse_datetime
+from validation import validate_batch, PARALLEL_MIN_ROWS
+
+
+def patient_rows(n: int, invalid: float, seed: int) -> list:
+    rng = random.Random(seed)
+    rows = [{'name': p.name, 'age': str(p.age), 'gender': p.gender} for p in generate_patients(n, seed)]
+    for row in rng.sample(rows, int(n * invalid)):
+        row['gender'] = 'X'
+    return rows
+
+
+def appointment_rows(n: int, invalid: float, fmt: str, seed: int) -> list:
+    rng = random.Random(seed)
+    start = datetime(datetime.now().year + 1, 1, 1)
+    rows = [{'patient_id': str(a.patient_id), 'doctor_id': str(a.doctor_id),
+             'scheduled_at': a.scheduled_at.strftime(fmt), 'notes': a.notes or '',
+             'duration_minutes': str(a.duration_minutes)}
+            for a in generate_appointments(n, range(1, n // 5 + 2), range(1, n // 200 + 2), seed, start)]
+    for row in rng.sample(rows, int(n * invalid)):
+        row['scheduled_at'] = 'not a date'
+    return rows
+
+
+def _text(row: dict, key: str) -> str:
+    value = row.get(key)
+    return '' if value is None else str(value)
+
+
+def per_call(validate, rows: list) -> list:
+    # What importing cost before validate_batch: one service call, and one exception per bad row.
+    valid, errors = [], []
+    for i, row in enumerate(rows):
+        try:
+            valid.append(validate(row))
+        except (ValueError, AttributeError, TypeError) as e:
+            errors.append((i, str(e)))
+    return valid
+
+
+def timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--invalid', type=float, default=0.02, help='share of rows with an error')
+    parser.add_argument('--datetime-format', default='%d-%m-%Y %H:%M')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    patients = patient_rows(args.rows, args.invalid, args.seed)
+    appointments = appointment_rows(args.rows, args.invalid, args.datetime_format, args.seed)
+    values = [r['scheduled_at'] for r in appointments]
+
+    def parse_all(parse):
+        for v in values:
+            try:
+                parse(v)
+            except ValueError:
+                pass
+
+    runs = {
+        'datetimes, parse_datetime': lambda: parse_all(parse_datetime),
+        'datetimes, DatetimeParser': lambda: parse_all(DatetimeParser()),
+        'patients, per call': lambda: per_call(
+            lambda r: PatientService.validate(_text(r, 'name'), _text(r, 'age'), _text(r, 'gender')), patients),
+        'patients, validate_batch': lambda: validate_batch('patients', patients, workers=0),
+        f'patients, {args.workers} workers': lambda: validate_batch('patients', patients, workers=args.workers),
+        'appointments, per call': lambda: per_call(
+            lambda r: AppointmentService.validate(_text(r, 'patient_id'), _text(r, 'doctor_id'),
+                                                  _text(r, 'scheduled_at'), r.get('notes') or None,
+                                                  _text(r, 'duration_minutes') or None), appointments),
+        'appointments, validate_batch': lambda: validate_batch('appointments', appointments, workers=0),
+        f'appointments, {args.workers} workers': lambda: validate_batch(
+            'appointments', appointments, workers=args.workers),
+    }
+    if args.rows < PARALLEL_MIN_ROWS:
+        print(f'note: under {PARALLEL_MIN_ROWS:,} rows validate_batch stays serial')
+    validate_batch('patients', patients[:PARALLEL_MIN_ROWS], workers=args.workers)    # start the pool
+
+    print(f'{"run":<34}{"seconds":>10}{"rows/s":>14}{"speedup":>10}')
+    baseline = None
+    for name, fn in runs.items():
+        seconds = timed(fn)
+        if name.endswith(('parse_datetime', 'per call')):
+            baseline = seconds
+        print(f'{name:<34}{seconds:>10.3f}{args.rows / seconds:>14,.0f}{baseline / seconds:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
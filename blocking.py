@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+import unicodedata
+from array import array
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Two records are candidate duplicates only if their names share a phonetic key,
+# their genders match and their ages are at most AGE_TOLERANCE apart.
+AGE_BAND = 10
+AGE_TOLERANCE = 2
+NO_AGE = -1          # band of records without an age; they are only compared with each other
+
+# Check on PatientService.create: off, warn (log and add) or reject (raise DuplicatePatient).
+DEDUP_MODE = os.getenv('DEDUP_MODE', 'warn').strip().lower()
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.9'))
+if DEDUP_MODE not in ('off', 'warn', 'reject'):
+    raise ValueError(f'DEDUP_MODE must be off, warn or reject, not {DEDUP_MODE!r}')
+
+_SOUNDEX = {**dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+            'l': '4', **dict.fromkeys('mn', '5'), 'r': '6', **dict.fromkeys('aeiouy', '0'), 'h': '', 'w': ''}
+
+
+class DuplicatePatient(ValueError):
+    def __init__(self, message: str, matches: List[Tuple[int, float]]):
+        super().__init__(message)
+        self.matches = matches
+
+
+def name_tokens(name: Optional[str]) -> List[str]:
+    """Case-, accent- and punctuation-insensitive tokens of a name, sorted so that
+    word order does not matter."""
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(c if c.isalnum() else ' ' for c in text if not unicodedata.combining(c)).casefold()
+    return sorted(text.split())
+
+
+def soundex(token: str) -> str:
+    # American Soundex; tokens that are not plain ASCII letters (digits, other
+    # scripts) stand for themselves.
+    if not (token.isascii() and token.isalpha()):
+        return token
+    code = token[0].upper()
+    prev = _SOUNDEX[token[0]]
+    for ch in token[1:]:
+        digit = _SOUNDEX[ch]
+        if ch in 'hw':
+            continue
+        if digit != '0' and digit != prev:
+            code += digit
+            if len(code) == 4:
+                break
+        prev = digit
+    return code.ljust(4, '0')
+
+
+def name_key(tokens: List[str]) -> str:
+    return ' '.join(sorted(soundex(t) for t in tokens))
+
+
+def gender_key(gender: Optional[str]) -> Optional[str]:
+    g = (gender or '').strip().casefold()
+    return {'': None, 'other': 'o'}.get(g, g)
+
+
+def age_band(age: Optional[int]) -> int:
+    return NO_AGE if age is None else age // AGE_BAND
+
+
+def jaro_winkler(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    la, lb = len(a), len(b)
+    if not la or not lb:
+        return 0.0
+    window = max(la, lb) // 2 - 1
+    matched_b = [False] * lb
+    a_matches = []
+    for i, ch in enumerate(a):
+        for j in range(max(0, i - window), min(lb, i + window + 1)):
+            if not matched_b[j] and b[j] == ch:
+                matched_b[j] = True
+                a_matches.append(ch)
+                break
+    m = len(a_matches)
+    if not m:
+        return 0.0
+    b_matches = [b[j] for j in range(lb) if matched_b[j]]
+    transpositions = sum(x != y for x, y in zip(a_matches, b_matches)) / 2
+    jaro = (m / la + m / lb + (m - transpositions) / m) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def score(name_a: str, age_a: Optional[int], name_b: str, age_b: Optional[int]) -> float:
+    """Similarity of two records of the same block, from their token-sorted names;
+    each year of age difference costs 0.02."""
+    penalty = 0.0 if age_a is None or age_b is None else 0.02 * abs(age_a - age_b)
+    return jaro_winkler(name_a, name_b) - penalty
+
+
+def ages_close(age_a: Optional[int], age_b: Optional[int]) -> bool:
+    if age_a is None or age_b is None:
+        return age_a is None and age_b is None
+    return abs(age_a - age_b) <= AGE_TOLERANCE
+
+
+class BlockingIndex:
+    """In-memory blocking index for duplicate-patient checks.
+
+    Patients are grouped by (phonetic name key, gender, age band); a check scores
+    only the patients in the blocks that can hold a candidate, never the whole
+    table. Blocks are int arrays of ids; each id maps to its token-sorted name,
+    age and gender, which is all that scoring needs.
+
+    `loader(after_id)` yields (id, name, age, gender) for rows with id > after_id
+    (all rows for None), in id order. New rows from other processes are picked up
+    by re-running it from the highest id seen at most every `refresh_interval` seconds.
+    """
+
+    def __init__(self, loader: Callable[[Optional[int]], Iterable[Tuple[int, str, Optional[int], Optional[str]]]],
+                 refresh_interval: float = 5.0):
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._blocks: Dict[Tuple[str, Optional[str], int], array] = defaultdict(lambda: array('i'))
+        self._records: Dict[int, Tuple[str, Optional[int], Optional[str]]] = {}
+        self._max_id = 0
+        self._refreshed_at = 0.0
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._records)
+
+    # --- maintenance --- #
+
+    @staticmethod
+    def _block(sorted_name: str, age: Optional[int], gender: Optional[str]) -> Tuple[str, Optional[str], int]:
+        return name_key(sorted_name.split()), gender, age_band(age)
+
+    def _index_locked(self, rid: int, name: Optional[str], age: Optional[int], gender: Optional[str]):
+        sorted_name = ' '.join(name_tokens(name))
+        gender = gender_key(gender)
+        self._records[rid] = (sorted_name, age, gender)
+        self._blocks[self._block(sorted_name, age, gender)].append(rid)
+        self._max_id = max(self._max_id, rid)
+
+    def _unindex_locked(self, rid: int) -> bool:
+        record = self._records.pop(rid, None)
+        if record is None:
+            return False
+        key = self._block(*record)
+        block = self._blocks[key]
+        block.remove(rid)
+        if not block:
+            del self._blocks[key]
+        return True
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self.loaded and now - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self.loaded and now - self._refreshed_at < self.refresh_interval:
+                return
+            for rid, name, age, gender in self._loader(self._max_id if self.loaded else None):
+                if rid not in self._records:
+                    self._index_locked(rid, name, age, gender)
+            self._refreshed_at = time.monotonic()
+            self.loaded = True
+
+    def expire(self):
+        # Make the next check catch up with rows inserted since the last refresh.
+        self._refreshed_at = 0.0
+
+    def add(self, rid: int, name: Optional[str], age: Optional[int], gender: Optional[str]):
+        with self._lock:
+            if self.loaded and rid not in self._records:
+                self._index_locked(rid, name, age, gender)
+
+    def update(self, rid: int, name: Optional[str], age: Optional[int], gender: Optional[str]):
+        with self._lock:
+            if not self.loaded:
+                return
+            self._unindex_locked(rid)
+            self._index_locked(rid, name, age, gender)
+
+    def remove(self, rid: int):
+        with self._lock:
+            self._unindex_locked(rid)
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+            self._records.clear()
+            self._max_id = 0
+            self.loaded = False
+
+    # --- queries --- #
+
+    def candidates(self, name: Optional[str], age: Optional[int], gender: Optional[str]) -> List[int]:
+        """Ids in every block that can hold a duplicate: same name key and gender, and
+        the age bands covering age +/- AGE_TOLERANCE."""
+        self._refresh()
+        key = name_key(name_tokens(name))
+        if age is None:
+            bands = [NO_AGE]
+        else:
+            bands = range(age_band(max(0, age - AGE_TOLERANCE)), age_band(age + AGE_TOLERANCE) + 1)
+        with self._lock:
+            gender = gender_key(gender)
+            return [rid for band in bands for rid in self._blocks.get((key, gender, band), ())]
+
+    def find(self, name: Optional[str], age: Optional[int], gender: Optional[str], threshold: float,
+             exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(id, score) of the likely duplicates of a record, best first."""
+        sorted_name = ' '.join(name_tokens(name))
+        matches = []
+        for rid in self.candidates(name, age, gender):
+            record = self._records.get(rid)
+            if rid == exclude or record is None or not ages_close(age, record[1]):
+                continue
+            s = score(sorted_name, age, record[0], record[1])
+            if s >= threshold:
+                matches.append((rid, s))
+        matches.sort(key=lambda m: (-m[1], m[0]))
+        return matches
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = [len(b) for b in self._blocks.values()]
+        return {'records': len(self._records), 'blocks': len(sizes), 'largest_block': max(sizes, default=0),
+                'comparisons_per_check': sum(s * s for s in sizes) / max(1, sum(sizes))}
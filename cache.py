@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    `get` returns None on a miss, so None itself cannot be cached. With `copy`,
+    values are copied going in and coming out, so mutable values are never shared.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, enabled: bool = True,
+                 clock: Callable[[], float] = time.monotonic, copy: Optional[Callable] = None):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._clock = clock
+        self._copy = copy
+        self._data = OrderedDict()     # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._seq = 0                  # bumped by every invalidation
+
+    def get(self, key: Hashable):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return value if self._copy is None else self._copy(value)
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict:
+        """The cached entries among `keys`, under one lock acquisition."""
+        if not self.enabled:
+            return {}
+        found = {}
+        now = self._clock()
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= now:
+                    del self._data[key]
+                    self.expirations += 1
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                self.hits += 1
+                found[key] = value
+        if self._copy is not None:
+            found = {key: self._copy(value) for key, value in found.items()}
+        return found
+
+    def mark(self) -> int:
+        # Take before reading from the database and pass to put() as `since`, so a row
+        # read before a concurrent update/delete is not cached after its invalidation.
+        return self._seq
+
+    def put(self, key: Hashable, value, since: Optional[int] = None):
+        if not self.enabled or value is None:
+            return
+        if self._copy is not None:
+            value = self._copy(value)
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if since is not None and since != self._seq:
+                return
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def put_many(self, items: Dict, since: Optional[int] = None):
+        if not self.enabled:
+            return
+        if self._copy is not None:
+            items = {key: self._copy(value) for key, value in items.items() if value is not None}
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if since is not None and since != self._seq:
+                return
+            for key, value in items.items():
+                if value is None:
+                    continue
+                self._data[key] = (value, expires_at)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._seq += 1
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._seq += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -1,8 +1,17 @@
+import atexit
+import contextvars
+import hashlib
 import os 
+import threading
 import time 
-import pyodbc
 from dotenv import load_dotenv
 from contextlib import contextmanager 
+from typing import Callable
+from backends import create_backend
+from instrumentation import InstrumentedConnection, metrics, operation, timed_connect
+from migrations import MIGRATIONS, migrate
+from pool import ConnectionPool
+from resilience import CircuitBreaker, call_with_retry
 
 load_dotenv()
 
@@ -11,99 +20,450 @@ DATABASE = os.getenv('DB_NAME','HospitalDB')
 SERVER = os.getenv('DB_SERVER', 'localhost')
 ENCRYPT = os.getenv('ENCRYPT', 'no')
 
+BACKEND = os.getenv('DB_BACKEND', 'sqlserver').strip().lower()
+SQLITE_PATH = os.getenv('DB_PATH', 'hospital.db')
 
-CONN_STR_TEMPLATE = (
-    'DRIVER={driver};'
-    'SERVER={server};'
-    'DATABASE={database};'
-    'Trusted_Connection=Yes;'
-    'Encrypt={encrypt};'
-    'TrustServerCertificate=yes'
-)
-
-def _build_conn_str(server=SERVER, database=DATABASE):
-    return CONN_STR_TEMPLATE.format(
-        driver=DRIVER ,
-        server=server ,
-        database=database,
-        encrypt=ENCRYPT 
+def env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Read replica: DB_READ_SERVER on SQL Server (with ApplicationIntent=ReadOnly unless
+# DB_READ_INTENT=no), DB_READ_PATH on SQLite. Unset means every query uses the primary.
+READ_SERVER = os.getenv('DB_READ_SERVER', '')
+READ_INTENT = env_bool('DB_READ_INTENT', 'yes')
+READ_PATH = os.getenv('DB_READ_PATH', '')
+# After a commit, reads from the same thread or task stay on the primary this many
+# seconds (about the worst replica lag), so callers see their own writes. 0 turns it off.
+READ_YOUR_WRITES = float(os.getenv('DB_READ_YOUR_WRITES', '5'))
+
+backend = create_backend(BACKEND, driver=DRIVER, server=SERVER, database=DATABASE, encrypt=ENCRYPT,
+                         path=SQLITE_PATH, read_server=READ_SERVER, read_intent=READ_INTENT, read_path=READ_PATH)
+
+
+POOL_ENABLED = env_bool('DB_POOL_ENABLED', 'yes')
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX', '10'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', '5'))
+
+AUTO_INIT = env_bool('DB_AUTO_INIT', 'yes')
+
+RETRY_BASE_DELAY = float(os.getenv('DB_RETRY_BASE_DELAY', '0.1'))
+RETRY_MAX_DELAY = float(os.getenv('DB_RETRY_MAX_DELAY', '2'))
+BREAKER_THRESHOLD = int(os.getenv('DB_BREAKER_THRESHOLD', '5'))
+BREAKER_RESET = float(os.getenv('DB_BREAKER_RESET', '30'))
+
+METRICS_ENABLED = env_bool('METRICS_ENABLED', 'yes')
+METRICS_EXPORT_PATH = os.getenv('METRICS_EXPORT_PATH', '')
+
+_pools = {}
+_pools_lock = threading.Lock()
+_breakers = {}
+
+_init_lock = threading.RLock()
+_schema_ready = False
+_initializing = False
+
+
+def get_pool(server: str = SERVER, database: str = DATABASE, read_only: bool = False) -> ConnectionPool:
+    key = (server, database, read_only)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    timed_connect(lambda: backend.connect(server, database, read_only)),
+                    min_size=min(POOL_MIN_SIZE, POOL_MAX_SIZE),
+                    max_size=POOL_MAX_SIZE,
+                    timeout=POOL_TIMEOUT,
+                    max_idle=POOL_MAX_IDLE,
+                    ping_after=POOL_PING_AFTER,
+                )
+                _pools[key] = pool
+    return pool
+
+
+def pool_stats() -> dict:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {f'{backend.read_endpoint if read_only else server}/{database}': p.stats()
+            for (server, database, read_only), p in pools.items()}
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for p in pools:
+        p.close()
+
+
+atexit.register(close_pools)
+
+
+def export_metrics(path: str = None):
+    # JSON unless the path ends in .prom, which gets the Prometheus text format.
+    path = path or METRICS_EXPORT_PATH
+    if not path:
+        return
+    if path.endswith('.prom'):
+        metrics.export_prometheus(path)
+    else:
+        metrics.export_json(path, extra={'pools': pool_stats(), 'breakers': breaker_stats(),
+                                             'reads': read_stats()})
+
+
+atexit.register(export_metrics)
+
+
+def get_breaker(server: str = SERVER) -> CircuitBreaker:
+    breaker = _breakers.get(server)
+    if breaker is None:
+        with _pools_lock:
+            breaker = _breakers.setdefault(server, CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET))
+    return breaker
+
+
+def breaker_stats() -> dict:
+    with _pools_lock:
+        breakers = dict(_breakers)
+    return {server: b.stats() for server, b in breakers.items()}
+
+
+_BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+
+def _breaker_gauges() -> dict:
+    gauges = {}
+    for server, s in breaker_stats().items():
+        label = f'{{server="{server}"}}'
+        gauges[f'hospital_db_breaker_state{label}'] = _BREAKER_STATES[s['state']]
+        gauges[f'hospital_db_breaker_opened_total{label}'] = s['opened']
+        gauges[f'hospital_db_breaker_rejected_total{label}'] = s['rejected']
+    return gauges
+
+
+metrics.register_collector(_breaker_gauges)
+
+
+def _acquire(server: str, database: str, pooled: bool, max_retries: int, retry_delay: float,
+             read_only: bool = False):
+    # Only transient connect errors are retried; while the server is down the breaker
+    # fails callers at once instead of letting each one wait out its retries.
+    breaker = get_breaker(backend.read_endpoint if read_only else server)
+    if pooled:
+        pool = get_pool(server, database, read_only)
+        # Unless the breaker is closed, an idle connection must answer a ping first, so
+        # the half-open probe tests the server and not a connection left from before.
+        connect = lambda: pool.acquire(ping=breaker.state != CircuitBreaker.CLOSED)
+    else:
+        connect = lambda: timed_connect(backend.connect)(server, database, read_only)
+    return call_with_retry(
+        connect, max_attempts=max_retries, base_delay=retry_delay, max_delay=RETRY_MAX_DELAY,
+        breaker=breaker,
+        on_retry=lambda e: metrics.record_retry()
     )
 
+
+@contextmanager
+def get_connection(server: str = SERVER ,database : str = DATABASE , max_retries : int = 3 , retry_delay : float = RETRY_BASE_DELAY):
+    tx = _transaction.get()
+    if tx is not None and server == tx.server and database == tx.database:
+        yield tx.connection
+        return
+    if not _schema_ready and database == DATABASE:
+        ensure_initialized()
+    conn = _acquire(server, database, POOL_ENABLED, max_retries, retry_delay)
+    if backend.read_endpoint and READ_YOUR_WRITES > 0:
+        conn = _TrackedConnection(conn)
+    with _lease(conn, server, database, POOL_ENABLED, read_only=False) as leased:
+        yield leased
+
+
 @contextmanager
-def get_connection(server: str = SERVER ,database : str = DATABASE , max_retries : int = 3 , retry_delay : float = 1.0):
-    attempt = 0 
-    last_exc = None
-    
-    while attempt < max_retries :
-        try :
-            conn = pyodbc.connect(_build_conn_str(server=server, database=database))
-            try :
-                yield conn 
+def _lease(conn, server: str, database: str, pooled: bool, read_only: bool):
+    try:
+        if METRICS_ENABLED:
+            wrapped = InstrumentedConnection(conn)
+            try:
+                yield wrapped
             finally:
-                try :
-                    conn.close()
-                except :
-                    pass 
-            return 
-        except Exception as e :
-            attempt += 1 
-            last_exc = e 
-            time.sleep(retry_delay)
-    raise last_exc
-    
-def initialize_db():
-    master_conn_str = _build_conn_str(server=SERVER, database='master')
-
-    with pyodbc.connect(master_conn_str, autocommit=True) as conn:
-        cur = conn.cursor()
-        cur.execute('SELECT 1 FROM sys.databases WHERE name = ?', (DATABASE,))
-        row = cur.fetchone()
+                wrapped.finish()
+        else:
+            yield conn
+    finally:
+        if isinstance(conn, _TrackedConnection):
+            conn = conn.connection
+        if pooled:
+            get_pool(server, database, read_only).release(conn)
+        else:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+# --- read routing --- #
+
+_last_commit = contextvars.ContextVar('last_commit', default=None)
+_reads = {'replica': 0, 'read_your_writes': 0, 'fallback': 0}
+_reads_lock = threading.Lock()
+
+
+class _TrackedConnection:
+    # A primary connection while a replica is configured: its commits keep this
+    # thread's or task's reads on the primary for READ_YOUR_WRITES seconds.
+    def __init__(self, conn):
+        self.connection = conn
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def commit(self):
+        self.connection.commit()
+        _last_commit.set(time.monotonic())
+
+
+def _count_read(target: str):
+    with _reads_lock:
+        _reads[target] += 1
+
+
+def _wrote_recently() -> bool:
+    at = _last_commit.get()
+    return at is not None and time.monotonic() - at < READ_YOUR_WRITES
+
+
+_pinned = contextvars.ContextVar('pinned_to_primary', default=False)
 
-        if not row:
-            cur.execute(f'CREATE DATABASE [{DATABASE}]')
+
+@contextmanager
+def primary_reads():
+    """Send this block's read_connection() queries to the primary, e.g. for a report
+    that must include what another process has just committed."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def read_connection(max_retries: int = 1):
+    """get_connection for queries that can tolerate replica lag.
+
+    Served by the read replica when one is configured, except inside a transaction
+    and shortly after this thread or task committed (READ_YOUR_WRITES). When the
+    replica cannot be reached, or its breaker is open, the primary serves it.
+    """
+    if not backend.read_endpoint or _transaction.get() is not None or _pinned.get():
+        with get_connection() as conn:
+            yield conn
+        return
+    if _wrote_recently():
+        _count_read('read_your_writes')
+        with get_connection() as conn:
+            yield conn
+        return
+    if not _schema_ready:
+        ensure_initialized()
+    try:
+        conn = _acquire(SERVER, DATABASE, POOL_ENABLED, max_retries, RETRY_BASE_DELAY, read_only=True)
+    except Exception:
+        conn = None
+    if conn is None:
+        _count_read('fallback')
+        with get_connection() as conn:
+            yield conn
+        return
+    _count_read('replica')
+    with _lease(conn, SERVER, DATABASE, POOL_ENABLED, read_only=True) as leased:
+        yield leased
+
+
+def handoff_context() -> contextvars.Context:
+    """A copy of the current context for work run on another thread (ctx.run): it keeps
+    primary_reads() and the read-your-writes window, but not an open transaction,
+    whose connection stays with its own thread or task."""
+    ctx = contextvars.copy_context()
+    ctx.run(_transaction.set, None)
+    return ctx
+
+
+def take_back(ctx: contextvars.Context):
+    # Called by the caller once the handed-off work is done: a commit made there opens
+    # the read-your-writes window here too.
+    at = ctx.get(_last_commit)
+    if at is not None and (_last_commit.get() is None or at > _last_commit.get()):
+        _last_commit.set(at)
+
+
+def read_stats() -> dict:
+    with _reads_lock:
+        return dict(_reads)
+
+
+def _read_gauges() -> dict:
+    if not backend.read_endpoint:
+        return {}
+    return {f'hospital_db_routed_reads_total{{target="{target}"}}': n for target, n in read_stats().items()}
+
+
+metrics.register_collector(_read_gauges)
+
+
+# --- unit of work --- #
+
+class _DeferredCommitConnection:
+    # What repository code sees inside transaction(): its commit() calls become no-ops
+    # and the block commits once at the end.
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        pass
+
+
+class Transaction:
+    def __init__(self, conn, server: str, database: str):
+        self.connection = _DeferredCommitConnection(conn)
+        self.server = server
+        self.database = database
+        self._on_commit = []
+        self._on_rollback = []
+
+    def on_commit(self, fn: Callable[[], None]):
+        self._on_commit.append(fn)
+
+    def on_rollback(self, fn: Callable[[], None]):
+        self._on_rollback.append(fn)
+
+
+_transaction = contextvars.ContextVar('transaction', default=None)
+
+
+@contextmanager
+def transaction(server: str = SERVER, database: str = DATABASE):
+    """Run the block on one connection with a single commit at the end.
+
+    Repository calls made in the block (on this thread or task) share the
+    connection; an exception rolls everything back. A nested transaction() joins
+    the outer one.
+    """
+    current = _transaction.get()
+    if current is not None:
+        yield current
+        return
+    with get_connection(server, database) as conn:
+        tx = Transaction(conn, server, database)
+        token = _transaction.set(tx)
+        try:
+            yield tx
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            finally:
+                _transaction.reset(token)
+                for fn in reversed(tx._on_rollback):
+                    fn()
+            raise
+        _transaction.reset(token)
+    for fn in tx._on_commit:
+        fn()
+
+
+def in_transaction() -> bool:
+    return _transaction.get() is not None
+
+
+def on_commit(fn: Callable[[], None]):
+    # Runs fn now outside a transaction, otherwise once the transaction has committed.
+    tx = _transaction.get()
+    if tx is None:
+        fn()
+    else:
+        tx.on_commit(fn)
+
+
+def on_rollback(fn: Callable[[], None]):
+    tx = _transaction.get()
+    if tx is not None:
+        tx.on_rollback(fn)
+
+
+def schema_fingerprint() -> str:
+    # Changes whenever the base DDL or any migration changes, so a stored match means
+    # the bootstrap below has nothing left to do.
+    h = hashlib.sha256(backend.name.encode())
+    for stmt in backend.schema:
+        h.update(stmt.encode())
+    for m in MIGRATIONS:
+        h.update(f'{m.version}:{m.description}'.encode())
+        for stmt in backend.migration_statements(m):
+            h.update(stmt.encode())
+    return h.hexdigest()
+
+
+def schema_is_current() -> bool:
+    # One query on one connection attempt; a missing database or table just means "no".
+    try:
+        with get_connection(max_retries=1, retry_delay=0) as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT fingerprint FROM schema_fingerprint')
+            row = cur.fetchone()
+    except Exception:
+        return False
+    return bool(row) and row[0] == schema_fingerprint()
+
+
+def initialize_db(force: bool = False):
+    global _initializing
+    with _init_lock:
+        _initializing = True
+        try:
+            _initialize_db(force)
+        finally:
+            _initializing = False
+
+
+def _initialize_db(force: bool):
+    global _schema_ready
+    if not force and schema_is_current():
+        _schema_ready = True
+        return
+
+    # SQL Server: create the database if missing. SQLite: create the file's directory.
+    backend.prepare()
 
     with get_connection(server=SERVER, database=DATABASE) as conn:
         cur = conn.cursor()
+        for stmt in backend.schema:
+            cur.execute(stmt)
+        conn.commit()
 
-        cur.execute('''
-            IF NOT EXISTS(
-                SELECT 1 FROM information_schema.tables WHERE table_name = 'patients'
-            )
-            CREATE TABLE patients(
-                id INT IDENTITY(1,1) PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                age INT NULL,
-                gender VARCHAR(20) NULL,
-                created_at DATETIME2 DEFAULT GETDATE()
-            )
-        ''')
-
-        cur.execute('''
-            IF NOT EXISTS(
-                SELECT 1 FROM information_schema.tables WHERE table_name = 'doctors'
-            )
-            CREATE TABLE doctors(
-                id INT IDENTITY(1,1) PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                specialty VARCHAR(100) NULL,
-                created_at DATETIME2 DEFAULT GETDATE()
-            )
-        ''')
-
-        cur.execute('''
-            IF NOT EXISTS(
-                SELECT 1 FROM information_schema.tables WHERE table_name = 'appointments'
-            )
-            CREATE TABLE appointments(
-                id INT IDENTITY(1,1) PRIMARY KEY,
-                patient_id INT NOT NULL,
-                doctor_id INT NOT NULL,
-                scheduled_at DATETIME2 NOT NULL,
-                notes VARCHAR(500) NULL,
-                created_at DATETIME2 DEFAULT GETDATE(),
-                CONSTRAINT FK_App_Patient FOREIGN KEY (patient_id) REFERENCES patients(id),
-                CONSTRAINT FK_App_Doctor FOREIGN KEY (doctor_id) REFERENCES doctors(id)
-            )
-        ''')
+        migrate(conn, backend)
 
+        cur.execute(backend.fingerprint_table_ddl)
+        cur.execute('DELETE FROM schema_fingerprint')
+        cur.execute('INSERT INTO schema_fingerprint (fingerprint) VALUES (?)', (schema_fingerprint(),))
         conn.commit()
+
+    _schema_ready = True
+
+
+def ensure_initialized():
+    # Lazy bootstrap for the first get_connection() of the process. The RLock lets the
+    # initializing thread's own get_connection() calls through while others wait.
+    if _schema_ready or not AUTO_INIT:
+        return
+    with _init_lock:
+        if _schema_ready or _initializing:
+            return
+        with operation('database.initialize'):
+            initialize_db()
@@ -0,0 +1,269 @@
+"""Deterministic synthetic patients, doctors and appointments.
+
+The same seed and counts always produce the same rows. Names and specialties
+follow skewed (roughly Zipf) frequencies; patients of one gender share a name
+only if their ages are far apart, except the DUPLICATE_RATE share registered
+twice. Ages are a mix of children, adults and elderly, and appointments fall
+on weekdays in clinic hours, back to back per doctor with random gaps, so no
+doctor is double-booked. Busy doctors get more appointments, and frequent
+patients book more often.
+
+    python datagen.py --patients 100000 --doctors 1000 --appointments 1000000 --seed 1
+"""
+import argparse
+import hashlib
+import random
+import time
+from datetime import datetime, timedelta
+from collections import deque
+from itertools import accumulate
+from typing import Iterator, List, Optional, Sequence
+
+from blocking import AGE_TOLERANCE
+from models import Patient, Doctor, Appointment
+
+FEMALE_NAMES = ['Mary', 'Patricia', 'Jennifer', 'Linda', 'Elizabeth', 'Barbara', 'Susan', 'Jessica', 'Sarah',
+                'Karen', 'Lisa', 'Nancy', 'Betty', 'Margaret', 'Sandra', 'Ashley', 'Emily', 'Donna', 'Michelle',
+                'Carol', 'Amanda', 'Melissa', 'Deborah', 'Laura', 'Rebecca', 'Anna', 'Emma', 'Olivia', 'Sofia',
+                'Priya', 'Ananya', 'Mei', 'Lina', 'Fatima', 'Aisha', 'Lucia', 'Maria', 'Yuki', 'Hana', 'Olga',
+                'Ngozi', 'Chiara', 'Ingrid', 'Noor']
+MALE_NAMES = ['James', 'John', 'Robert', 'Michael', 'William', 'David', 'Richard', 'Joseph', 'Thomas',
+              'Charles', 'Christopher', 'Daniel', 'Matthew', 'Anthony', 'Mark', 'Donald', 'Steven', 'Paul',
+              'Andrew', 'Joshua', 'Kevin', 'Brian', 'George', 'Edward', 'Ryan', 'Jacob', 'Liam', 'Noah',
+              'Aarav', 'Rohan', 'Wei', 'Jun', 'Mohammed', 'Omar', 'Ahmed', 'Carlos', 'Diego', 'Luis', 'Kenji',
+              'Hiroshi', 'Ivan', 'Dmitri', 'Chinedu', 'Lars']
+FIRST_NAMES = FEMALE_NAMES + MALE_NAMES
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor',
+              'Moore', 'Jackson', 'Martin', 'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark',
+              'Ramirez', 'Lewis', 'Robinson', 'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres',
+              'Nguyen', 'Hill', 'Flores', 'Green', 'Adams', 'Nelson', 'Baker', 'Hall', 'Rivera', 'Campbell',
+              'Mitchell', 'Carter', 'Roberts', 'Patel', 'Kumar', 'Singh', 'Shah', 'Chen', 'Wang', 'Li', 'Zhang',
+              'Liu', 'Kim', 'Park', 'Tanaka', 'Sato', 'Suzuki', 'Ivanov', 'Petrova', 'Kowalski', 'Novak',
+              'Muller', 'Schmidt', 'Rossi', 'Bianchi', 'Silva', 'Santos', 'Okafor', 'Mensah', 'Haddad',
+              'Khan', 'Hansen', 'Murphy', "O'Brien", 'Kelly', 'Dubois', 'Cohen']
+# Rarer surnames built from common stems and endings (Ashford, Kovalenko, ...), so a
+# large register does not run out of distinct names.
+_SURNAME_PARTS = [
+    (['Ald', 'Ash', 'Bar', 'Black', 'Brad', 'Brook', 'Bur', 'Cald', 'Crans', 'Dun', 'Ed', 'Fair', 'Fox',
+      'Gold', 'Hal', 'Hart', 'Hawk', 'Hol', 'Kent', 'Kings', 'Lang', 'Lock', 'Mar', 'Mid', 'Mor', 'New',
+      'North', 'Oak', 'Pen', 'Red', 'Ros', 'Shel', 'Stan', 'Stock', 'Sut', 'Thorn', 'Wal', 'Wes', 'Whit',
+      'Win'],
+     ['ford', 'wood', 'ley', 'ton', 'field', 'well', 'by', 'ham', 'worth', 'stone', 'bridge', 'more']),
+    (['Koval', 'Petr', 'Shev', 'Bond', 'Tkach', 'Moroz', 'Lys', 'Kravch', 'Sav', 'Hrin'],
+     ['enko', 'uk', 'chuk', 'ov', 'ova', 'ski']),
+    (['Berg', 'Dahl', 'Holm', 'Sand', 'Lind', 'Fors', 'Ek', 'Sjo', 'Norr', 'Alm'],
+     ['gren', 'qvist', 'ström', 'man', 'lund', 'blad']),
+]
+SURNAMES = LAST_NAMES + sorted({'Fernandez', 'Alvarez', 'Mendoza', 'Castillo', 'Ortiz', 'Morales', 'Jimenez',
+                                'Ruiz', 'Vargas', 'Romero', 'Herrera', 'Medina', 'Aguilar', 'Castro', 'Vega',
+                                'Reyes', 'Cruz', 'Gomez', 'Diaz', 'Navarro'} | {stem + ending for stems, endings in _SURNAME_PARTS
+                                for stem in stems for ending in endings} - set(LAST_NAMES))
+# Share of patients registered twice: a later row repeating a recent patient's name,
+# age and gender. Otherwise no two patients of the same gender share a name unless
+# their ages differ by more than blocking.AGE_TOLERANCE, so dedup finds exactly these.
+DUPLICATE_RATE = 0.005
+MIDDLE_NAME_RATE = 0.3
+DOUBLE_SURNAME_RATE = 0.05
+# (specialty, relative share of doctors)
+SPECIALTIES = [('General Practice', 30), ('Pediatrics', 12), ('Cardiology', 8), ('Orthopedics', 8),
+               ('Dermatology', 6), ('Gynecology', 6), ('Psychiatry', 5), ('Neurology', 4),
+               ('Ophthalmology', 4), ('Oncology', 3), ('Radiology', 3), ('Endocrinology', 3),
+               ('Urology', 2), ('Gastroenterology', 2), ('Nephrology', 2), ('Rheumatology', 2)]
+# (minutes, relative share)
+DURATIONS = [(15, 25), (30, 55), (45, 10), (60, 10)]
+CLINIC_OPEN, CLINIC_CLOSE = 8, 18
+SLOT_MINUTES = 15
+
+
+def _zipf_weights(n: int, s: float = 1.0) -> List[float]:
+    return [1.0 / (rank ** s) for rank in range(1, n + 1)]
+
+
+class _Picker:
+    # rng.choices with the cumulative weights computed once.
+    def __init__(self, rng: random.Random, items: Sequence, weights: Sequence[float]):
+        self._rng = rng
+        self._items = list(items)
+        self._cum = list(accumulate(weights))
+
+    def __call__(self):
+        return self._rng.choices(self._items, cum_weights=self._cum)[0]
+
+
+def _age(rng: random.Random) -> int:
+    r = rng.random()
+    if r < 0.2:
+        return rng.randint(1, 17)
+    if r < 0.75:
+        return rng.randint(18, 64)
+    return min(105, max(65, int(rng.gauss(76, 8))))
+
+
+def _key(*parts) -> int:
+    # A stable 64-bit digest: hash() differs between runs and would break determinism.
+    return int.from_bytes(hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=8).digest(), 'big')
+
+
+class _Names:
+    """Full names drawn from the gender's first names and the skewed surnames, never
+    repeating one already given to someone of that gender within AGE_TOLERANCE years.
+
+    Only 64-bit digests of what was handed out are kept, so memory stays small for
+    millions of rows."""
+
+    def __init__(self, rng: random.Random, redraws: int = 30):
+        self._rng = rng
+        self._first = {'F': _Picker(rng, FEMALE_NAMES, _zipf_weights(len(FEMALE_NAMES), 0.8)),
+                       'M': _Picker(rng, MALE_NAMES, _zipf_weights(len(MALE_NAMES), 0.8))}
+        self._last = _Picker(rng, SURNAMES, _zipf_weights(len(SURNAMES), 0.6))
+        self._redraws = redraws
+        self._seen = set()
+
+    def _draw(self, sex: str, attempt: int) -> str:
+        # The skewed draw nearly always finds a free name; if it keeps colliding, a
+        # middle name and then a double surname are forced.
+        rng = self._rng
+        tier = 3 * attempt // self._redraws
+        first = self._first[sex]
+        parts = [first()]
+        if tier or rng.random() < MIDDLE_NAME_RATE:
+            middle = first()
+            if middle != parts[0]:
+                parts.append(middle)
+        last = self._last()
+        if tier == 2 or rng.random() < DOUBLE_SURNAME_RATE:
+            other = self._last()
+            if other != last:
+                last = f'{last}-{other}'
+        parts.append(last)
+        return ' '.join(parts)
+
+    def __call__(self, gender: str, age: Optional[int] = None) -> str:
+        sex = gender if gender in self._first else self._rng.choice('FM')
+        age = age or 0
+        ages = range(age - AGE_TOLERANCE, age + AGE_TOLERANCE + 1)
+        for attempt in range(self._redraws):
+            name = self._draw(sex, attempt)
+            key = _key(name, gender)
+            if not any(key + a in self._seen for a in ages):
+                break
+        # After `redraws` collisions the name is kept anyway; only huge counts get there.
+        self._seen.add(key + age)
+        return name
+
+
+def generate_patients(count: int, seed: int = 1, duplicate_rate: float = DUPLICATE_RATE) -> Iterator[Patient]:
+    rng = random.Random(f'patients:{seed}')
+    names = _Names(rng)
+    genders = _Picker(rng, ['F', 'M', 'O'], [49, 49, 2])
+    recent = deque(maxlen=1000)
+    for _ in range(count):
+        if recent and rng.random() < duplicate_rate:
+            name, age, gender = rng.choice(recent)
+        else:
+            gender, age = genders(), _age(rng)
+            name = names(gender, age)
+            recent.append((name, age, gender))
+        yield Patient(None, name, age, gender)
+
+
+def generate_doctors(count: int, seed: int = 1) -> Iterator[Doctor]:
+    rng = random.Random(f'doctors:{seed}')
+    names = _Names(rng)
+    specialty = _Picker(rng, [s for s, _ in SPECIALTIES], [w for _, w in SPECIALTIES])
+    for _ in range(count):
+        yield Doctor(None, f'Dr. {names("")}', specialty())
+
+
+def _split(total: int, weights: Sequence[float]) -> List[int]:
+    # Largest-remainder apportionment: counts sum to total exactly.
+    scale = total / sum(weights)
+    exact = [w * scale for w in weights]
+    counts = [int(x) for x in exact]
+    short = total - sum(counts)
+    for i in sorted(range(len(weights)), key=lambda i: counts[i] - exact[i])[:short]:
+        counts[i] += 1
+    return counts
+
+
+def _next_open(t: datetime) -> datetime:
+    # Move t into clinic hours on a weekday.
+    if t.hour >= CLINIC_CLOSE:
+        t = (t + timedelta(days=1)).replace(hour=CLINIC_OPEN, minute=0)
+    elif t.hour < CLINIC_OPEN:
+        t = t.replace(hour=CLINIC_OPEN, minute=0)
+    while t.weekday() >= 5:
+        t = (t + timedelta(days=1)).replace(hour=CLINIC_OPEN, minute=0)
+    return t
+
+
+def generate_appointments(count: int, patient_ids: Sequence[int], doctor_ids: Sequence[int],
+                          seed: int = 1, start: Optional[datetime] = None) -> Iterator[Appointment]:
+    """Appointments grouped by doctor, each doctor's in time order from `start`."""
+    if not patient_ids or not doctor_ids:
+        return
+    rng = random.Random(f'appointments:{seed}')
+    start = (start or datetime(2024, 1, 1)).replace(second=0, microsecond=0)
+    start = start.replace(minute=start.minute - start.minute % SLOT_MINUTES)
+    duration = _Picker(rng, [d for d, _ in DURATIONS], [w for _, w in DURATIONS])
+    notes = _Picker(rng, [None, 'follow-up', 'first visit', 'test results', 'referral'], [60, 20, 10, 6, 4])
+    # Doctor load is skewed, but shuffled so busy doctors are not simply the lowest ids.
+    loads = _split(count, _zipf_weights(len(doctor_ids), 0.6))
+    rng.shuffle(loads)
+    n_patients = len(patient_ids)
+    for did, load in zip(doctor_ids, loads):
+        t = _next_open(start + timedelta(minutes=SLOT_MINUTES * rng.randint(0, 8)))
+        for _ in range(load):
+            minutes = duration()
+            if t + timedelta(minutes=minutes) > t.replace(hour=CLINIC_CLOSE, minute=0):
+                t = _next_open(t.replace(hour=CLINIC_CLOSE, minute=0))
+            # Squaring the uniform draw favours low indexes: some patients visit often.
+            pid = patient_ids[int(n_patients * rng.random() ** 2)]
+            yield Appointment(None, pid, did, t, notes(), duration_minutes=minutes)
+            gap = SLOT_MINUTES * int(rng.expovariate(1.0))
+            t = _next_open(t + timedelta(minutes=minutes + gap))
+
+
+def load(patients: int, doctors: int, appointments: int, seed: int = 1, batch_size: int = 5000,
+         start: Optional[datetime] = None, progress: bool = False) -> dict:
+    """Generate and bulk-insert a dataset through the repositories' add_many."""
+    from repositories import PatientRepository, DoctorRepository, AppointmentRepository
+
+    timings = {}
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        ids = fn()
+        timings[name] = time.perf_counter() - t0
+        if progress:
+            print(f'{name}: {len(ids):,} rows in {timings[name]:.1f}s '
+                  f'({len(ids) / max(timings[name], 1e-9):,.0f} rows/s)')
+        return ids
+
+    pids = step('patients', lambda: PatientRepository.add_many(generate_patients(patients, seed), batch_size))
+    dids = step('doctors', lambda: DoctorRepository.add_many(generate_doctors(doctors, seed), batch_size))
+    aids = step('appointments', lambda: AppointmentRepository.add_many(
+        generate_appointments(appointments, pids, dids, seed, start), batch_size
+    ))
+    # add_many leaves out (None) appointments that overlap; generated ones never do.
+    return {'patient_ids': pids, 'doctor_ids': dids, 'appointments': sum(aid is not None for aid in aids),
+            'seconds': timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load a deterministic synthetic dataset.')
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--doctors', type=int, default=100)
+    parser.add_argument('--appointments', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--start', help='first appointment day, YYYY-MM-DD (default 2024-01-01)')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, '%Y-%m-%d') if args.start else None
+    load(args.patients, args.doctors, args.appointments, args.seed, args.batch_size, start, progress=True)
+
+
+if __name__ == '__main__':
+    main()
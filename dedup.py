@@ -0,0 +1,261 @@
+"""Find clusters of likely duplicate patients across the whole patients table.
+
+    python dedup.py --workers 4 --output clusters.jsonl
+
+Map: patients are read in chunks from one cursor. Each row is keyed by its
+blocking key (phonetic name key and gender, see blocking.py) and spilled to one
+of --partitions temporary files by that key. Reduce: each partition is loaded
+on its own and sorted by key and age, and every row is scored only against the
+following rows of its key whose age is within AGE_TOLERANCE. Pairs at or above
+the threshold are joined into clusters with union-find. With --workers > 1 both
+phases run in a process pool. Memory is bounded by a chunk per map task and one
+partition per reduce task, however large the table is.
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import groupby
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from blocking import AGE_TOLERANCE, DEDUP_THRESHOLD, gender_key, name_key, name_tokens, score
+from repositories import PatientRepository
+from utils import chunked
+
+DEFAULT_PARTITIONS = 64
+CHUNK_SIZE = 20000
+
+# (name key, gender, age, id, token-sorted name); a missing gender is '' and a missing age -1.
+Record = Tuple[str, str, int, int, str]
+
+
+@dataclass
+class DedupReport:
+    rows: int = 0
+    blocks: int = 0
+    comparisons: int = 0
+    pairs: int = 0
+    clusters: int = 0
+    duplicates: int = 0          # rows in a cluster beyond its first
+    map_seconds: float = 0.0
+    reduce_seconds: float = 0.0
+    elapsed: float = 0.0
+    max_rss_kib: Optional[float] = None
+    workers_max_rss_kib: Optional[float] = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def _max_rss_kib(children: bool = False) -> Optional[float]:
+    try:
+        import resource
+    except ImportError:     # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 if sys.platform == 'darwin' else rss
+
+
+# --- map --- #
+
+def _map_chunk(args: Tuple[List[tuple], int]) -> List[List[Record]]:
+    rows, partitions = args
+    parts = [[] for _ in range(partitions)]
+    for pid, name, age, gender in rows:
+        tokens = name_tokens(name)
+        key, g = name_key(tokens), gender_key(gender) or ''
+        # crc32 rather than hash(): str hashes differ between worker processes.
+        parts[zlib.crc32(f'{key}|{g}'.encode()) % partitions].append(
+            (key, g, -1 if age is None else age, pid, ' '.join(tokens)))
+    return parts
+
+
+def _spill(parts: List[List[Record]], files: list):
+    for part, f in zip(parts, files):
+        if part:
+            pickle.dump(part, f, pickle.HIGHEST_PROTOCOL)
+
+
+def _bounded_map(fn: Callable, tasks: Iterable, pool: Optional[ProcessPoolExecutor], window: int) -> Iterator:
+    # Executor.map submits every task up front; this keeps at most `window` in flight.
+    if pool is None:
+        yield from map(fn, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(fn, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# --- reduce --- #
+
+def _load(path: str) -> List[Record]:
+    records = []
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                records.extend(pickle.load(f))
+            except EOFError:
+                return records
+
+
+def _reduce_partition(args: Tuple[str, float]) -> Tuple[List[Tuple[int, int, float]], int, int]:
+    """Matching pairs (id, id, score), comparisons made and blocks seen in one partition."""
+    path, threshold = args
+    records = _load(path)
+    records.sort()
+    pairs, comparisons, blocks = [], 0, 0
+    for _, group in groupby(records, key=lambda r: (r[0], r[1])):
+        group = list(group)
+        blocks += 1
+        for i, (_, _, age, pid, name) in enumerate(group):
+            for j in range(i + 1, len(group)):
+                _, _, other_age, other_id, other_name = group[j]
+                if age < 0:
+                    if other_age >= 0:
+                        break
+                elif other_age - age > AGE_TOLERANCE:
+                    break
+                comparisons += 1
+                s = score(name, None if age < 0 else age, other_name, None if other_age < 0 else other_age)
+                if s >= threshold:
+                    pairs.append((pid, other_id, s))
+    return pairs, comparisons, blocks
+
+
+def _clusters(pairs: Iterable[Tuple[int, int, float]]) -> List[List[int]]:
+    parent: Dict[int, int] = {}
+
+    def find(x: int) -> int:
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for a, b, _ in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    members: Dict[int, List[int]] = {}
+    for x in parent:
+        members.setdefault(find(x), []).append(x)
+    for root in list(members):
+        members[root].append(root)
+    return sorted((sorted(set(m)) for m in members.values()), key=lambda m: m[0])
+
+
+def find_clusters(workers: int = 1, partitions: int = DEFAULT_PARTITIONS, threshold: float = DEDUP_THRESHOLD,
+                  chunk_size: int = CHUNK_SIZE, rows: Optional[Iterable[Iterable[tuple]]] = None,
+                  progress: Optional[Callable[[str, DedupReport], None]] = None
+                  ) -> Tuple[List[List[int]], DedupReport]:
+    """Clusters of patient ids (each sorted, two or more ids) and the run's report.
+
+    `rows` yields chunks of (id, name, age, gender); by default the patients table."""
+    if partitions < 1:
+        raise ValueError('partitions must be at least 1')
+    report = DedupReport()
+    started = time.perf_counter()
+    if rows is None:
+        rows = PatientRepository.iter_export(chunk_size=chunk_size)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        with tempfile.TemporaryDirectory(prefix='dedup-') as spill_dir:
+            paths = [os.path.join(spill_dir, f'part-{n:04d}') for n in range(partitions)]
+            files = [open(p, 'wb') for p in paths]
+            try:
+                def tasks():
+                    for chunk in rows:
+                        chunk = [r[:4] for r in chunk]
+                        report.rows += len(chunk)
+                        yield chunk, partitions
+
+                for parts in _bounded_map(_map_chunk, tasks(), pool, max(2, workers * 2)):
+                    _spill(parts, files)
+                    if progress:
+                        progress('map', report)
+            finally:
+                for f in files:
+                    f.close()
+            report.map_seconds = time.perf_counter() - started
+
+            pairs = []
+            for part_pairs, comparisons, blocks in _bounded_map(
+                    _reduce_partition, ((p, threshold) for p in paths), pool, max(2, workers * 2)):
+                pairs.extend(part_pairs)
+                report.comparisons += comparisons
+                report.blocks += blocks
+                if progress:
+                    progress('reduce', report)
+            report.reduce_seconds = time.perf_counter() - started - report.map_seconds
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    clusters = _clusters(pairs)
+    report.pairs = len(pairs)
+    report.clusters = len(clusters)
+    report.duplicates = sum(len(c) - 1 for c in clusters)
+    report.elapsed = time.perf_counter() - started
+    report.max_rss_kib = _max_rss_kib()
+    report.workers_max_rss_kib = _max_rss_kib(children=True) if workers > 1 else None
+    return clusters, report
+
+
+def write_clusters(clusters: List[List[int]], path: str, batch_size: int = 1000):
+    # One JSON line per cluster with its patients; rows deleted since the scan are left out.
+    with open(path, 'w', encoding='utf-8') as out:
+        for batch in chunked(clusters, batch_size):
+            found = PatientRepository.get_many(pid for cluster in batch for pid in cluster)
+            for cluster in batch:
+                patients = [{'id': p.id, 'name': p.name, 'age': p.age, 'gender': p.gender}
+                            for p in (found.get(pid) for pid in cluster) if p is not None]
+                out.write(json.dumps({'ids': cluster, 'patients': patients}, ensure_ascii=False) + '\n')
+
+
+def _print_progress(phase: str, report: DedupReport):
+    done = f'{report.rows:,} rows' if phase == 'map' else f'{report.blocks:,} blocks'
+    print(f'\r{phase}: {done}', end='', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find clusters of likely duplicate patients.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--partitions', type=int, default=DEFAULT_PARTITIONS)
+    parser.add_argument('--threshold', type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--output', help='write the clusters as JSONL')
+    args = parser.parse_args(argv)
+
+    try:
+        clusters, report = find_clusters(args.workers, args.partitions, args.threshold, args.chunk_size,
+                                         progress=_print_progress)
+    except ValueError as e:
+        parser.error(str(e))
+    print()
+    if args.output:
+        write_clusters(clusters, args.output)
+    memory = f'{report.max_rss_kib / 1024:,.0f} MiB' if report.max_rss_kib is not None else 'n/a'
+    if report.workers_max_rss_kib is not None:
+        memory += f', largest worker {report.workers_max_rss_kib / 1024:,.0f} MiB'
+    print(f'✅ {report.clusters:,} clusters ({report.duplicates:,} likely duplicates) among {report.rows:,} patients '
+          f'in {report.elapsed:.2f}s ({report.rows_per_sec:,.0f} rows/s; map {report.map_seconds:.2f}s, '
+          f'reduce {report.reduce_seconds:.2f}s)')
+    print(f'   {report.blocks:,} blocks, {report.comparisons:,} comparisons, {report.pairs:,} matching pairs; '
+          f'peak memory {memory}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Streaming CSV/JSONL importer for patients, doctors and appointments.
+
+    python importer.py patients clinic_patients.csv --batch-size 5000
+
+Rows are read lazily, validated a batch at a time with the same rules as the
+console services (validation.validate_batch) and inserted with the repositories'
+add_many, one commit per batch, so memory stays bounded by the batch size
+regardless of file size. Appointments that would double-book a doctor are left
+out by add_many, and malformed JSONL lines are skipped; both are reported like
+invalid rows. With --workers > 1, rows are
+validated validation.PARALLEL_MIN_ROWS at a time (or a batch, if larger) so the
+process pool gets enough work to split, and then inserted in batches as before.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from repositories import PatientRepository, DoctorRepository, AppointmentRepository
+from scheduling import SchedulingConflict
+from utils import chunked
+from validation import PARALLEL_MIN_ROWS, VALIDATION_WORKERS, validate_batch
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_RECORDED_ERRORS = 100
+
+
+# entity -> repository bulk insert
+ENTITIES: Dict[str, Callable] = {
+    'patients': PatientRepository.add_many,
+    'doctors': DoctorRepository.add_many,
+    'appointments': AppointmentRepository.add_many,
+}
+
+# entity -> why add_many left a valid record out (its id came back None)
+SKIPPED: Dict[str, Callable] = {
+    'appointments': lambda a: str(SchedulingConflict.booked(a.doctor_id)),
+}
+
+
+@dataclass
+class ImportReport:
+    entity: str
+    rows_read: int = 0
+    rows_inserted: int = 0
+    rows_rejected: int = 0
+    batches: int = 0            # add_many batches that committed rows
+    elapsed: float = 0.0
+    errors: List[Tuple[int, str]] = field(default_factory=list)   # (line number, message)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows_inserted / self.elapsed if self.elapsed else 0.0
+
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, dict]]:
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        elif fmt == 'jsonl':
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_no, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        # Stands in for the row; import_rows reports it as the row's error.
+                        yield line_no, ValueError(f'Malformed JSON: {e.msg} (column {e.colno})')
+        else:
+            raise ValueError(f'Unsupported format: {fmt}')
+
+
+def import_rows(entity: str, rows: Iterator[Tuple[int, dict]], batch_size: int = DEFAULT_BATCH_SIZE,
+                progress: Optional[Callable[[ImportReport], None]] = None,
+                workers: Optional[int] = None) -> ImportReport:
+    if entity not in ENTITIES:
+        raise ValueError(f'Unknown entity: {entity}. Expected one of {sorted(ENTITIES)}')
+    add_many = ENTITIES[entity]
+    report = ImportReport(entity)
+    started = time.perf_counter()
+    workers = VALIDATION_WORKERS if workers is None else workers
+    # validate_batch only uses the pool from PARALLEL_MIN_ROWS rows, usually more than a batch.
+    window = max(batch_size, PARALLEL_MIN_ROWS) if workers > 1 else batch_size
+
+    for chunk in chunked(rows, window):
+        readable = [i for i, (_, row) in enumerate(chunk) if not isinstance(row, ValueError)]
+        result = validate_batch(entity, [chunk[i][1] for i in readable], workers)
+        report.rows_read += len(chunk)
+        errors = [(readable[n], msg) for n, msg in result.errors]
+        if len(readable) < len(chunk):
+            errors = sorted(errors + [(i, str(row)) for i, (_, row) in enumerate(chunk)
+                                      if isinstance(row, ValueError)])
+        valid = result.valid
+        if valid:
+            ids = add_many(valid, batch_size=batch_size)
+            skipped = [(readable[result.rows[n]], SKIPPED[entity](valid[n]))
+                       for n, rid in enumerate(ids) if rid is None]
+            report.rows_inserted += len(ids) - len(skipped)
+            # add_many commits per batch_size slice of `valid`; one that kept no row commits nothing.
+            report.batches += sum(any(rid is not None for rid in part) for part in chunked(ids, batch_size))
+            if skipped:
+                errors = sorted(errors + skipped)
+        report.rows_rejected += len(errors)
+        for i, msg in errors[:MAX_RECORDED_ERRORS - len(report.errors)]:
+            report.errors.append((chunk[i][0], msg))
+        report.elapsed = time.perf_counter() - started
+        if progress:
+            progress(report)
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def import_file(entity: str, path: str, fmt: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                progress: Optional[Callable[[ImportReport], None]] = None,
+                workers: Optional[int] = None) -> ImportReport:
+    return import_rows(entity, read_rows(path, fmt), batch_size, progress, workers)
+
+
+def _print_progress(report: ImportReport):
+    print(f'\r{report.rows_read} read, {report.rows_inserted} inserted, '
+          f'{report.rows_rejected} rejected, {report.rows_per_sec:,.0f} rows/s', end='', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import patients, doctors or appointments.')
+    parser.add_argument('entity', choices=sorted(ENTITIES))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default=None,
+                        help='defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='validation processes (default VALIDATION_WORKERS); rows are then validated '
+                             f'{PARALLEL_MIN_ROWS} at a time')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error(f'No such file: {args.path}')
+
+    report = import_file(args.entity, args.path, args.format, args.batch_size, _print_progress, args.workers)
+    print()
+    print(f'✅ Imported {report.rows_inserted} {args.entity} in {report.elapsed:.2f}s '
+          f'({report.rows_per_sec:,.0f} rows/s, {report.batches} batches)')
+    if report.rows_rejected:
+        print(f'❌ Rejected {report.rows_rejected} rows')
+        for line_no, msg in report.errors:
+            print(f'  line {line_no}: {msg}')
+        if report.rows_rejected > len(report.errors):
+            print(f'  ... {report.rows_rejected - len(report.errors)} more')
+    return 0 if not report.rows_rejected else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
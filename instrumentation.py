@@ -0,0 +1,461 @@
+"""Query instrumentation: per-method and per-statement counters, latency histograms
+and a slow-query log.
+
+get_connection() hands out InstrumentedConnection proxies while METRICS_ENABLED is
+on. Their cursors time execute and fetch calls and count rows. Repository classes
+decorated with @instrumented label every statement with the outermost repository
+method that issued it. Everything is aggregated in memory under one lock; nothing
+is written per query unless a statement is slower than SLOW_QUERY_MS.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# Upper bounds in seconds; the last bucket is +Inf.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_STATEMENT_LENGTH = 200
+
+slow_log = logging.getLogger('hospital.slow_query')
+
+_operation = contextvars.ContextVar('db_operation', default=None)
+_clock = time.perf_counter
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'max': self.max,
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], self.counts)),
+        }
+
+
+class StatementStats:
+    __slots__ = ('count', 'errors', 'rows', 'execute', 'fetch')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.execute = Histogram()
+        self.fetch = Histogram()
+
+
+class Metrics:
+    def __init__(self, slow_query_seconds: float = 0.5):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._statements: Dict[tuple, StatementStats] = {}
+        self._methods: Dict[str, Histogram] = {}
+        self._method_errors: Dict[str, int] = {}
+        self._statement_text: Dict[str, str] = {}
+        self.connect = Histogram()
+        self.commit = Histogram()
+        self.connect_errors = 0
+        self.retries = 0
+        self.slow_queries = 0
+        self._collectors = []
+
+    def statement_key(self, sql: str) -> str:
+        text = self._statement_text.get(sql)
+        if text is None:
+            text = re.sub(r'\s+', ' ', sql).strip()[:MAX_STATEMENT_LENGTH]
+            if len(self._statement_text) < 10000:
+                self._statement_text[sql] = text
+        return text
+
+    def _stats(self, operation: Optional[str], statement: str) -> StatementStats:
+        key = (operation or '-', statement)
+        stats = self._statements.get(key)
+        if stats is None:
+            stats = self._statements[key] = StatementStats()
+        return stats
+
+    def record_statement(self, operation, statement: str, execute: float, fetch: float,
+                         rows: int, failed: bool = False):
+        with self._lock:
+            s = self._stats(operation, statement)
+            s.count += 1
+            s.execute.observe(execute)
+            s.fetch.observe(fetch)
+            s.rows += rows
+            if failed:
+                s.errors += 1
+            slow = execute + fetch >= self.slow_query_seconds
+            if slow:
+                self.slow_queries += 1
+        if slow:
+            slow_log.warning('slow query %.1f ms (execute %.1f, fetch %.1f) rows=%d op=%s sql=%s',
+                             (execute + fetch) * 1000, execute * 1000, fetch * 1000, rows,
+                             operation, statement)
+
+    def record_method(self, name: str, seconds: float, failed: bool = False):
+        with self._lock:
+            h = self._methods.get(name)
+            if h is None:
+                h = self._methods[name] = Histogram()
+            h.observe(seconds)
+            if failed:
+                self._method_errors[name] = self._method_errors.get(name, 0) + 1
+
+    def record_connect(self, seconds: float, failed: bool = False):
+        with self._lock:
+            self.connect.observe(seconds)
+            if failed:
+                self.connect_errors += 1
+
+    def record_commit(self, seconds: float):
+        with self._lock:
+            self.commit.observe(seconds)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def register_collector(self, fn: Callable[[], Dict[str, float]]):
+        """Add gauges computed at export time; fn returns {'name{labels}': value}."""
+        self._collectors.append(fn)
+
+    def _collect(self) -> Dict[str, float]:
+        gauges = {}
+        for fn in self._collectors:
+            gauges.update(fn())
+        return gauges
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._methods.clear()
+            self._method_errors.clear()
+            self.connect = Histogram()
+            self.commit = Histogram()
+            self.connect_errors = self.retries = self.slow_queries = 0
+
+    # --- export --- #
+
+    def snapshot(self) -> dict:
+        gauges = self._collect()
+        with self._lock:
+            return {
+                'gauges': gauges,
+                'connect': self.connect.to_dict(),
+                'connect_errors': self.connect_errors,
+                'commit': self.commit.to_dict(),
+                'retries': self.retries,
+                'slow_queries': self.slow_queries,
+                'slow_query_ms': self.slow_query_seconds * 1000,
+                'methods': {
+                    name: dict(h.to_dict(), errors=self._method_errors.get(name, 0))
+                    for name, h in sorted(self._methods.items())
+                },
+                'statements': [
+                    {
+                        'operation': op,
+                        'sql': sql,
+                        'count': s.count,
+                        'errors': s.errors,
+                        'rows': s.rows,
+                        'execute': s.execute.to_dict(),
+                        'fetch': s.fetch.to_dict(),
+                    }
+                    for (op, sql), s in sorted(self._statements.items())
+                ],
+            }
+
+    def export_json(self, path: str, extra: Optional[dict] = None):
+        data = self.snapshot()
+        if extra:
+            data.update(extra)
+        _atomic_write(path, json.dumps(data, indent=2, default=str))
+
+    def prometheus_text(self) -> str:
+        lines = []
+
+        def histogram(name: str, h: Histogram, labels: str = ''):
+            sep = ',' if labels else ''
+            cumulative = 0
+            for bound, c in zip([str(b) for b in BUCKETS] + ['+Inf'], h.counts):
+                cumulative += c
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {h.total}')
+            lines.append(f'{name}_count{{{labels}}} {h.count}')
+
+        for name, value in sorted(self._collect().items()):
+            lines.append(f'{name} {value}')
+        with self._lock:
+            lines.append('# TYPE hospital_db_connect_seconds histogram')
+            histogram('hospital_db_connect_seconds', self.connect)
+            lines.append('# TYPE hospital_db_connect_errors_total counter')
+            lines.append(f'hospital_db_connect_errors_total {self.connect_errors}')
+            lines.append('# TYPE hospital_db_retries_total counter')
+            lines.append(f'hospital_db_retries_total {self.retries}')
+            lines.append('# TYPE hospital_db_commit_seconds histogram')
+            histogram('hospital_db_commit_seconds', self.commit)
+            lines.append('# TYPE hospital_db_slow_queries_total counter')
+            lines.append(f'hospital_db_slow_queries_total {self.slow_queries}')
+
+            lines.append('# TYPE hospital_repository_seconds histogram')
+            for name, h in sorted(self._methods.items()):
+                histogram('hospital_repository_seconds', h, f'method="{name}"')
+
+            for kind in ('execute', 'fetch'):
+                lines.append(f'# TYPE hospital_db_{kind}_seconds histogram')
+                for (op, sql), s in sorted(self._statements.items()):
+                    histogram(f'hospital_db_{kind}_seconds', getattr(s, kind),
+                              f'method="{op}",sql="{_escape(sql)}"')
+            lines.append('# TYPE hospital_db_rows_total counter')
+            for (op, sql), s in sorted(self._statements.items()):
+                lines.append(f'hospital_db_rows_total{{method="{op}",sql="{_escape(sql)}"}} {s.rows}')
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path: str):
+        _atomic_write(path, self.prometheus_text())
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _atomic_write(path: str, text: str):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+metrics = Metrics(float(os.getenv('SLOW_QUERY_MS', '500')) / 1000)
+
+
+# --- DB-API proxies --- #
+
+def _forward(name: str) -> property:
+    # Settable driver attributes; reads of anything else fall through __getattr__.
+    return property(lambda self: getattr(self._cursor, name),
+                    lambda self, value: setattr(self._cursor, name, value))
+
+
+class InstrumentedCursor:
+    # Timings for the current statement accumulate locally and are recorded once,
+    # when the next statement starts or the cursor/connection is finished.
+    __slots__ = ('_cursor', '_metrics', '_statement', '_operation', '_execute', '_fetch', '_rows',
+                 '_failed')
+
+    def __init__(self, cursor, registry: Metrics):
+        self._cursor = cursor
+        self._metrics = registry
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    arraysize = _forward('arraysize')
+    fast_executemany = _forward('fast_executemany')
+
+    def finish(self):
+        if self._statement is not None:
+            self._metrics.record_statement(self._operation, self._statement, self._execute,
+                                           self._fetch, self._rows, self._failed)
+            self._statement = None
+
+    def _timed_execute(self, method, sql, *args):
+        if self._statement is not None:
+            self.finish()
+        self._statement = self._metrics.statement_key(sql)
+        self._operation = _operation.get()
+        self._fetch = 0.0
+        self._rows = 0
+        self._failed = False
+        t0 = _clock()
+        try:
+            result = method(sql, *args)
+        except Exception:
+            self._failed = True
+            raise
+        finally:
+            self._execute = _clock() - t0
+        return self if result is self._cursor else result
+
+    def execute(self, sql, *params):
+        return self._timed_execute(self._cursor.execute, sql, *params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed_execute(self._cursor.executemany, sql, seq_of_params)
+
+    def _timed_fetch(self, method, *args):
+        t0 = _clock()
+        result = method(*args)
+        if self._statement is not None:
+            self._fetch += _clock() - t0
+            if type(result) is list:
+                self._rows += len(result)
+            elif result is not None:
+                self._rows += 1
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *size):
+        return self._timed_fetch(self._cursor.fetchmany, *size)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+    def close(self):
+        self.finish()
+        self._cursor.close()
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, registry: Metrics = metrics):
+        self._conn = conn
+        self._metrics = registry
+        self._cursors = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        cur = InstrumentedCursor(self._conn.cursor(), self._metrics)
+        self._cursors.append(cur)
+        return cur
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        t0 = _clock()
+        self._conn.commit()
+        self._metrics.record_commit(_clock() - t0)
+
+    def finish(self):
+        # Flushes slow-query accounting for cursors the caller never closed.
+        for cur in self._cursors:
+            cur.finish()
+        self._cursors.clear()
+
+
+def timed_connect(connect: Callable, registry: Metrics = metrics) -> Callable:
+    @functools.wraps(connect)
+    def wrapper(*args, **kwargs):
+        t0 = _clock()
+        try:
+            conn = connect(*args, **kwargs)
+        except Exception:
+            registry.record_connect(_clock() - t0, failed=True)
+            raise
+        registry.record_connect(_clock() - t0)
+        return conn
+    return wrapper
+
+
+# --- repository method labels --- #
+
+def current_operation() -> Optional[str]:
+    return _operation.get()
+
+
+@contextmanager
+def operation(label: str):
+    """Attribute statements in this block to `label`, overriding any outer label."""
+    token = _operation.set(label)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+def _wrap_generator(gen, label: str, registry: Metrics, record: bool):
+    elapsed = 0.0
+    try:
+        while True:
+            token = _operation.set(label)
+            t0 = _clock()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                elapsed += _clock() - t0
+                _operation.reset(token)
+            yield item
+    finally:
+        gen.close()
+        if record:
+            registry.record_method(label, elapsed)
+
+
+def instrument(name: str, fn: Callable, registry: Metrics = metrics) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Nested repository calls are attributed to the outermost one.
+        outer = _operation.get()
+        label = outer or name
+        token = _operation.set(label)
+        t0 = _clock()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            if outer is None:
+                registry.record_method(label, _clock() - t0, failed=True)
+            raise
+        finally:
+            _operation.reset(token)
+        if inspect.isgenerator(result):
+            # Generators do their work lazily; time them across next() calls instead.
+            return _wrap_generator(result, label, registry, outer is None)
+        if outer is None:
+            registry.record_method(label, _clock() - t0)
+        return result
+    return wrapper
+
+
+def instrumented(cls):
+    """Class decorator: label every public static method as `ClassName.method`."""
+    for attr, value in list(vars(cls).items()):
+        if isinstance(value, staticmethod) and not attr.startswith('_'):
+            setattr(cls, attr, staticmethod(instrument(f'{cls.__name__}.{attr}', value.__func__)))
+    return cls
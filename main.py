@@ -1,6 +1,30 @@
-from database import initialize_db 
+import argparse
+import sys
+
+import database
+from blocking import DEDUP_MODE
 from services import PatientService, DoctorService, AppointmentService
 
+PAGE_SIZE = 20
+
+
+def page_through(fetch_page, next_key, empty_message=None):
+    # fetch_page(key, limit) returns one keyset page; next_key(row) gives the key after that row.
+    key = None
+    shown = 0
+    while True:
+        rows = fetch_page(key, PAGE_SIZE)
+        if not rows and not shown and empty_message:
+            print(empty_message)
+        for r in rows:
+            print(r)
+        shown += len(rows)
+        if len(rows) < PAGE_SIZE:
+            return shown
+        if input('-- Enter for more, q to stop -- ').strip().lower() == 'q':
+            return shown
+        key = next_key(rows[-1])
+
 def print_menu():
     print('\n --- Hospital Management ---')
     print("1. Add Patient")
@@ -15,10 +39,32 @@ def print_menu():
     print("10. View Upcoming Appointments")
     print("11. View Appointments (detailed)")
     print("12. Cancel Appointment")
+    print("13. Find Next Free Slot")
+    print("14. Doctor Calendar")
+    print("15. Patient Appointments")
     print("0. Exit")
 
-def main():
-    initialize_db()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Console hospital management.')
+    parser.add_argument('--no-init', action='store_true',
+                        help='skip the schema check/bootstrap; the database must already be set up')
+    parser.add_argument('--batch', metavar='PATH',
+                        help='run JSONL commands from PATH (- for stdin) instead of the menu; see batch.py')
+    parser.add_argument('--output', metavar='PATH', help='batch results as JSONL (default stdout)')
+    parser.add_argument('--commit-every', type=int, default=0, metavar='N',
+                        help='batch: run N commands per transaction (default: each commits on its own)')
+    parser.add_argument('--stop-on-error', action='store_true', help='batch: stop after the first failure')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The schema is checked lazily on the first database call unless --no-init is given.
+    if args.no_init:
+        database.AUTO_INIT = False
+    if args.batch:
+        import batch
+        return batch.main(args.batch, args.output, args.commit_every, args.stop_on_error)
     
     while True:
         print_menu()
@@ -29,21 +75,36 @@ def main():
                 name = input('Name: ')
                 age = input('Age: ')
                 gender = input('Gender: ')
-                pid = PatientService.create(name,age,gender)
+                duplicates = PatientService.find_duplicates(name, age, gender) if DEDUP_MODE != 'off' else []
+                if duplicates:
+                    print('Possible duplicates:')
+                    for p, score in duplicates[:5]:
+                        print(f'{p}  (match {score:.2f})')
+                    if DEDUP_MODE == 'reject' or input('Add anyway? (y/N) ').strip().lower() != 'y':
+                        print('Not added.')
+                        continue
+                pid = PatientService.create(name, age, gender, allow_duplicate=bool(duplicates))
                 print(f'✅ Patient added with Id: {pid}') 
                 
             elif ch == '2':
-                patients = PatientService.list_all()
-                if not patients:
-                    print('No patients found')
-                for p in patients:
-                    print(p) 
+                page_through(
+                    lambda key, n: PatientService.list_all(after_id=key, limit=n),
+                    lambda p: p.id,
+                    'No patients found'
+                )
                     
             elif ch == '3':
                 q = input('Search name substring: ')
-                results = PatientService.search(q)
-                for r in results:
-                    print(r)
+                shown = page_through(
+                    lambda key, n: PatientService.search(q, after_id=key, limit=n),
+                    lambda p: p.id
+                )
+                if not shown:
+                    similar = PatientService.search_similar(q)
+                    if similar:
+                        print('No exact matches. Did you mean:')
+                        for p in similar:
+                            print(p)
                     
             elif ch == '4':
                 pid = input("ID: ")
@@ -66,17 +127,24 @@ def main():
                 print(f'✅ Doctor added with Id : {did}')
                 
             elif ch == '7':
-                doctors = DoctorService.list_all()
-                if not doctors:
-                    print("No doctors found")
-                else:
-                    for d in doctors:
-                        print(d)
+                page_through(
+                    lambda key, n: DoctorService.list_all(after_id=key, limit=n),
+                    lambda d: d.id,
+                    "No doctors found"
+                )
                     
             elif ch == '8':
                 q = input('Speciality substring: ')
-                for d in DoctorService.search(q):
-                    print(d)
+                shown = page_through(
+                    lambda key, n: DoctorService.search(q, after_id=key, limit=n),
+                    lambda d: d.id
+                )
+                if not shown:
+                    similar = DoctorService.search_similar(q)
+                    if similar:
+                        print('No exact matches. Did you mean:')
+                        for d in similar:
+                            print(d)
                     
             elif ch == '9':
                 print("Provide patient_id, doctor_id and datetime (YYYY-MM-DD HH:MM)")
@@ -84,23 +152,62 @@ def main():
                 did = input("Doctor ID: ")
                 dt = input("Scheduled At: ")
                 notes = input("Notes (optional): ")
+                duration = input("Duration in minutes (default 30): ")
                 
-                aid = AppointmentService.schedule(pid,did,dt,notes)
+                aid = AppointmentService.schedule(pid,did,dt,notes,duration)
                 print(f'✅ Appointment scheduled (ID: {aid})')
 
             elif ch == '10':
-                for a in AppointmentService.list_upcoming():
-                    print(a)
+                page_through(
+                    lambda key, n: AppointmentService.list_upcoming(*(key or (None, None)), limit=n),
+                    lambda a: (a.scheduled_at, a.id)
+                )
                 
             elif ch == '11':
-                for d in AppointmentService.list_detailed():
-                    print(d)
+                page_through(
+                    lambda key, n: AppointmentService.list_detailed(*(key or (None, None)), limit=n),
+                    lambda d: (d.scheduled_at, d.appointment_id)
+                )
                      
             elif ch == '12':
                 aid = input('Appointment ID to cancel: ')
                 ok = AppointmentService.cancel(aid)
                 print('✅ Cancelled' if ok else '❌ Not found')
                 
+            elif ch == '13':
+                did = input("Doctor ID (leave empty to search by specialty): ")
+                specialty = input("Specialty: ") if not did.strip() else None
+                after = input("Earliest start (YYYY-MM-DD HH:MM, empty for now): ")
+                duration = input("Duration in minutes (default 30): ")
+
+                slot = AppointmentService.find_next_free_slot(did.strip(), specialty, after.strip(), duration.strip())
+                if slot:
+                    print(f'✅ Doctor {slot[1]} is free at {slot[0]:%Y-%m-%d %H:%M}')
+                else:
+                    print('❌ No matching doctors')
+
+            elif ch == '14':
+                did = input("Doctor ID: ")
+                start = input("From (YYYY-MM-DD [HH:MM]): ")
+                end = input("To, exclusive (empty for one day): ")
+                page_through(
+                    lambda key, n: AppointmentService.list_for_doctor(did, start, end.strip(), *(key or (None, None)),
+                                                                      limit=n),
+                    lambda a: (a.scheduled_at, a.id),
+                    'No appointments'
+                )
+
+            elif ch == '15':
+                pid = input("Patient ID: ")
+                start = input("From (YYYY-MM-DD [HH:MM]): ")
+                end = input("To, exclusive (empty for one day): ")
+                page_through(
+                    lambda key, n: AppointmentService.list_for_patient(pid, start, end.strip(), *(key or (None, None)),
+                                                                       limit=n, include_archived=True),
+                    lambda a: (a.scheduled_at, a.id),
+                    'No appointments'
+                )
+
             elif ch == '0':
                 break
             
@@ -111,4 +218,4 @@ def main():
             print(f'Error: {e}')
             
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
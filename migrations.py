@@ -0,0 +1,312 @@
+"""Ordered schema migrations applied on top of the base tables from initialize_db.
+
+Append new migrations to MIGRATIONS with the next version number; never edit or
+reorder one that has shipped. Each migration runs in its own transaction together
+with its schema_version row, under an application lock so two processes starting
+at once do not both apply it. sqlite_statements is the same change for the
+SQLite backend.
+"""
+from dataclasses import dataclass
+from typing import List, Tuple
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: Tuple[str, ...]
+    sqlite_statements: Tuple[str, ...] = ()
+
+
+def _create_index(name: str, table: str, ddl: str) -> str:
+    return f'''
+        IF NOT EXISTS (
+            SELECT 1 FROM sys.indexes WHERE name = '{name}' AND object_id = OBJECT_ID('{table}')
+        )
+        {ddl}
+    '''
+
+
+def _replace_index(name: str, table: str, ddl: str) -> str:
+    # Redefine an index in place (rebuilt from the old one) or create it if missing.
+    return f'''
+        IF EXISTS (
+            SELECT 1 FROM sys.indexes WHERE name = '{name}' AND object_id = OBJECT_ID('{table}')
+        )
+        {ddl} WITH (DROP_EXISTING = ON)
+        ELSE
+        {ddl}
+    '''
+
+
+MIGRATIONS: List[Migration] = [
+    # SQLite databases are created with the column already in place, hence no sqlite_statements.
+    Migration(1, 'appointment duration', (
+        '''
+        IF COL_LENGTH('appointments', 'duration_minutes') IS NULL
+        ALTER TABLE appointments
+            ADD duration_minutes INT NOT NULL CONSTRAINT DF_App_Duration DEFAULT 30
+        ''',
+    )),
+    Migration(2, 'indexes for hot appointment and doctor queries', (
+        # list_all(upcoming_only), get_detailed_list: range + ORDER BY scheduled_at
+        _create_index('IX_appointments_scheduled_at', 'appointments', '''
+            CREATE INDEX IX_appointments_scheduled_at ON appointments (scheduled_at, id)
+                INCLUDE (patient_id, doctor_id, notes, duration_minutes, created_at)
+        '''),
+        # per-doctor schedule lookups and the booking index load
+        _create_index('IX_appointments_doctor_scheduled', 'appointments', '''
+            CREATE INDEX IX_appointments_doctor_scheduled ON appointments (doctor_id, scheduled_at)
+                INCLUDE (duration_minutes)
+        '''),
+        # per-patient lookups and patient deletes checking FK_App_Patient
+        _create_index('IX_appointments_patient', 'appointments', '''
+            CREATE INDEX IX_appointments_patient ON appointments (patient_id)
+                INCLUDE (scheduled_at)
+        '''),
+        # search_by_specialist scans this narrow index instead of the whole table
+        _create_index('IX_doctors_specialty', 'doctors', '''
+            CREATE INDEX IX_doctors_specialty ON doctors (specialty)
+                INCLUDE (name, created_at)
+        '''),
+    ), (
+        # SQLite has no INCLUDE; the columns the lookups need are added to the key instead.
+        'CREATE INDEX IF NOT EXISTS IX_appointments_scheduled_at ON appointments (scheduled_at, id)',
+        'CREATE INDEX IF NOT EXISTS IX_appointments_doctor_scheduled '
+        'ON appointments (doctor_id, scheduled_at, duration_minutes)',
+        'CREATE INDEX IF NOT EXISTS IX_appointments_patient ON appointments (patient_id, scheduled_at)',
+        'CREATE INDEX IF NOT EXISTS IX_doctors_specialty ON doctors (specialty)',
+    )),
+    Migration(3, 'appointments archive and history view', (
+        '''
+        IF NOT EXISTS(
+            SELECT 1 FROM information_schema.tables WHERE table_name = 'appointments_archive'
+        )
+        CREATE TABLE appointments_archive(
+            id INT PRIMARY KEY,
+            patient_id INT NOT NULL,
+            doctor_id INT NOT NULL,
+            scheduled_at DATETIME2 NOT NULL,
+            notes VARCHAR(500) NULL,
+            created_at DATETIME2 NULL,
+            duration_minutes INT NOT NULL,
+            archived_at DATETIME2 DEFAULT GETDATE(),
+            CONSTRAINT FK_AppArchive_Patient FOREIGN KEY (patient_id) REFERENCES patients(id),
+            CONSTRAINT FK_AppArchive_Doctor FOREIGN KEY (doctor_id) REFERENCES doctors(id)
+        )
+        ''',
+        _create_index('IX_appointments_archive_scheduled_at', 'appointments_archive', '''
+            CREATE INDEX IX_appointments_archive_scheduled_at ON appointments_archive (scheduled_at, id)
+                INCLUDE (patient_id, doctor_id, notes, duration_minutes, created_at)
+        '''),
+        _create_index('IX_appointments_archive_patient', 'appointments_archive', '''
+            CREATE INDEX IX_appointments_archive_patient ON appointments_archive (patient_id)
+                INCLUDE (scheduled_at)
+        '''),
+        _create_index('IX_appointments_archive_doctor', 'appointments_archive', '''
+            CREATE INDEX IX_appointments_archive_doctor ON appointments_archive (doctor_id, scheduled_at)
+        '''),
+        # CREATE VIEW must start its own batch, hence EXEC.
+        '''
+        IF OBJECT_ID('appointments_history', 'V') IS NULL
+        EXEC('CREATE VIEW appointments_history AS
+            SELECT id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes
+            FROM appointments
+            UNION ALL
+            SELECT id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes
+            FROM appointments_archive')
+        ''',
+    ), (
+        '''
+        CREATE TABLE IF NOT EXISTS appointments_archive(
+            id INTEGER PRIMARY KEY,
+            patient_id INT NOT NULL,
+            doctor_id INT NOT NULL,
+            scheduled_at DATETIME2 NOT NULL,
+            notes VARCHAR(500) NULL,
+            created_at DATETIME2 NULL,
+            duration_minutes INT NOT NULL,
+            archived_at DATETIME2 DEFAULT (datetime('now', 'localtime')),
+            CONSTRAINT FK_AppArchive_Patient FOREIGN KEY (patient_id) REFERENCES patients(id),
+            CONSTRAINT FK_AppArchive_Doctor FOREIGN KEY (doctor_id) REFERENCES doctors(id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS IX_appointments_archive_scheduled_at ON appointments_archive (scheduled_at, id)',
+        'CREATE INDEX IF NOT EXISTS IX_appointments_archive_patient ON appointments_archive (patient_id, scheduled_at)',
+        'CREATE INDEX IF NOT EXISTS IX_appointments_archive_doctor ON appointments_archive (doctor_id, scheduled_at)',
+        '''
+        CREATE VIEW IF NOT EXISTS appointments_history AS
+            SELECT id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes
+            FROM appointments
+            UNION ALL
+            SELECT id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes
+            FROM appointments_archive
+        ''',
+    )),
+    # Filled from existing appointments here; reporting.rebuild() recomputes it later.
+    Migration(4, 'daily appointment stats per doctor', (
+        '''
+        IF NOT EXISTS(
+            SELECT 1 FROM information_schema.tables WHERE table_name = 'appointment_stats_daily'
+        )
+        CREATE TABLE appointment_stats_daily(
+            doctor_id INT NOT NULL,
+            day DATE NOT NULL,
+            appointments INT NOT NULL,
+            minutes INT NOT NULL,
+            CONSTRAINT PK_AppStatsDaily PRIMARY KEY (doctor_id, day)
+        )
+        ''',
+        _create_index('IX_appointment_stats_daily_day', 'appointment_stats_daily', '''
+            CREATE INDEX IX_appointment_stats_daily_day ON appointment_stats_daily (day)
+                INCLUDE (appointments, minutes)
+        '''),
+        '''
+        INSERT INTO appointment_stats_daily (doctor_id, day, appointments, minutes)
+        SELECT doctor_id, CAST(scheduled_at AS DATE), COUNT(*), SUM(duration_minutes)
+        FROM appointments_history
+        GROUP BY doctor_id, CAST(scheduled_at AS DATE)
+        ''',
+    ), (
+        '''
+        CREATE TABLE IF NOT EXISTS appointment_stats_daily(
+            doctor_id INT NOT NULL,
+            day DATE NOT NULL,
+            appointments INT NOT NULL,
+            minutes INT NOT NULL,
+            PRIMARY KEY (doctor_id, day)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS IX_appointment_stats_daily_day ON appointment_stats_daily (day)',
+        '''
+        INSERT INTO appointment_stats_daily (doctor_id, day, appointments, minutes)
+        SELECT doctor_id, date(scheduled_at), COUNT(*), SUM(duration_minutes)
+        FROM appointments_history
+        GROUP BY doctor_id, date(scheduled_at)
+        ''',
+    )),
+    # Calendar windows (list_for_doctor/_patient/_specialty) are range seeks on
+    # (doctor_id, scheduled_at) and (patient_id, scheduled_at); the SQL Server indexes
+    # from migrations 2 and 3 keyed patients on patient_id alone and covered too little.
+    # The SQLite ones already have scheduled_at in the key, hence no sqlite_statements.
+    Migration(5, 'calendar range indexes', (
+        _replace_index('IX_appointments_patient', 'appointments', '''
+            CREATE INDEX IX_appointments_patient ON appointments (patient_id, scheduled_at)
+                INCLUDE (doctor_id, notes, duration_minutes, created_at)
+        '''),
+        _replace_index('IX_appointments_doctor_scheduled', 'appointments', '''
+            CREATE INDEX IX_appointments_doctor_scheduled ON appointments (doctor_id, scheduled_at)
+                INCLUDE (patient_id, notes, duration_minutes, created_at)
+        '''),
+        _replace_index('IX_appointments_archive_patient', 'appointments_archive', '''
+            CREATE INDEX IX_appointments_archive_patient ON appointments_archive (patient_id, scheduled_at)
+                INCLUDE (doctor_id, notes, duration_minutes, created_at)
+        '''),
+        _replace_index('IX_appointments_archive_doctor', 'appointments_archive', '''
+            CREATE INDEX IX_appointments_archive_doctor ON appointments_archive (doctor_id, scheduled_at)
+                INCLUDE (patient_id, notes, duration_minutes, created_at)
+        '''),
+    )),
+    # Change marks for the in-process search indexes: the repositories bump a table's
+    # version in the same transaction as each update or delete, so an index can tell
+    # that rows changed in another process (search_index.TrigramIndex).
+    Migration(6, 'search index change marks', (
+        '''
+        IF NOT EXISTS(
+            SELECT 1 FROM information_schema.tables WHERE table_name = 'search_marks'
+        )
+        CREATE TABLE search_marks(
+            name VARCHAR(32) NOT NULL CONSTRAINT PK_SearchMarks PRIMARY KEY,
+            version INT NOT NULL
+        )
+        ''',
+        '''
+        INSERT INTO search_marks (name, version)
+        SELECT t.name, 0 FROM (VALUES ('patients'), ('doctors')) AS t(name)
+        WHERE NOT EXISTS (SELECT 1 FROM search_marks m WHERE m.name = t.name)
+        ''',
+    ), (
+        '''
+        CREATE TABLE IF NOT EXISTS search_marks(
+            name VARCHAR(32) NOT NULL PRIMARY KEY,
+            version INT NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO search_marks (name, version) VALUES ('patients', 0), ('doctors', 0)",
+    )),
+    # Replaces search_marks, whose single row per table every update and delete had to
+    # lock: each change is logged as its own row under an identity version, with the
+    # row id, so an index applies just those rows (repositories._search_changes).
+    # prune_search_changes trims it (archive.py --search-log).
+    Migration(7, 'search index change log', (
+        '''
+        IF NOT EXISTS(
+            SELECT 1 FROM information_schema.tables WHERE table_name = 'search_changes'
+        )
+        CREATE TABLE search_changes(
+            version INT IDENTITY(1,1) CONSTRAINT PK_SearchChanges PRIMARY KEY,
+            name VARCHAR(32) NOT NULL,
+            row_id INT NOT NULL,
+            op CHAR(1) NOT NULL,
+            changed_at DATETIME2 DEFAULT GETDATE()
+        )
+        ''',
+        _create_index('IX_search_changes_name', 'search_changes', '''
+            CREATE INDEX IX_search_changes_name ON search_changes (name, version)
+                INCLUDE (row_id, op)
+        '''),
+        _create_index('IX_search_changes_changed_at', 'search_changes', '''
+            CREATE INDEX IX_search_changes_changed_at ON search_changes (changed_at, version)
+        '''),
+        "IF OBJECT_ID('search_marks', 'U') IS NOT NULL DROP TABLE search_marks",
+    ), (
+        # AUTOINCREMENT: a version is never handed out twice, even after pruning.
+        '''
+        CREATE TABLE IF NOT EXISTS search_changes(
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(32) NOT NULL,
+            row_id INT NOT NULL,
+            op CHAR(1) NOT NULL,
+            changed_at DATETIME2 DEFAULT (datetime('now', 'localtime'))
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS IX_search_changes_name ON search_changes (name, version, row_id, op)',
+        'CREATE INDEX IF NOT EXISTS IX_search_changes_changed_at ON search_changes (changed_at, version)',
+        'DROP TABLE IF EXISTS search_marks',
+    )),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(cur) -> int:
+    cur.execute('SELECT MAX(version) FROM schema_version')
+    row = cur.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+
+def migrate(conn, backend, target: int = LATEST_VERSION) -> List[int]:
+    cur = conn.cursor()
+    cur.execute(backend.version_table_ddl)
+    conn.commit()
+
+    applied = []
+    for m in MIGRATIONS:
+        if m.version > target:
+            break
+        if m.version <= current_version(cur):
+            continue
+        try:
+            backend.lock_migrations(cur)
+            # Another process may have applied it while we waited for the lock.
+            if m.version > current_version(cur):
+                for stmt in backend.migration_statements(m):
+                    cur.execute(stmt)
+                cur.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                            (m.version, m.description))
+                applied.append(m.version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
@@ -1,27 +1,136 @@
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional 
+import os
+import sys
+from array import array
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Sequence, Tuple
 
-@dataclass
+DEFAULT_APPOINTMENT_MINUTES = 30
+# The booking conflict checks look back this far (scheduling.LOOKBEHIND).
+MAX_APPOINTMENT_MINUTES = 24 * 60
+
+# Frozen rows can be shared safely (e.g. from the entity cache) but cost more to build;
+# with FROZEN_MODELS=no the caches hand out copies instead.
+FROZEN_MODELS = os.getenv('FROZEN_MODELS', 'yes').strip().lower() in ('1', 'true', 'yes', 'on')
+
+row_model = dataclass(slots=True, frozen=FROZEN_MODELS)
+
+
+@row_model
 class Patient:
     id: Optional[int]
     name: str
     age: Optional[int]
     gender: Optional[str]
-    created_at: Optional[datetime] = None 
-    
-@dataclass 
+    created_at: Optional[datetime] = None
+
+@row_model
 class Doctor:
     id: Optional[int]
     name: str
     specialty: Optional[str]
-    created_at: Optional[datetime] = None 
-    
-@dataclass
+    created_at: Optional[datetime] = None
+
+@row_model
 class Appointment:
     id: Optional[int]
-    patient_id: int 
+    patient_id: int
+    doctor_id: int
+    scheduled_at: datetime
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+    duration_minutes: int = DEFAULT_APPOINTMENT_MINUTES
+
+@row_model
+class AppointmentDetail:
+    appointment_id: int
+    patient_id: int
+    patient_name: Optional[str]
     doctor_id: int
+    doctor_name: Optional[str]
     scheduled_at: datetime
     notes: Optional[str] = None
-    created_at: Optional[datetime] = None
\ No newline at end of file
+
+
+def row_mapper(cls) -> Callable:
+    """Fastest constructor for a row model from a full row's values, for use with
+    itertools.starmap. Frozen models skip the per-field checks of their __init__."""
+    if not cls.__dataclass_params__.frozen:
+        return cls
+    setters = [getattr(cls, f.name).__set__ for f in fields(cls)]
+
+    def build(*values, new=object.__new__):
+        obj = new(cls)
+        for set_value, value in zip(setters, values):
+            set_value(obj, value)
+        return obj
+    return build
+
+
+# --- Columnar results --- #
+
+EPOCH = datetime(1970, 1, 1)
+_NAN = float('nan')
+
+
+class Columns:
+    """Column-oriented rows for analytics-sized reads.
+
+    `spec` is a sequence of (name, kind): 'int' columns are array('q'), 'time'
+    columns are array('d') of seconds since EPOCH in the stored (naive) time, NaN
+    for NULL, and 'str' columns are lists of interned strings, so repeated names
+    share one object.
+    """
+
+    __slots__ = ('spec', '_columns')
+
+    def __init__(self, spec: Sequence[Tuple[str, str]]):
+        self.spec = tuple(spec)
+        self._columns = {}
+        for name, kind in self.spec:
+            if kind == 'int':
+                self._columns[name] = array('q')
+            elif kind == 'time':
+                self._columns[name] = array('d')
+            elif kind == 'str':
+                self._columns[name] = []
+            else:
+                raise ValueError(f'Unknown column kind {kind!r}')
+
+    def extend(self, rows: Sequence[tuple]):
+        # Column at a time: one transpose per batch, then a C-level extend per column.
+        if not rows:
+            return
+        for (name, kind), values in zip(self.spec, zip(*rows)):
+            column = self._columns[name]
+            if kind == 'time':
+                column.extend([_NAN if v is None else (v - EPOCH).total_seconds() for v in values])
+            elif kind == 'str':
+                column.extend([v if v is None else sys.intern(v) for v in values])
+            else:
+                column.extend(values)
+
+    def __len__(self):
+        return len(self._columns[self.spec[0][0]]) if self.spec else 0
+
+    def __getitem__(self, name: str):
+        return self._columns[name]
+
+    def names(self) -> List[str]:
+        return [name for name, _ in self.spec]
+
+    def datetimes(self, name: str) -> List[Optional[datetime]]:
+        return [None if s != s else EPOCH + timedelta(seconds=s) for s in self._columns[name]]
+
+    def row(self, i: int) -> tuple:
+        out = []
+        for name, kind in self.spec:
+            value = self._columns[name][i]
+            if kind == 'time':
+                value = None if value != value else EPOCH + timedelta(seconds=value)
+            out.append(value)
+        return tuple(out)
+
+    def nbytes(self) -> int:
+        # Array payloads plus list slots; interned strings are shared and not counted.
+        return sum(c.itemsize * len(c) if isinstance(c, array) else 8 * len(c) for c in self._columns.values())
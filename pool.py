@@ -0,0 +1,208 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PoolClosed(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe bounded pool of DB-API connections.
+
+    Idle connections are handed out LIFO so a small hot set stays warm while
+    the rest age out through idle eviction.
+    """
+
+    def __init__(self, connect: Callable[[], object], min_size: int = 1, max_size: int = 10,
+                 timeout: float = 30.0, max_idle: float = 300.0, ping_after: float = 5.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1')
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()        # (conn, last_used)
+        self._size = 0              # idle + checked out + being opened
+        self._closed = False
+
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'ping_failures': 0,
+            'evicted_idle': 0,
+            'discarded': 0,
+            'max_wait': 0.0,
+        }
+
+    # --- internals --- #
+
+    def _open(self):
+        # Caller has already reserved a slot in self._size.
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _close(self, conn, release_slot: bool = True):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            if release_slot:
+                self._size -= 1
+            self._stats['closed'] += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle_locked(self, now: float) -> list:
+        # Oldest idle connections sit at the left end of the deque.
+        stale = []
+        while self._idle and self._size > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.max_idle:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            stale.append(conn)
+        self._stats['evicted_idle'] += len(stale)
+        return stale
+
+    # --- public API --- #
+
+    def acquire(self, timeout: Optional[float] = None, ping: bool = False):
+        # ping: check an idle connection before handing it out, however recently it was used.
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            conn = None
+            last_used = 0.0
+            with self._cond:
+                if self._closed:
+                    raise PoolClosed('Connection pool is closed')
+
+                stale = self._evict_idle_locked(time.monotonic())
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'Timed out after {timeout:.1f}s waiting for a connection '
+                            f'(max_size={self.max_size})'
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            for s in stale:
+                self._close(s, release_slot=False)
+
+            if conn is None:
+                conn = self._open()
+            elif (ping or time.monotonic() - last_used >= self.ping_after) and not self._is_alive(conn):
+                with self._cond:
+                    self._stats['ping_failures'] += 1
+                self._close(conn)
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['max_wait'] = max(self._stats['max_wait'], time.monotonic() - started)
+            return conn
+
+    def fill(self):
+        # Pre-open connections up to min_size; otherwise they are opened on demand.
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._open()
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def release(self, conn, discard: bool = False):
+        if not discard:
+            # Never hand the next caller someone else's open transaction.
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if not discard and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+            self._stats['discarded'] += 1
+
+        self._close(conn)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            s = dict(self._stats)
+            s['size'] = self._size
+            s['idle'] = len(self._idle)
+            s['in_use'] = self._size - len(self._idle)
+            s['min_size'] = self.min_size
+            s['max_size'] = self.max_size
+        return s
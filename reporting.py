@@ -0,0 +1,185 @@
+"""Appointment reports from a per-doctor, per-day summary table.
+
+appointment_stats_daily (migration 4) holds one row per doctor and day with the
+number of appointments and booked minutes, archived ones included. The
+repositories keep it current on every add, add_many and delete, so reports read
+at most one row per doctor and day: their cost depends on the date range and the
+number of doctors, not on how many appointments exist. rebuild() recomputes it
+from the appointments with set-based GROUP BY queries, a range of doctors at a
+time, for backfills or after REPORTING_ENABLED=no.
+
+    python reporting.py rebuild
+    python reporting.py utilization --from 2024-01-01 --to 2024-02-01
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import database
+from database import env_bool, get_connection, read_connection
+from utils import parse_datetime
+
+ENABLED = env_bool('REPORTING_ENABLED', 'yes')
+# Bookable minutes per doctor on a weekday, the denominator of utilization.
+CLINIC_MINUTES_PER_DAY = int(os.getenv('CLINIC_MINUTES_PER_DAY', '480'))
+REBUILD_DOCTOR_BATCH = 500
+
+
+def record(cur, changes: Iterable[Tuple[int, datetime, int]], sign: int = 1):
+    """Apply (doctor_id, scheduled_at, duration_minutes) bookings to the summary on the
+    caller's cursor, so they commit or roll back with the appointment rows."""
+    if not ENABLED:
+        return
+    totals = defaultdict(lambda: [0, 0])
+    for doctor_id, scheduled_at, minutes in changes:
+        t = totals[doctor_id, scheduled_at.date()]
+        t[0] += sign
+        t[1] += sign * minutes
+    for (doctor_id, day), (count, minutes) in sorted(totals.items()):
+        database.backend.bump_daily_stats(cur, doctor_id, day, count, minutes)
+
+
+def rebuild(batch_doctors: int = REBUILD_DOCTOR_BATCH) -> dict:
+    """Recompute the summary from appointments_history, one transaction per range of
+    doctor ids. Bookings made meanwhile are either counted by the recount of their
+    range or applied on top of it, never lost."""
+    day = database.backend.day('scheduled_at')
+    started = time.perf_counter()
+    rows = 0
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT MIN(id), MAX(id) FROM doctors')
+        lo, hi = cur.fetchone()
+        cur.execute('SELECT MIN(doctor_id), MAX(doctor_id) FROM appointment_stats_daily')
+        stats_lo, stats_hi = cur.fetchone()
+    bounds = [b for b in (lo, hi, stats_lo, stats_hi) if b is not None]
+    if bounds:
+        for first in range(min(bounds), max(bounds) + 1, batch_doctors):
+            last = first + batch_doctors - 1
+            with get_connection() as conn:
+                cur = conn.cursor()
+                cur.execute('DELETE FROM appointment_stats_daily WHERE doctor_id BETWEEN ? AND ?', (first, last))
+                cur.execute(
+                    'INSERT INTO appointment_stats_daily (doctor_id, day, appointments, minutes) '
+                    f'SELECT doctor_id, {day}, COUNT(*), SUM(duration_minutes) FROM appointments_history '
+                    f'WHERE doctor_id BETWEEN ? AND ? GROUP BY doctor_id, {day}',
+                    (first, last)
+                )
+                rows += cur.rowcount if cur.rowcount > 0 else 0
+                conn.commit()
+    return {'rows': rows, 'seconds': time.perf_counter() - started}
+
+
+def _range(where: List[str], params: list, start: Optional[date], end: Optional[date], column: str = 'day'):
+    # Half-open: start <= day < end.
+    if start is not None:
+        where.append(f'{column} >= ?')
+        params.append(start)
+    if end is not None:
+        where.append(f'{column} < ?')
+        params.append(end)
+
+
+def _where(where: List[str]) -> str:
+    return ' WHERE ' + ' AND '.join(where) if where else ''
+
+
+def per_doctor(start: Optional[date] = None, end: Optional[date] = None) -> Dict[int, Tuple[int, int]]:
+    """doctor_id -> (appointments, booked minutes) for days in [start, end)."""
+    where, params = [], []
+    _range(where, params, start, end)
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT doctor_id, SUM(appointments), SUM(minutes) FROM appointment_stats_daily'
+            f'{_where(where)} GROUP BY doctor_id ORDER BY doctor_id',
+            params
+        )
+        return {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+
+
+def per_specialty(start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, int]:
+    where, params = [], []
+    _range(where, params, start, end, column='s.day')
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT d.specialty, SUM(s.appointments) FROM appointment_stats_daily s '
+            f'JOIN doctors d ON d.id = s.doctor_id{_where(where)} GROUP BY d.specialty ORDER BY d.specialty',
+            params
+        )
+        return {r[0]: r[1] for r in cur.fetchall()}
+
+
+def daily_volume(start: Optional[date] = None, end: Optional[date] = None) -> Dict[date, int]:
+    where, params = [], []
+    _range(where, params, start, end)
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f'SELECT day, SUM(appointments) FROM appointment_stats_daily{_where(where)} GROUP BY day ORDER BY day',
+            params
+        )
+        return {r[0]: r[1] for r in cur.fetchall()}
+
+
+def weekdays(start: date, end: date) -> int:
+    days = (end - start).days
+    if days <= 0:
+        return 0
+    full_weeks, rest = divmod(days, 7)
+    return full_weeks * 5 + sum(1 for i in range(rest) if (start + timedelta(days=full_weeks * 7 + i)).weekday() < 5)
+
+
+def utilization(start: date, end: date, doctor_ids: Optional[Iterable[int]] = None) -> Dict[int, float]:
+    """doctor_id -> booked minutes / bookable minutes (weekdays x CLINIC_MINUTES_PER_DAY)
+    over [start, end). Doctors with no bookings in the range are left out."""
+    available = weekdays(start, end) * CLINIC_MINUTES_PER_DAY
+    if not available:
+        raise ValueError('The range contains no working days')
+    wanted = set(doctor_ids) if doctor_ids is not None else None
+    return {did: minutes / available for did, (_, minutes) in per_doctor(start, end).items()
+            if wanted is None or did in wanted}
+
+
+def _day(value: Optional[str]) -> Optional[date]:
+    return parse_datetime(value).date() if value else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Appointment reports from the daily summary table.')
+    parser.add_argument('report', choices=('rebuild', 'doctors', 'specialties', 'daily', 'utilization'))
+    parser.add_argument('--from', dest='start', help='first day (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', help='day after the last one')
+    args = parser.parse_args(argv)
+
+    start, end = _day(args.start), _day(args.end)
+    if args.report == 'rebuild':
+        result = rebuild()
+        print(f'✅ Rebuilt {result["rows"]:,} summary rows in {result["seconds"]:.2f}s')
+    elif args.report == 'doctors':
+        for did, (count, minutes) in per_doctor(start, end).items():
+            print(f'{did:>8}{count:>10}{minutes:>10} min')
+    elif args.report == 'specialties':
+        for specialty, count in per_specialty(start, end).items():
+            print(f'{specialty or "-":<30}{count:>10}')
+    elif args.report == 'daily':
+        for day, count in daily_volume(start, end).items():
+            print(f'{day}{count:>10}')
+    else:
+        end = end or date.today()
+        start = start or end - timedelta(days=30)
+        try:
+            for did, share in sorted(utilization(start, end).items(), key=lambda kv: -kv[1]):
+                print(f'{did:>8}{share:>9.1%}')
+        except ValueError as e:
+            parser.error(str(e))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
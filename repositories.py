@@ -1,14 +1,329 @@
-from typing import List, Optional
-from datetime import datetime
-from database import get_connection
-from models import Patient, Doctor, Appointment
-import pyodbc
+import copy
+import os
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from datetime import date, datetime, timedelta
+from itertools import starmap
+from cache import LRUCache
+import database
+from database import get_connection, read_connection, primary_reads, env_bool, on_commit, on_rollback
+from instrumentation import instrumented
+from models import FROZEN_MODELS, Patient, Doctor, Appointment, AppointmentDetail, Columns, row_mapper
+import reporting
+from scheduling import LOOKBEHIND, BookingIndex, DoctorSchedule, SchedulingConflict
+from blocking import BlockingIndex
+from search_index import TrigramIndex, normalize
+from utils import chunked
+
+
+BULK_BATCH_SIZE = 1000
+FETCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 5000
+# Live appointments plus the archive (migration 3); read by queries that need history.
+HISTORY = 'appointments_history'
+# Ids per IN (...) list; SQL Server allows 2100 parameters per statement.
+IN_LIST_SIZE = 1000
+
+CACHE_ENABLED = env_bool('ENTITY_CACHE_ENABLED', 'yes')
+PATIENT_CACHE_SIZE = int(os.getenv('PATIENT_CACHE_SIZE', '10000'))
+PATIENT_CACHE_TTL = float(os.getenv('PATIENT_CACHE_TTL', '60'))
+DOCTOR_CACHE_SIZE = int(os.getenv('DOCTOR_CACHE_SIZE', '5000'))
+DOCTOR_CACHE_TTL = float(os.getenv('DOCTOR_CACHE_TTL', '600'))
+
+SEARCH_INDEX_ENABLED = env_bool('SEARCH_INDEX_ENABLED', 'yes')
+SEARCH_INDEX_REFRESH = float(os.getenv('SEARCH_INDEX_REFRESH', '0'))
+
+# Per-doctor day buckets of the current week, for list_for_doctor.
+CALENDAR_CACHE_ENABLED = env_bool('CALENDAR_CACHE_ENABLED', 'yes')
+CALENDAR_CACHE_SIZE = int(os.getenv('CALENDAR_CACHE_SIZE', '10000'))
+CALENDAR_CACHE_TTL = float(os.getenv('CALENDAR_CACHE_TTL', '60'))
+
+# Mutable rows are copied in and out of the caches, so callers never share them.
+_copy_row = None if FROZEN_MODELS else copy.copy
+_copy_rows = None if FROZEN_MODELS else (lambda rows: tuple(map(copy.copy, rows)))
+
+
+# Columnar layouts (see models.Columns), in SELECT order.
+APPOINTMENT_COLUMNS = (('id', 'int'), ('patient_id', 'int'), ('doctor_id', 'int'), ('scheduled_at', 'time'),
+                       ('notes', 'str'), ('created_at', 'time'), ('duration_minutes', 'int'))
+DETAIL_COLUMNS = (('appointment_id', 'int'), ('patient_id', 'int'), ('patient_name', 'str'), ('doctor_id', 'int'),
+                  ('doctor_name', 'str'), ('scheduled_at', 'time'), ('notes', 'str'))
+
+# Row builders, called with a row's values (see models.row_mapper).
+_patient = row_mapper(Patient)
+_doctor = row_mapper(Doctor)
+_appointment = row_mapper(Appointment)
+_appointment_detail = row_mapper(AppointmentDetail)
+
+
+def _values(*values) -> tuple:
+    return values
+
+
+def _keyset_query(select: str, where: List[str], params: list, order_by: str,
+                  limit: Optional[int]) -> Tuple[str, list]:
+    # `select` carries a {top} placeholder right after SELECT; the backend decides
+    # whether the limit goes there or at the end.
+    sql = select
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY ' + order_by
+    return database.backend.apply_limit(sql, params, limit)
+
+
+def _after_id(where: List[str], params: list, after_id: Optional[int], column: str = 'id'):
+    if after_id is not None:
+        where.append(f'{column} > ?')
+        params.append(after_id)
+
+
+def _after_time(where: List[str], params: list, after_scheduled_at: Optional[datetime],
+                after_id: Optional[int], descending: bool = False, prefix: str = ''):
+    # Keyset on (scheduled_at, id); id breaks ties between equal timestamps.
+    if after_scheduled_at is None:
+        return
+    op = '<' if descending else '>'
+    if after_id is None:
+        where.append(f'{prefix}scheduled_at {op} ?')
+        params.append(after_scheduled_at)
+    else:
+        where.append(f'({prefix}scheduled_at {op} ? OR ({prefix}scheduled_at = ? AND {prefix}id {op} ?))')
+        params.extend([after_scheduled_at, after_scheduled_at, after_id])
+
+
+# Listings, searches, exports and columnar reads go through read_connection and may be
+# served by the replica. Point lookups that fill the entity caches and the loaders of
+# the in-process indexes read the primary, so lag never ends up cached.
+
+def _iter_query(sql: str, params: list, build: Callable, primary: bool = False) -> Iterator:
+    with (get_connection() if primary else read_connection()) as conn:
+        cur = conn.cursor()
+        cur.arraysize = FETCH_SIZE
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield from starmap(build, rows)
+
+
+def _iter_chunks(sql: str, params: list, size: int) -> Iterator[List[tuple]]:
+    # Raw rows, `size` at a time from one streaming cursor; nothing else is buffered.
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.arraysize = size
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(size)
+            if not rows:
+                break
+            yield rows
+
+
+def _between(where: List[str], params: list, start: Optional[datetime], end: Optional[datetime],
+             column: str = 'created_at'):
+    # Half-open range: start <= column < end.
+    if start is not None:
+        where.append(f'{column} >= ?')
+        params.append(start)
+    if end is not None:
+        where.append(f'{column} < ?')
+        params.append(end)
+
+
+def _fetch_columns(sql: str, params: list, spec: Sequence[Tuple[str, str]]) -> Columns:
+    result = Columns(spec)
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.arraysize = FETCH_SIZE
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            result.extend(rows)
+    return result
+
+
+def _select_by_ids(select: str, ids: Sequence[int], build: Callable) -> List:
+    # `select` ends with a FROM clause; rows come back in id order.
+    if not ids:
+        return []
+    marks = ', '.join('?' for _ in ids)
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'{select} WHERE id IN ({marks}) ORDER BY id', list(ids))
+        return list(starmap(build, cur.fetchall()))
+
+
+def _iter_indexed_search(index: TrigramIndex, query: str, after_id: Optional[int], limit: Optional[int],
+                         select: str, build: Callable, text_of: Callable) -> Iterator:
+    # Candidate ids come from the trigram index; each row is re-checked after fetching
+    # so a rename or delete made by another process is never returned.
+    ids = index.search(query)
+    if after_id is not None:
+        ids = ids[bisect_right(ids, after_id):]
+    q = normalize(query)
+    produced = 0
+    for chunk in chunked(ids, FETCH_SIZE):
+        for row in _select_by_ids(select, chunk, build):
+            text = text_of(row)
+            if text is not None and q in normalize(text):
+                yield row
+                produced += 1
+                if limit is not None and produced >= limit:
+                    return
+
+
+def _search_mark(table: str) -> Tuple[Optional[int], int]:
+    # Highest id of a table behind a TrigramIndex and the latest version in the change
+    # log (of any table: an index that has seen it knows how far the log must reach
+    # back for it), from the primary.
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'SELECT (SELECT MAX(id) FROM {table}), (SELECT MAX(version) FROM search_changes)')
+        max_id, version = cur.fetchone()
+        return max_id, version or 0
+
+
+def _search_changes(table: str, column: str, since: int) -> Optional[List[Tuple[int, int, Optional[str]]]]:
+    # (version, id, current text) of the changes logged after `since`, the text None for
+    # a deleted row; None once prune_search_changes has removed entries after `since`.
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT MIN(version) FROM search_changes')
+        oldest = cur.fetchone()[0]
+        if oldest is not None and oldest > since + 1:
+            return None
+        cur.execute(
+            f"SELECT c.version, c.row_id, CASE WHEN c.op = 'D' THEN NULL ELSE t.{column} END "
+            f'FROM search_changes c LEFT JOIN {table} t ON t.id = c.row_id '
+            'WHERE c.name = ? AND c.version > ? ORDER BY c.version',
+            (table, since)
+        )
+        return [tuple(r) for r in cur.fetchall()]
+
+
+def _log_search_change(cur, table: str, rid: int, op: str) -> int:
+    # In the writer's transaction, so the entry commits (or not) with the change; the
+    # version is an identity, so concurrent writers never wait on each other here.
+    cur.execute('INSERT INTO search_changes (name, row_id, op) VALUES (?, ?, ?)', (table, rid, op))
+    return database.backend.last_insert_id(cur)
+
+
+def prune_search_changes(cutoff: datetime, batch_size: int) -> List[int]:
+    """Delete up to batch_size of the oldest search index change log entries made
+    before cutoff, in one short transaction; returns the versions deleted. Entries go
+    strictly oldest first, so an index that has not caught up sees the gap and
+    rebuilds, and the newest entry always stays, so the latest version is kept."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        sql, params = database.backend.apply_limit(
+            'SELECT {top}version FROM search_changes WHERE version <= '
+            '(SELECT MAX(version) FROM search_changes WHERE changed_at < ?) '
+            'AND version < (SELECT MAX(version) FROM search_changes) ORDER BY version', [cutoff], batch_size
+        )
+        cur.execute(sql, params)
+        versions = [r[0] for r in cur.fetchall()]
+        for chunk in chunked(versions, IN_LIST_SIZE):
+            cur.execute(f'DELETE FROM search_changes WHERE version IN ({", ".join("?" for _ in chunk)})', chunk)
+        conn.commit()
+    return versions
+
+
+def _cache_put(cache: LRUCache, key, value, since: int):
+    # Rows read inside a transaction may never be committed; cache them only once it is.
+    on_commit(lambda: cache.put(key, value, since))
+
+
+def _invalidate(cache: LRUCache, key):
+    # Drop the entry now so the writer reads its own change, and again at commit so
+    # nothing cached from the old row in the meantime survives.
+    cache.invalidate(key)
+    on_commit(lambda: cache.invalidate(key))
+
+
+def _week_days(start: datetime, end: datetime) -> List[date]:
+    # The days of [start, end) if it is made of whole days of the current week
+    # (Monday to Sunday), else [].
+    monday = date.today() - timedelta(days=date.today().weekday())
+    if start.time() != datetime.min.time() or end.time() != datetime.min.time():
+        return []
+    first, last = start.date(), end.date()
+    if not (monday <= first < last <= monday + timedelta(days=7)):
+        return []
+    return [first + timedelta(days=n) for n in range((last - first).days)]
+
+
+class ById(dict):
+    """get_many result: found rows keyed by id, plus the requested ids that do not exist."""
+
+    def __init__(self, found: Dict, missing: List[int]):
+        super().__init__(found)
+        self.missing = missing
+
+
+def _id_list(ids: List[int]) -> List[int]:
+    # Pad to a power of two by repeating the last id, so a handful of distinct
+    # statements (and cached plans) cover every batch size.
+    size = 1
+    while size < len(ids):
+        size *= 2
+    return ids + ids[-1:] * (size - len(ids))
+
+
+def _get_many(select: str, ids: Iterable[int], build: Callable, cache: Optional[LRUCache] = None) -> ById:
+    # `select` ends with a FROM clause. Only cache misses go to the database, in
+    # chunked IN lists on one connection.
+    wanted = list(dict.fromkeys(ids))
+    found = cache.get_many(wanted) if cache is not None else {}
+    misses = [i for i in wanted if i not in found]
+    if misses:
+        since = cache.mark() if cache is not None else None
+        fetched = {}
+        with get_connection() as conn:
+            cur = conn.cursor()
+            for chunk in chunked(misses, IN_LIST_SIZE):
+                chunk = _id_list(chunk)
+                cur.execute(f'{select} WHERE id IN ({", ".join("?" for _ in chunk)})', chunk)
+                for row in starmap(build, cur.fetchall()):
+                    fetched[row.id] = row
+        if cache is not None and fetched:
+            on_commit(lambda: cache.put_many(fetched, since))
+        found.update(fetched)
+    return ById({i: found[i] for i in wanted if i in found}, [i for i in misses if i not in found])
+
+
+def _fit_together(appointments: Sequence[Appointment]) -> List[bool]:
+    # False for each appointment that overlaps an earlier one of the list kept so far;
+    # a set-based check against the table cannot see the rows of its own batch.
+    schedules = {}
+    fits = []
+    for n, a in enumerate(appointments):
+        schedule = schedules.setdefault(a.doctor_id, DoctorSchedule())
+        end = a.scheduled_at + timedelta(minutes=a.duration_minutes)
+        fits.append(not schedule.overlapping(a.scheduled_at, end))
+        if fits[-1]:
+            schedule.add(n, a.scheduled_at, end)
+    return fits
+
+
+def _insert_many(table: str, columns: Sequence[str], rows: Iterable[tuple], batch_size: int) -> List[int]:
+    with get_connection() as conn:
+        return database.backend.insert_many(conn, table, columns, rows, batch_size)
 
 
 # -------------------- PATIENT REPOSITORY --------------------
 
+@instrumented
 class PatientRepository:
 
+    cache = LRUCache(PATIENT_CACHE_SIZE, PATIENT_CACHE_TTL, enabled=CACHE_ENABLED, copy=_copy_row)
+    name_index = TrigramIndex(lambda after_id: PatientRepository.iter_names(after_id), SEARCH_INDEX_REFRESH,
+                              lambda: _search_mark('patients'),
+                              lambda since: _search_changes('patients', 'name', since))
+    dedup_index = BlockingIndex(lambda after_id: PatientRepository.iter_dedup_rows(after_id), SEARCH_INDEX_REFRESH)
+
     @staticmethod
     def add(patient: Patient) -> int:
         with get_connection() as conn:
@@ -18,36 +333,118 @@ class PatientRepository:
                 (patient.name, patient.age, patient.gender)
             )
             conn.commit()
-            cur.execute('SELECT CAST(SCOPE_IDENTITY() AS INT)')
-            return cur.fetchone()[0]
+            pid = database.backend.last_insert_id(cur)
+        on_commit(lambda: PatientRepository.name_index.add(pid, patient.name))
+        on_commit(lambda: PatientRepository.dedup_index.add(pid, patient.name, patient.age, patient.gender))
+        return pid
 
     @staticmethod
-    def list_all() -> List[Patient]:
-        with get_connection() as conn:
-            cur = conn.cursor()
-            cur.execute('SELECT id, name, age, gender, created_at FROM patients ORDER BY id')
-            rows = cur.fetchall()
-            return [Patient(*r) for r in rows]
+    def add_many(patients: Iterable[Patient], batch_size: int = BULK_BATCH_SIZE) -> List[int]:
+        ids = _insert_many(
+            'patients', ('name', 'age', 'gender'),
+            ((p.name, p.age, p.gender) for p in patients),
+            batch_size
+        )
+        on_commit(PatientRepository.name_index.expire)
+        on_commit(PatientRepository.dedup_index.expire)
+        return ids
+
+    @staticmethod
+    def iter_all(after_id: Optional[int] = None, limit: Optional[int] = None) -> Iterator[Patient]:
+        where, params = [], []
+        _after_id(where, params, after_id)
+        sql, params = _keyset_query(
+            'SELECT {top}id, name, age, gender, created_at FROM patients', where, params, 'id', limit
+        )
+        return _iter_query(sql, params, _patient)
+
+    @staticmethod
+    def list_all(after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Patient]:
+        return list(PatientRepository.iter_all(after_id, limit))
 
     @staticmethod
     def get_by_id(pid: int) -> Optional[Patient]:
+        cache = PatientRepository.cache
+        patient = cache.get(pid)
+        if patient is not None:
+            return patient
+        since = cache.mark()
         with get_connection() as conn:
             cur = conn.cursor()
             cur.execute('SELECT id, name, age, gender, created_at FROM patients WHERE id = ?', (pid,))
             row = cur.fetchone()
-            return Patient(*row) if row else None
+        patient = _patient(*row) if row else None
+        _cache_put(cache, pid, patient, since)
+        return patient
 
     @staticmethod
-    def search_by_name(name_substr: str) -> List[Patient]:
-        like = f'%{name_substr}%'
-        with get_connection() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                'SELECT id, name, age, gender, created_at FROM patients WHERE name LIKE ?',
-                (like,)
+    def get_many(pids: Iterable[int]) -> ById:
+        return _get_many('SELECT id, name, age, gender, created_at FROM patients', pids,
+                         _patient, PatientRepository.cache)
+
+    @staticmethod
+    def warm_cache(limit: Optional[int] = None) -> int:
+        cache = PatientRepository.cache
+        limit = cache.maxsize if limit is None else min(limit, cache.maxsize)
+        since = cache.mark()
+        loaded = 0
+        with primary_reads():
+            for p in PatientRepository.iter_all(limit=limit):
+                _cache_put(cache, p.id, p, since)
+                loaded += 1
+        return loaded
+
+    @staticmethod
+    def iter_names(after_id: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        return _iter_query('SELECT id, name FROM patients WHERE id > ? ORDER BY id', [after_id or 0], _values,
+                           primary=True)
+
+    @staticmethod
+    def iter_dedup_rows(after_id: Optional[int] = None) -> Iterator[Tuple[int, str, int, str]]:
+        return _iter_query('SELECT id, name, age, gender FROM patients WHERE id > ? ORDER BY id', [after_id or 0],
+                           _values, primary=True)
+
+    @staticmethod
+    def iter_search_by_name(name_substr: str, after_id: Optional[int] = None,
+                            limit: Optional[int] = None) -> Iterator[Patient]:
+        if SEARCH_INDEX_ENABLED and TrigramIndex.supports(name_substr):
+            return _iter_indexed_search(
+                PatientRepository.name_index, name_substr, after_id, limit,
+                'SELECT id, name, age, gender, created_at FROM patients', _patient,
+                lambda p: p.name
             )
-            rows = cur.fetchall()
-            return [Patient(*r) for r in rows]
+        where, params = ['name LIKE ?'], [f'%{name_substr}%']
+        _after_id(where, params, after_id)
+        sql, params = _keyset_query(
+            'SELECT {top}id, name, age, gender, created_at FROM patients', where, params, 'id', limit
+        )
+        return _iter_query(sql, params, _patient)
+
+    @staticmethod
+    def search_by_name(name_substr: str, after_id: Optional[int] = None,
+                       limit: Optional[int] = None) -> List[Patient]:
+        return list(PatientRepository.iter_search_by_name(name_substr, after_id, limit))
+
+    EXPORT_COLUMNS = ('id', 'name', 'age', 'gender', 'created_at')
+
+    @staticmethod
+    def iter_export(created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                    chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+        where, params = [], []
+        _between(where, params, created_from, created_to)
+        sql, params = _keyset_query(
+            'SELECT {top}id, name, age, gender, created_at FROM patients', where, params, 'id', None
+        )
+        return _iter_chunks(sql, params, chunk_size)
+
+    @staticmethod
+    def search_similar(name: str, limit: int = 10) -> List[Patient]:
+        # Typo-tolerant, best match first.
+        ranked = [pid for pid, _ in PatientRepository.name_index.similar(name, limit)]
+        found = {p.id: p for p in _select_by_ids(
+            'SELECT id, name, age, gender, created_at FROM patients', sorted(ranked), _patient
+        )}
+        return [found[pid] for pid in ranked if pid in found]
 
     @staticmethod
     def update(patient: Patient) -> bool:
@@ -57,23 +454,41 @@ class PatientRepository:
                 'UPDATE patients SET name = ?, age = ?, gender = ? WHERE id = ?',
                 (patient.name, patient.age, patient.gender, patient.id)
             )
+            updated = cur.rowcount > 0
+            version = _log_search_change(cur, 'patients', patient.id, 'U') if updated else None
             conn.commit()
-            return cur.rowcount > 0
+            _invalidate(PatientRepository.cache, patient.id)
+        if updated:
+            on_commit(lambda: PatientRepository.name_index.update(patient.id, patient.name, version))
+            on_commit(lambda: PatientRepository.dedup_index.update(patient.id, patient.name, patient.age,
+                                                                   patient.gender))
+        return updated
 
     @staticmethod
     def delete(pid: int) -> bool:
         with get_connection() as conn:
             cur = conn.cursor()
             cur.execute('DELETE FROM patients WHERE id = ?', (pid,))
+            deleted = cur.rowcount > 0
+            version = _log_search_change(cur, 'patients', pid, 'D') if deleted else None
             conn.commit()
-            return cur.rowcount > 0
+            _invalidate(PatientRepository.cache, pid)
+        on_commit(lambda: PatientRepository.name_index.remove(pid, version))
+        on_commit(lambda: PatientRepository.dedup_index.remove(pid))
+        return deleted
 
 
 
 # -------------------- DOCTOR REPOSITORY --------------------
 
+@instrumented
 class DoctorRepository:
 
+    cache = LRUCache(DOCTOR_CACHE_SIZE, DOCTOR_CACHE_TTL, enabled=CACHE_ENABLED, copy=_copy_row)
+    specialty_index = TrigramIndex(lambda after_id: DoctorRepository.iter_specialties(after_id),
+                                   SEARCH_INDEX_REFRESH, lambda: _search_mark('doctors'),
+                                   lambda since: _search_changes('doctors', 'specialty', since))
+
     @staticmethod
     def add(doctor: Doctor) -> int:
         with get_connection() as conn:
@@ -83,36 +498,115 @@ class DoctorRepository:
                 (doctor.name, doctor.specialty)
             )
             conn.commit()
-            cur.execute('SELECT CAST(SCOPE_IDENTITY() AS INT)')
-            return cur.fetchone()[0]
+            did = database.backend.last_insert_id(cur)
+        on_commit(lambda: DoctorRepository.specialty_index.add(did, doctor.specialty))
+        return did
 
     @staticmethod
-    def list_all() -> List[Doctor]:
-        with get_connection() as conn:
-            cur = conn.cursor()
-            cur.execute('SELECT id, name, specialty, created_at FROM doctors ORDER BY id')
-            rows = cur.fetchall()
-            return [Doctor(*row) for row in rows]
+    def add_many(doctors: Iterable[Doctor], batch_size: int = BULK_BATCH_SIZE) -> List[int]:
+        ids = _insert_many(
+            'doctors', ('name', 'specialty'),
+            ((d.name, d.specialty) for d in doctors),
+            batch_size
+        )
+        on_commit(DoctorRepository.specialty_index.expire)
+        return ids
+
+    @staticmethod
+    def iter_all(after_id: Optional[int] = None, limit: Optional[int] = None) -> Iterator[Doctor]:
+        where, params = [], []
+        _after_id(where, params, after_id)
+        sql, params = _keyset_query(
+            'SELECT {top}id, name, specialty, created_at FROM doctors', where, params, 'id', limit
+        )
+        return _iter_query(sql, params, _doctor)
+
+    @staticmethod
+    def list_all(after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Doctor]:
+        return list(DoctorRepository.iter_all(after_id, limit))
 
     @staticmethod
     def get_by_id(did: int) -> Optional[Doctor]:
+        cache = DoctorRepository.cache
+        doctor = cache.get(did)
+        if doctor is not None:
+            return doctor
+        since = cache.mark()
         with get_connection() as conn:
             cur = conn.cursor()
             cur.execute('SELECT id, name, specialty, created_at FROM doctors WHERE id = ?', (did,))
             row = cur.fetchone()
-            return Doctor(*row) if row else None
+        doctor = _doctor(*row) if row else None
+        _cache_put(cache, did, doctor, since)
+        return doctor
 
     @staticmethod
-    def search_by_specialist(spec_substr: str) -> List[Doctor]:
-        like = f'%{spec_substr}%'
-        with get_connection() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                'SELECT id, name, specialty, created_at FROM doctors WHERE specialty LIKE ?',
-                (like,)
+    def get_many(dids: Iterable[int]) -> ById:
+        return _get_many('SELECT id, name, specialty, created_at FROM doctors', dids,
+                         _doctor, DoctorRepository.cache)
+
+    @staticmethod
+    def warm_cache(limit: Optional[int] = None) -> int:
+        cache = DoctorRepository.cache
+        limit = cache.maxsize if limit is None else min(limit, cache.maxsize)
+        since = cache.mark()
+        loaded = 0
+        with primary_reads():
+            for d in DoctorRepository.iter_all(limit=limit):
+                _cache_put(cache, d.id, d, since)
+                loaded += 1
+        return loaded
+
+    @staticmethod
+    def iter_specialties(after_id: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        return _iter_query(
+            'SELECT id, specialty FROM doctors WHERE id > ? ORDER BY id', [after_id or 0], _values, primary=True
+        )
+
+    @staticmethod
+    def iter_search_by_specialist(spec_substr: str, after_id: Optional[int] = None,
+                                  limit: Optional[int] = None) -> Iterator[Doctor]:
+        if SEARCH_INDEX_ENABLED and TrigramIndex.supports(spec_substr):
+            return _iter_indexed_search(
+                DoctorRepository.specialty_index, spec_substr, after_id, limit,
+                'SELECT id, name, specialty, created_at FROM doctors', _doctor,
+                lambda d: d.specialty
             )
-            rows = cur.fetchall()
-            return [Doctor(*r) for r in rows]
+        where, params = ['specialty LIKE ?'], [f'%{spec_substr}%']
+        _after_id(where, params, after_id)
+        sql, params = _keyset_query(
+            'SELECT {top}id, name, specialty, created_at FROM doctors', where, params, 'id', limit
+        )
+        return _iter_query(sql, params, _doctor)
+
+    @staticmethod
+    def search_by_specialist(spec_substr: str, after_id: Optional[int] = None,
+                             limit: Optional[int] = None) -> List[Doctor]:
+        return list(DoctorRepository.iter_search_by_specialist(spec_substr, after_id, limit))
+
+    EXPORT_COLUMNS = ('id', 'name', 'specialty', 'created_at')
+
+    @staticmethod
+    def iter_export(specialty: Optional[str] = None, created_from: Optional[datetime] = None,
+                    created_to: Optional[datetime] = None,
+                    chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+        where, params = [], []
+        if specialty:
+            where.append('specialty LIKE ?')
+            params.append(f'%{specialty}%')
+        _between(where, params, created_from, created_to)
+        sql, params = _keyset_query(
+            'SELECT {top}id, name, specialty, created_at FROM doctors', where, params, 'id', None
+        )
+        return _iter_chunks(sql, params, chunk_size)
+
+    @staticmethod
+    def search_similar_specialty(specialty: str, limit: int = 10) -> List[Doctor]:
+        ranked = [did for did, _ in DoctorRepository.specialty_index.similar(specialty, limit)]
+        found = {d.id: d for d in _select_by_ids(
+            'SELECT id, name, specialty, created_at FROM doctors', sorted(ranked), _doctor
+        )}
+        return [found[did] for did in ranked if did in found]
 
     @staticmethod
     def update(doctor: Doctor) -> bool:
@@ -122,82 +616,425 @@ class DoctorRepository:
                 'UPDATE doctors SET name = ?, specialty = ? WHERE id = ?',
                 (doctor.name, doctor.specialty, doctor.id)
             )
+            updated = cur.rowcount > 0
+            version = _log_search_change(cur, 'doctors', doctor.id, 'U') if updated else None
             conn.commit()
-            return cur.rowcount > 0
+            _invalidate(DoctorRepository.cache, doctor.id)
+        if updated:
+            on_commit(lambda: DoctorRepository.specialty_index.update(doctor.id, doctor.specialty, version))
+        return updated
 
     @staticmethod
     def delete(did: int) -> bool:
         with get_connection() as conn:
             cur = conn.cursor()
             cur.execute('DELETE FROM doctors WHERE id = ?', (did,))
+            deleted = cur.rowcount > 0
+            version = _log_search_change(cur, 'doctors', did, 'D') if deleted else None
             conn.commit()
-            return cur.rowcount > 0
+            _invalidate(DoctorRepository.cache, did)
+        on_commit(lambda: DoctorRepository.specialty_index.remove(did, version))
+        return deleted
 
 
 
 # -------------------- APPOINTMENT REPOSITORY --------------------
 
+@instrumented
 class AppointmentRepository:
 
+    # Bookings that start this long before a new one are not checked against it; the
+    # booking index loads the same window, and validation caps durations to it.
+    CONFLICT_LOOKBEHIND = LOOKBEHIND
+    COLUMNS = ('patient_id', 'doctor_id', 'scheduled_at', 'notes', 'duration_minutes')
+
+    index = BookingIndex(lambda since, did: AppointmentRepository.iter_intervals(since, did), CONFLICT_LOOKBEHIND)
+    # (doctor_id, date) -> tuple of that day's live appointments, oldest first.
+    day_cache = LRUCache(CALENDAR_CACHE_SIZE, CALENDAR_CACHE_TTL, enabled=CALENDAR_CACHE_ENABLED,
+                         copy=_copy_rows)
+
+    @staticmethod
+    def _overlap(appointment: Appointment) -> Tuple[str, list]:
+        # (doctor_id, scheduled_at) range first, so the check is a seek on IX_appointments_doctor_scheduled.
+        start = appointment.scheduled_at
+        end = start + timedelta(minutes=appointment.duration_minutes)
+        ends_at = database.backend.add_minutes('scheduled_at', 'duration_minutes')
+        return (f'doctor_id = ? AND scheduled_at < ? AND scheduled_at >= ? AND {ends_at} > ?',
+                [appointment.doctor_id, end, start - AppointmentRepository.CONFLICT_LOOKBEHIND, start])
+
+    @staticmethod
+    def _bulk_overlap() -> str:
+        # _overlap for insert_many's `unless`, against the candidate row `new`.
+        backend = database.backend
+        lookbehind = int(AppointmentRepository.CONFLICT_LOOKBEHIND.total_seconds() // 60)
+        return (f'EXISTS (SELECT 1 FROM {backend.locked("appointments", "a")} WHERE a.doctor_id = new.doctor_id '
+                f'AND a.scheduled_at < {backend.add_minutes("new.scheduled_at", "new.duration_minutes")} '
+                f'AND a.scheduled_at >= {backend.add_minutes("new.scheduled_at", str(-lookbehind))} '
+                f'AND {backend.add_minutes("a.scheduled_at", "a.duration_minutes")} > new.scheduled_at)')
+
     @staticmethod
     def add(appointment: Appointment) -> int:
+        # The booking index only sees this process's bookings, so the insert itself
+        # re-checks for an overlap, under a range lock, in the same statement.
+        overlap, overlap_params = AppointmentRepository._overlap(appointment)
         with get_connection() as conn:
             cur = conn.cursor()
             cur.execute(
-                'INSERT INTO appointments (patient_id, doctor_id, scheduled_at, notes) VALUES (?, ?, ?, ?)',
-                (appointment.patient_id, appointment.doctor_id, appointment.scheduled_at, appointment.notes)
+                f'INSERT INTO appointments ({", ".join(AppointmentRepository.COLUMNS)}) '
+                'SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS '
+                f'(SELECT 1 FROM {database.backend.locked("appointments")} WHERE {overlap})',
+                [appointment.patient_id, appointment.doctor_id, appointment.scheduled_at, appointment.notes,
+                 appointment.duration_minutes] + overlap_params
             )
-            conn.commit()
-            cur.execute('SELECT CAST(SCOPE_IDENTITY() AS INT)')
-            return cur.fetchone()[0]
+            conflict = cur.rowcount == 0
+            if conflict:
+                sql, params = database.backend.apply_limit(
+                    f'SELECT {{top}}id FROM appointments WHERE {overlap} ORDER BY scheduled_at', overlap_params, 1
+                )
+                cur.execute(sql, params)
+                clash = cur.fetchone()
+            else:
+                # Read before the stats upsert, which moves SQLite's lastrowid.
+                aid = database.backend.last_insert_id(cur)
+                reporting.record(cur, [(appointment.doctor_id, appointment.scheduled_at,
+                                        appointment.duration_minutes)])
+                conn.commit()
+        if conflict:
+            # Booked by another process after the index loaded this doctor's schedule.
+            AppointmentRepository.index.reload(appointment.doctor_id)
+            raise SchedulingConflict.booked(appointment.doctor_id, clash[0] if clash else None)
+        _invalidate(AppointmentRepository.day_cache, (appointment.doctor_id, appointment.scheduled_at.date()))
+        # Booked in the index right away, not at commit, so a pending booking already
+        # blocks conflicting ones from other threads and later steps of its transaction.
+        index = AppointmentRepository.index
+        index.add(aid, appointment.doctor_id, appointment.scheduled_at, appointment.duration_minutes)
+        on_rollback(lambda: index.remove(aid))
+        return aid
 
     @staticmethod
-    def list_all(upcoming_only: bool = False) -> List[Appointment]:
+    def add_many(appointments: Iterable[Appointment], batch_size: int = BULK_BATCH_SIZE) -> List[Optional[int]]:
+        """Ids in input order; None for each appointment left out because it overlaps
+        an existing booking or an earlier appointment of its batch. As in add, the
+        overlap check against the table is part of the INSERT."""
+        index = AppointmentRepository.index
+        track = index.loaded
+        unless = AppointmentRepository._bulk_overlap()
+
+        def on_batch(cur, batch: List[tuple], ids: List[Optional[int]]):
+            # Stats go on the batch's own transaction; nothing outlives the batch.
+            booked = [(aid, did, start, minutes) for (_, did, start, _, minutes), aid in zip(batch, ids)
+                      if aid is not None]
+            clashed = {did for (_, did, *_), aid in zip(batch, ids) if aid is None}
+            reporting.record(cur, [row[1:] for row in booked])
+
+            def committed():
+                for day in {(did, start.date()) for _, did, start, _ in booked}:
+                    _invalidate(AppointmentRepository.day_cache, day)
+                if track:
+                    for did in clashed:
+                        index.reload(did)
+                    for aid, did, start, minutes in booked:
+                        index.add(aid, did, start, minutes)
+
+                    def unbook():
+                        for aid, *_ in booked:
+                            index.remove(aid)
+                    on_rollback(unbook)
+            return committed
+
+        ids = []
+        with get_connection() as conn:
+            for batch in chunked(appointments, batch_size):
+                fits = _fit_together(batch)
+                rows = [(a.patient_id, a.doctor_id, a.scheduled_at, a.notes, a.duration_minutes)
+                        for a, fit in zip(batch, fits) if fit]
+                inserted = iter(database.backend.insert_many(conn, 'appointments', AppointmentRepository.COLUMNS,
+                                                             rows, len(rows) or 1, on_batch, unless))
+                ids.extend(next(inserted) if fit else None for fit in fits)
+        if not track and index.loaded:
+            # Loaded while we were inserting; it may have missed some rows.
+            index.reset()
+        return ids
+
+    @staticmethod
+    def _all_query(upcoming_only: bool, after_scheduled_at: Optional[datetime], after_id: Optional[int],
+                   limit: Optional[int]) -> Tuple[str, list]:
+        # Upcoming appointments run oldest first, the full history newest first.
+        where, params = [], []
+        if upcoming_only:
+            where.append('scheduled_at >= ?')
+            params.append(datetime.now())
+        _after_time(where, params, after_scheduled_at, after_id, descending=not upcoming_only)
+        return _keyset_query(
+            'SELECT {top}id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes '
+            f'FROM {"appointments" if upcoming_only else HISTORY}',
+            where, params,
+            'scheduled_at, id' if upcoming_only else 'scheduled_at DESC, id DESC',
+            limit
+        )
+
+    @staticmethod
+    def iter_all(upcoming_only: bool = False, after_scheduled_at: Optional[datetime] = None,
+                 after_id: Optional[int] = None, limit: Optional[int] = None) -> Iterator[Appointment]:
+        sql, params = AppointmentRepository._all_query(upcoming_only, after_scheduled_at, after_id, limit)
+        return _iter_query(sql, params, _appointment)
+
+    @staticmethod
+    def list_all(upcoming_only: bool = False, after_scheduled_at: Optional[datetime] = None,
+                 after_id: Optional[int] = None, limit: Optional[int] = None,
+                 columnar: bool = False) -> Union[List[Appointment], Columns]:
+        if columnar:
+            sql, params = AppointmentRepository._all_query(upcoming_only, after_scheduled_at, after_id, limit)
+            return _fetch_columns(sql, params, APPOINTMENT_COLUMNS)
+        return list(AppointmentRepository.iter_all(upcoming_only, after_scheduled_at, after_id, limit))
+
+    @staticmethod
+    def get_many(aids: Iterable[int]) -> ById:
+        return _get_many(
+            f'SELECT id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes FROM {HISTORY}',
+            aids, _appointment
+        )
+
+    # --- calendar windows: appointments scheduled in [start, end), oldest first --- #
+
+    @staticmethod
+    def _window_query(where: List[str], params: list, start: datetime, end: datetime,
+                      after_scheduled_at: Optional[datetime], after_id: Optional[int], limit: Optional[int],
+                      include_archived: bool, join: str = '') -> Tuple[str, list]:
+        # `where` holds the seek column (doctor or patient id, or specialty); with
+        # scheduled_at next in the index key, the window is one range scan.
+        _between(where, params, start, end, column='a.scheduled_at')
+        _after_time(where, params, after_scheduled_at, after_id, prefix='a.')
+        return _keyset_query(
+            'SELECT {top}a.id, a.patient_id, a.doctor_id, a.scheduled_at, a.notes, a.created_at, a.duration_minutes '
+            f'FROM {HISTORY if include_archived else "appointments"} a{join}',
+            where, params, 'a.scheduled_at, a.id', limit
+        )
+
+    @staticmethod
+    def iter_for_doctor(doctor_id: int, start: datetime, end: datetime,
+                        after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                        limit: Optional[int] = None, include_archived: bool = False) -> Iterator[Appointment]:
+        sql, params = AppointmentRepository._window_query(
+            ['a.doctor_id = ?'], [doctor_id], start, end, after_scheduled_at, after_id, limit, include_archived
+        )
+        return _iter_query(sql, params, _appointment)
+
+    @staticmethod
+    def list_for_doctor(doctor_id: int, start: datetime, end: datetime,
+                        after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                        limit: Optional[int] = None, include_archived: bool = False) -> List[Appointment]:
+        cache = AppointmentRepository.day_cache
+        days = _week_days(start, end)
+        if (cache.enabled and days and not include_archived and after_scheduled_at is None
+                and after_id is None):
+            rows = AppointmentRepository._doctor_days(doctor_id, days)
+            return rows if limit is None else rows[:limit]
+        return list(AppointmentRepository.iter_for_doctor(doctor_id, start, end, after_scheduled_at, after_id,
+                                                          limit, include_archived))
+
+    @staticmethod
+    def _doctor_days(doctor_id: int, days: List[date]) -> List[Appointment]:
+        cache = AppointmentRepository.day_cache
+        found = cache.get_many([(doctor_id, d) for d in days])
+        missing = [d for d in days if (doctor_id, d) not in found]
+        if missing:
+            # One range scan on the primary covers every missing day; days without
+            # appointments are cached too.
+            since = cache.mark()
+            fetched = {(doctor_id, d): [] for d in missing}
+            sql, params = AppointmentRepository._window_query(
+                ['a.doctor_id = ?'], [doctor_id], datetime.combine(missing[0], datetime.min.time()),
+                datetime.combine(missing[-1] + timedelta(days=1), datetime.min.time()), None, None, None, False
+            )
+            for a in _iter_query(sql, params, _appointment, primary=True):
+                bucket = fetched.get((doctor_id, a.scheduled_at.date()))
+                if bucket is not None:
+                    bucket.append(a)
+            fetched = {key: tuple(rows) for key, rows in fetched.items()}
+            on_commit(lambda: cache.put_many(fetched, since))
+            found.update(fetched)
+        return [a for d in days for a in found[(doctor_id, d)]]
+
+    @staticmethod
+    def iter_for_patient(patient_id: int, start: datetime, end: datetime,
+                         after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                         limit: Optional[int] = None, include_archived: bool = False) -> Iterator[Appointment]:
+        sql, params = AppointmentRepository._window_query(
+            ['a.patient_id = ?'], [patient_id], start, end, after_scheduled_at, after_id, limit, include_archived
+        )
+        return _iter_query(sql, params, _appointment)
+
+    @staticmethod
+    def list_for_patient(patient_id: int, start: datetime, end: datetime,
+                         after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                         limit: Optional[int] = None, include_archived: bool = False) -> List[Appointment]:
+        return list(AppointmentRepository.iter_for_patient(patient_id, start, end, after_scheduled_at, after_id,
+                                                           limit, include_archived))
+
+    @staticmethod
+    def iter_for_specialty(specialty: str, start: datetime, end: datetime,
+                           after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                           limit: Optional[int] = None, include_archived: bool = False) -> Iterator[Appointment]:
+        # Exact specialty: a seek on IX_doctors_specialty, then one window per doctor.
+        sql, params = AppointmentRepository._window_query(
+            ['d.specialty = ?'], [specialty], start, end, after_scheduled_at, after_id, limit, include_archived,
+            ' JOIN doctors d ON a.doctor_id = d.id'
+        )
+        return _iter_query(sql, params, _appointment)
+
+    @staticmethod
+    def list_for_specialty(specialty: str, start: datetime, end: datetime,
+                           after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                           limit: Optional[int] = None, include_archived: bool = False) -> List[Appointment]:
+        return list(AppointmentRepository.iter_for_specialty(specialty, start, end, after_scheduled_at, after_id,
+                                                             limit, include_archived))
+
+    @staticmethod
+    def _detailed_query(after_scheduled_at: Optional[datetime], after_id: Optional[int],
+                        limit: Optional[int], include_archived: bool = False) -> Tuple[str, list]:
+        where, params = [], []
+        _after_time(where, params, after_scheduled_at, after_id, prefix='a.')
+        return _keyset_query(
+            f'''SELECT {{top}}a.id, p.id, p.name, d.id, d.name, a.scheduled_at, a.notes
+               FROM {HISTORY if include_archived else 'appointments'} a
+               JOIN patients p ON a.patient_id = p.id
+               JOIN doctors d ON a.doctor_id = d.id''',
+            where, params, 'a.scheduled_at, a.id', limit
+        )
+
+    @staticmethod
+    def iter_detailed(after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                      limit: Optional[int] = None, include_archived: bool = False) -> Iterator[AppointmentDetail]:
+        sql, params = AppointmentRepository._detailed_query(after_scheduled_at, after_id, limit, include_archived)
+        return _iter_query(sql, params, _appointment_detail)
+
+    @staticmethod
+    def get_detailed_list(after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                          limit: Optional[int] = None, columnar: bool = False,
+                          include_archived: bool = False) -> Union[List[AppointmentDetail], Columns]:
+        if columnar:
+            sql, params = AppointmentRepository._detailed_query(after_scheduled_at, after_id, limit,
+                                                                include_archived)
+            return _fetch_columns(sql, params, DETAIL_COLUMNS)
+        return list(AppointmentRepository.iter_detailed(after_scheduled_at, after_id, limit, include_archived))
+
+    EXPORT_COLUMNS = ('appointment_id', 'patient_id', 'patient_name', 'doctor_id', 'doctor_name', 'specialty',
+                      'scheduled_at', 'duration_minutes', 'notes')
+
+    @staticmethod
+    def iter_export(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    doctor_id: Optional[int] = None, specialty: Optional[str] = None,
+                    chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+        """The detailed view including archived rows, oldest first, for appointments scheduled in [start, end)."""
+        where, params = [], []
+        _between(where, params, start, end, column='a.scheduled_at')
+        if doctor_id is not None:
+            where.append('a.doctor_id = ?')
+            params.append(doctor_id)
+        if specialty:
+            where.append('d.specialty LIKE ?')
+            params.append(f'%{specialty}%')
+        sql, params = _keyset_query(
+            f'''SELECT {{top}}a.id, p.id, p.name, d.id, d.name, d.specialty, a.scheduled_at, a.duration_minutes,
+                      a.notes
+               FROM {HISTORY} a
+               JOIN patients p ON a.patient_id = p.id
+               JOIN doctors d ON a.doctor_id = d.id''',
+            where, params, 'a.scheduled_at, a.id', None
+        )
+        return _iter_chunks(sql, params, chunk_size)
+
+    @staticmethod
+    def archive_batch(cutoff: datetime, batch_size: int) -> List[int]:
+        """Move up to batch_size of the oldest appointments scheduled before cutoff into
+        appointments_archive, in one short transaction; returns the ids moved."""
+        sql, params = database.backend.apply_limit(
+            'SELECT {top}id FROM appointments WHERE scheduled_at < ? ORDER BY scheduled_at, id', [cutoff], batch_size
+        )
         with get_connection() as conn:
             cur = conn.cursor()
-            if upcoming_only:
+            cur.execute(sql, params)
+            ids = [r[0] for r in cur.fetchall()]
+            moved = []
+            for chunk in chunked(ids, IN_LIST_SIZE):
+                marks = ', '.join('?' for _ in chunk)
+                # A rerun after a crash never finds half a batch: both statements commit together.
                 cur.execute(
-                    'SELECT id, patient_id, doctor_id, scheduled_at, notes, created_at '
-                    'FROM appointments WHERE scheduled_at >= GETDATE() ORDER BY scheduled_at'
-                )
-            else:
-                cur.execute(
-                    'SELECT id, patient_id, doctor_id, scheduled_at, notes, created_at '
-                    'FROM appointments ORDER BY scheduled_at DESC'
+                    'INSERT INTO appointments_archive '
+                    '(id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes) '
+                    'SELECT id, patient_id, doctor_id, scheduled_at, notes, created_at, duration_minutes '
+                    f'FROM appointments WHERE id IN ({marks})',
+                    chunk
                 )
+                cur.execute(f'DELETE FROM appointments WHERE id IN ({marks})', chunk)
+                moved.extend(chunk)
+            conn.commit()
+        index = AppointmentRepository.index
 
-            rows = cur.fetchall()
-            return [Appointment(*r) for r in rows]
+        def unindex():
+            for aid in moved:
+                index.remove(aid)
+        on_commit(unindex)
+        if moved:
+            # Day buckets hold live rows only; the moved ones may be in any of them.
+            on_commit(AppointmentRepository.day_cache.clear)
+        return moved
 
     @staticmethod
-    def get_detailed_list():
+    def purge_archived_batch(cutoff: datetime, batch_size: int) -> List[int]:
+        """Delete up to batch_size of the oldest archived appointments scheduled before
+        cutoff, with their daily stats, in one short transaction; returns the ids deleted."""
+        sql, params = database.backend.apply_limit(
+            'SELECT {top}id, doctor_id, scheduled_at, duration_minutes FROM appointments_archive '
+            'WHERE scheduled_at < ? ORDER BY scheduled_at, id', [cutoff], batch_size
+        )
         with get_connection() as conn:
             cur = conn.cursor()
-            cur.execute(
-                '''SELECT a.id, p.id, p.name, d.id, d.name, a.scheduled_at, a.notes
-                   FROM appointments a
-                   JOIN patients p ON a.patient_id = p.id
-                   JOIN doctors d ON a.doctor_id = d.id
-                   ORDER BY a.scheduled_at'''
-            )
+            cur.execute(sql, params)
             rows = cur.fetchall()
-            return [
-                {
-                    'appointment_id': r[0],
-                    'patient_id': r[1],
-                    'patient_name': r[2],
-                    'doctor_id': r[3],
-                    'doctor_name': r[4],
-                    'scheduled_at': r[5],
-                    'notes': r[6]
-                }
-                for r in rows
-            ]
+            for chunk in chunked(rows, IN_LIST_SIZE):
+                marks = ', '.join('?' for _ in chunk)
+                cur.execute(f'DELETE FROM appointments_archive WHERE id IN ({marks})', [r[0] for r in chunk])
+                reporting.record(cur, [tuple(r[1:]) for r in chunk], sign=-1)
+            conn.commit()
+        return [r[0] for r in rows]
+
+    @staticmethod
+    def iter_intervals(since: datetime, doctor_id: Optional[int] = None) -> Iterator[Tuple[int, int, datetime, int]]:
+        where, params = ['scheduled_at >= ?'], [since]
+        if doctor_id is not None:
+            where.insert(0, 'doctor_id = ?')
+            params.insert(0, doctor_id)
+        return _iter_query(
+            f'SELECT id, doctor_id, scheduled_at, duration_minutes FROM appointments WHERE {" AND ".join(where)}',
+            params, _values, primary=True
+        )
+
+    @staticmethod
+    def find_conflicts(doctor_id: int, scheduled_at: datetime, duration_minutes: int) -> List[int]:
+        return AppointmentRepository.index.conflicts(doctor_id, scheduled_at, duration_minutes)
+
+    @staticmethod
+    def find_next_free_slot(doctor_ids: Iterable[int], after: datetime,
+                            duration_minutes: int) -> Optional[Tuple[datetime, int]]:
+        return AppointmentRepository.index.next_free_slot(doctor_ids, after, duration_minutes)
 
     @staticmethod
     def delete(aid: int) -> bool:
         with get_connection() as conn:
             cur = conn.cursor()
-            cur.execute('DELETE FROM appointments WHERE id = ?', (aid,))
+            # Live appointments only: archived history is removed by purge_archived_batch.
+            deleted = False
+            cur.execute('SELECT doctor_id, scheduled_at, duration_minutes FROM appointments WHERE id = ?', (aid,))
+            booked = cur.fetchone()
+            if booked is not None:
+                cur.execute('DELETE FROM appointments WHERE id = ?', (aid,))
+                if cur.rowcount > 0:
+                    reporting.record(cur, [tuple(booked)], sign=-1)
+                    deleted = True
             conn.commit()
-            return cur.rowcount > 0
+        if deleted:
+            _invalidate(AppointmentRepository.day_cache, (booked[0], booked[1].date()))
+        on_commit(lambda: AppointmentRepository.index.remove(aid))
+        return deleted
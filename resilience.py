@@ -0,0 +1,137 @@
+"""Transient-error classification, backoff with jitter and a circuit breaker."""
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+# ODBC SQLSTATEs for lost/refused connections and timeouts; 40001 is a deadlock victim.
+TRANSIENT_SQLSTATES = frozenset({'08001', '08004', '08007', '08S01', 'HYT00', 'HYT01', '40001'})
+# SQL Server / network error numbers that pyodbc reports in parentheses in the message.
+TRANSIENT_ERROR_CODES = frozenset({
+    -2, 53, 64, 233, 1205, 4060, 10053, 10054, 10060, 10928, 10929,
+    40197, 40501, 40613, 49918, 49919, 49920,
+})
+_ERROR_CODE = re.compile(r'\((-?\d+)\)')
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+def is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    args = getattr(exc, 'args', ())
+    if args and isinstance(args[0], str) and args[0] in TRANSIENT_SQLSTATES:
+        return True
+    message = ' '.join(str(a) for a in args)
+    return any(int(code) in TRANSIENT_ERROR_CODES for code in _ERROR_CODE.findall(message))
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    # "Full jitter": uniform in [0, min(cap, base * 2^attempt)], so retrying clients spread out.
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Fails fast after `failure_threshold` consecutive transient failures.
+
+    After `reset_timeout` seconds one caller is let through as a probe
+    (half-open); its success closes the breaker, its failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {'opened': 0, 'rejected': 0, 'probes': 0, 'failures': 0, 'successes': 0}
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self._stats['probes'] += 1
+                return
+            self._stats['rejected'] += 1
+            retry_in = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+        raise CircuitOpen(f'database unavailable, circuit open (next probe in {retry_in:.1f}s)')
+
+    def record_success(self):
+        with self._lock:
+            self._stats['successes'] += 1
+            self._failures = 0
+            self._probing = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._stats['opened'] += 1
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+    def release_probe(self):
+        # The probe ended without telling us anything (e.g. a non-transient error).
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s['state'] = self.state
+            s['consecutive_failures'] = self._failures
+        return s
+
+
+def call_with_retry(fn: Callable, max_attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2.0,
+                    breaker: Optional[CircuitBreaker] = None,
+                    retryable: Callable[[BaseException], bool] = is_transient,
+                    sleep: Callable[[float], None] = time.sleep,
+                    on_retry: Optional[Callable[[BaseException], None]] = None,
+                    rng: random.Random = random):
+    """Call fn(), retrying transient failures with exponential backoff and jitter.
+
+    Non-transient errors are raised at once. With a breaker, an open circuit raises
+    CircuitOpen without calling fn, and transient failures count towards opening it.
+    """
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            transient = retryable(e)
+            if breaker is not None:
+                if transient:
+                    breaker.record_failure()
+                else:
+                    breaker.release_probe()
+            attempt += 1
+            if not transient or attempt >= max_attempts:
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            sleep(backoff_delay(attempt - 1, base_delay, max_delay, rng))
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
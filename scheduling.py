@@ -0,0 +1,173 @@
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import islice
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import MAX_APPOINTMENT_MINUTES
+
+# No appointment is longer, so none starting earlier than this can overlap a new one.
+LOOKBEHIND = timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+
+
+class SchedulingConflict(ValueError):
+    @classmethod
+    def booked(cls, did: int, aid: Optional[int] = None) -> 'SchedulingConflict':
+        clash = f' (appointment {aid})' if aid is not None else ''
+        return cls(f'Doctor {did} is already booked at that time{clash}')
+
+
+class DoctorSchedule:
+    """Appointments of one doctor as (start, end, appointment_id), sorted by start."""
+
+    def __init__(self):
+        self._entries: List[Tuple[datetime, datetime, int]] = []
+        self._longest = timedelta(0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, aid: int, start: datetime, end: datetime):
+        insort(self._entries, (start, end, aid))
+        self._longest = max(self._longest, end - start)
+
+    def ids(self) -> List[int]:
+        return [aid for _, _, aid in self._entries]
+
+    def remove(self, aid: int, start: datetime, end: datetime) -> bool:
+        i = bisect_left(self._entries, (start, end, aid))
+        if i < len(self._entries) and self._entries[i] == (start, end, aid):
+            del self._entries[i]
+            return True
+        return False
+
+    def _first_candidate(self, start: datetime) -> int:
+        # Nothing starting before start - longest can still be running at `start`.
+        return bisect_right(self._entries, start - self._longest, key=lambda e: e[0])
+
+    def overlapping(self, start: datetime, end: datetime) -> List[int]:
+        found = []
+        entries = self._entries
+        for i in range(self._first_candidate(start), len(entries)):
+            s, e, aid = entries[i]
+            if s >= end:
+                break
+            if e > start:
+                found.append(aid)
+        return found
+
+    def free_slots(self, after: datetime, duration: timedelta) -> Iterator[datetime]:
+        # Yields the earliest start in each gap that fits `duration`, ending with the open
+        # slot after the last appointment.
+        t = after
+        entries = self._entries
+        for i in range(self._first_candidate(after), len(entries)):
+            s, e, _ = entries[i]
+            if e <= t:
+                continue
+            if s - t >= duration:
+                yield t
+            t = max(t, e)
+        yield t
+
+
+class BookingIndex:
+    """Per-doctor interval index over appointments, loaded lazily via `loader`.
+
+    `loader(since, doctor_id)` yields (appointment_id, doctor_id, scheduled_at,
+    duration_minutes) for appointments at or after `since`, of one doctor or of all
+    for None; older rows cannot conflict with new bookings.
+    """
+
+    def __init__(self, loader: Callable[[datetime, Optional[int]], Iterable[Tuple[int, int, datetime, int]]],
+                 lookbehind: timedelta = LOOKBEHIND):
+        self._loader = loader
+        self._lookbehind = lookbehind
+        self._lock = threading.RLock()
+        self._doctor_locks: Dict[int, threading.RLock] = defaultdict(threading.RLock)
+        self._schedules: Dict[int, DoctorSchedule] = defaultdict(DoctorSchedule)
+        self._by_id: Dict[int, Tuple[int, datetime, datetime]] = {}
+        self.loaded = False
+
+    def _ensure_loaded(self):
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            for aid, did, start, minutes in self._loader(datetime.now() - self._lookbehind, None):
+                self._add_locked(aid, did, start, minutes)
+            self.loaded = True
+
+    def _add_locked(self, aid: int, did: int, start: datetime, minutes: int):
+        if aid in self._by_id:
+            return
+        end = start + timedelta(minutes=minutes)
+        self._schedules[did].add(aid, start, end)
+        self._by_id[aid] = (did, start, end)
+
+    def doctor_lock(self, did: int) -> threading.RLock:
+        # Hold while checking for conflicts and inserting, so two bookings for the same
+        # doctor in this process cannot both pass the check.
+        with self._lock:
+            return self._doctor_locks[did]
+
+    def add(self, aid: int, did: int, start: datetime, minutes: int):
+        with self._lock:
+            if self.loaded:
+                self._add_locked(aid, did, start, minutes)
+
+    def remove(self, aid: int):
+        with self._lock:
+            entry = self._by_id.pop(aid, None)
+            if entry:
+                did, start, end = entry
+                self._schedules[did].remove(aid, start, end)
+
+    def reload(self, did: int):
+        # Re-read one doctor's bookings, e.g. after the database found a clash this
+        # index missed because another process booked it.
+        with self._lock:
+            if not self.loaded:
+                return
+            rows = list(self._loader(datetime.now() - self._lookbehind, did))
+            schedule = self._schedules.pop(did, None)
+            for aid in schedule.ids() if schedule else ():
+                self._by_id.pop(aid, None)
+            for aid, _, start, minutes in rows:
+                self._add_locked(aid, did, start, minutes)
+
+    def reset(self):
+        with self._lock:
+            self._schedules.clear()
+            self._by_id.clear()
+            self.loaded = False
+
+    def conflicts(self, did: int, start: datetime, minutes: int) -> List[int]:
+        self._ensure_loaded()
+        with self._lock:
+            schedule = self._schedules.get(did)
+            return schedule.overlapping(start, start + timedelta(minutes=minutes)) if schedule else []
+
+    def free_slots(self, doctor_ids: Iterable[int], after: datetime, minutes: int,
+                   limit: int = 10) -> List[Tuple[datetime, int]]:
+        # Merges the doctors' lazy free-slot streams with a heap and takes the first `limit`.
+        self._ensure_loaded()
+        duration = timedelta(minutes=minutes)
+        with self._lock:
+            streams = [self._tagged_slots(did, after, duration) for did in set(doctor_ids)]
+            return list(islice(heapq.merge(*streams), limit))
+
+    def _tagged_slots(self, did: int, after: datetime, duration: timedelta) -> Iterator[Tuple[datetime, int]]:
+        schedule = self._schedules.get(did)
+        if schedule is None:
+            yield after, did
+            return
+        for slot in schedule.free_slots(after, duration):
+            yield slot, did
+
+    def next_free_slot(self, doctor_ids: Iterable[int], after: datetime, minutes: int) -> Optional[Tuple[datetime, int]]:
+        slots = self.free_slots(doctor_ids, after, minutes, limit=1)
+        return slots[0] if slots else None
@@ -0,0 +1,223 @@
+import math
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Characters that are wildcards in a T-SQL LIKE pattern; queries containing them
+# are left to the database so results stay identical to LIKE.
+LIKE_METACHARACTERS = frozenset('%_[')
+
+
+def normalize(text: Optional[str]) -> str:
+    return (text or '').casefold()
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """In-memory trigram index for case-insensitive substring and fuzzy search.
+
+    Posting lists are append-only int arrays. Deletes and updates only change the
+    text map, and candidates are always re-checked against it, so stale postings cost
+    a little scan time and are dropped on the next compaction.
+
+    `loader(after_id)` yields (id, text) for rows with id > after_id (all rows for
+    None), in id order. `marker()` returns the table's highest id and the latest
+    version in the change log, and `changes(since)` the table's updates and deletes
+    logged after version `since` by any process, as (version, id, current text or
+    None once deleted) in version order, or None if the log no longer reaches back
+    that far. Before a query, at
+    most every `refresh_interval` seconds, the mark is read: a newer version applies
+    the logged changes to the rows they name, a higher id loads the new rows from
+    the highest id seen, and only a pruned log rebuilds the index from scratch.
+    Without a marker, new rows are picked up by re-running the loader and changes
+    made elsewhere are never seen.
+    """
+
+    def __init__(self, loader: Callable[[Optional[int]], Iterable[Tuple[int, str]]],
+                 refresh_interval: float = 5.0,
+                 marker: Optional[Callable[[], Tuple[Optional[int], int]]] = None,
+                 changes: Optional[Callable[[int], Optional[Iterable[Tuple[int, int, Optional[str]]]]]] = None):
+        self._loader = loader
+        self._marker = marker
+        self._changes = changes
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._postings: Dict[str, array] = defaultdict(lambda: array('i'))
+        self._texts: Dict[int, str] = {}
+        self._stale = 0
+        self._max_id = 0             # highest id read by the loader
+        self._version = 0            # every logged change up to here is applied
+        self._own: Set[int] = set()  # later versions this process applied as it made them
+        self._refreshed_at = 0.0
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._texts)
+
+    # --- maintenance --- #
+
+    def _index_locked(self, rid: int, text: str):
+        self._texts[rid] = text
+        for t in trigrams(text):
+            self._postings[t].append(rid)
+
+    def _replace_locked(self, rid: int, text: Optional[str]):
+        # `text` is normalized; None (a deleted row, or a NULL, which LIKE never
+        # matches) drops the row.
+        if self._texts.pop(rid, None) is not None:
+            self._stale += 1
+        if text is not None:
+            self._index_locked(rid, text)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self.loaded and now - self._refreshed_at < self.refresh_interval:
+            return
+        mark = self._marker() if self._marker is not None else None
+        with self._lock:
+            if self.loaded and now - self._refreshed_at < self.refresh_interval:
+                return
+            if mark is not None:
+                max_id, version = mark
+                if self.loaded and version > self._version:
+                    self._catch_up_locked(version)
+                if not self.loaded:
+                    # Changes logged while the rows load are applied again next time.
+                    self._version = version
+                elif (max_id or 0) <= self._max_id:
+                    self._refreshed_at = time.monotonic()
+                    return
+            for rid, text in self._loader(self._max_id if self.loaded else None):
+                text = None if text is None else normalize(text)
+                if self._texts.get(rid) != text:
+                    self._replace_locked(rid, text)
+                self._max_id = max(self._max_id, rid)
+            self._maybe_compact()
+            self._refreshed_at = time.monotonic()
+            self.loaded = True
+
+    def _catch_up_locked(self, version: int):
+        changes = self._changes(self._version) if self._changes is not None else None
+        if changes is None:
+            self._clear_locked()    # changed elsewhere, and the log cannot say which rows
+            return
+        for logged, rid, text in changes:
+            # Rows above the loader's mark are read with their current text when it gets there.
+            if logged not in self._own and (rid <= self._max_id or rid in self._texts):
+                self._replace_locked(rid, None if text is None else normalize(text))
+            version = max(version, logged)
+        self._version = version
+        self._own = {v for v in self._own if v > self._version}
+        self._maybe_compact()
+
+    def expire(self):
+        # Make the next query catch up with rows inserted since the last refresh.
+        self._refreshed_at = 0.0
+
+    def add(self, rid: int, text: Optional[str]):
+        with self._lock:
+            if self.loaded and rid not in self._texts and text is not None:
+                self._index_locked(rid, normalize(text))
+
+    def _applied(self, version: Optional[int]):
+        # `version` is the log entry of a change this process just made and applied, so
+        # catching up skips it.
+        if version is not None and version > self._version:
+            self._own.add(version)
+
+    def update(self, rid: int, text: Optional[str], version: Optional[int] = None):
+        with self._lock:
+            if not self.loaded:
+                return
+            self._replace_locked(rid, None if text is None else normalize(text))
+            self._applied(version)
+            self._maybe_compact()
+
+    def remove(self, rid: int, version: Optional[int] = None):
+        with self._lock:
+            if not self.loaded:
+                return
+            self._replace_locked(rid, None)
+            self._applied(version)
+            self._maybe_compact()
+
+    def _clear_locked(self):
+        self._postings.clear()
+        self._texts.clear()
+        self._stale = 0
+        self._max_id = 0
+        self._version = 0
+        self._own.clear()
+        self.loaded = False
+
+    def reset(self):
+        with self._lock:
+            self._clear_locked()
+
+    def _maybe_compact(self):
+        # Rebuild postings once stale entries reach a quarter of the live rows.
+        if self._stale < 1000 or self._stale * 4 < len(self._texts):
+            return
+        texts = self._texts
+        self._postings.clear()
+        self._texts = {}
+        for rid in sorted(texts):
+            self._index_locked(rid, texts[rid])
+        self._stale = 0
+
+    # --- queries --- #
+
+    @staticmethod
+    def supports(query: str) -> bool:
+        return not (LIKE_METACHARACTERS & set(query))
+
+    def search(self, query: str) -> List[int]:
+        """Ids whose text contains `query` (case-insensitive), ascending."""
+        self._refresh()
+        q = normalize(query)
+        with self._lock:
+            grams = trigrams(q)
+            if not grams:
+                # Shorter than a trigram: scan the in-memory texts instead.
+                return sorted(rid for rid, text in self._texts.items() if q in text)
+            rarest = min((self._postings.get(g, ()) for g in grams), key=len)
+            texts = self._texts
+            return sorted({rid for rid in rarest if q in texts.get(rid, '')})
+
+    def similar(self, query: str, limit: int = 10, min_score: float = 0.3) -> List[Tuple[int, float]]:
+        """Typo-tolerant matches ranked by trigram Dice similarity, best first.
+
+        Substring matches get a bonus so they always rank above fuzzy ones.
+        """
+        self._refresh()
+        q = normalize(query)
+        grams = trigrams(q)
+        if not grams:
+            return [(rid, 1.0) for rid in self.search(query)[:limit]]
+        # Dice >= min_score needs at least this many shared trigrams.
+        needed = max(1, math.ceil(min_score * len(grams) / 2))
+        with self._lock:
+            shared = Counter()
+            for g in grams:
+                shared.update(set(self._postings.get(g, ())))
+            scored = []
+            for rid, hits in shared.items():
+                if hits < needed:
+                    continue
+                text = self._texts.get(rid)
+                if text is None:
+                    continue
+                text_grams = trigrams(text)
+                score = 2.0 * len(grams & text_grams) / (len(grams) + len(text_grams))
+                if score < min_score:
+                    continue
+                if q in text:
+                    score += 1.0
+                scored.append((rid, score))
+        scored.sort(key=lambda s: (-s[1], s[0]))
+        return scored[:limit]
@@ -1,67 +1,72 @@
-from repositories import PatientRepository,DoctorRepository,AppointmentRepository
-from models import Patient,Doctor,Appointment 
+import logging
+from blocking import DuplicatePatient, DEDUP_MODE, DEDUP_THRESHOLD
+from repositories import PatientRepository,DoctorRepository,AppointmentRepository,ById
+from database import transaction
+from models import Patient,Doctor,Appointment,AppointmentDetail,DEFAULT_APPOINTMENT_MINUTES
+from scheduling import SchedulingConflict
 from utils import parse_int , parse_datetime
-from typing import Optional
-from datetime import datetime 
+from validation import check_patient, check_doctor, check_appointment
+from typing import Iterable, List, Optional, Sequence
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from typing import Tuple
+
+dedup_log = logging.getLogger('hospital.dedup')
 
 
     # --- Patient Service --- #
 
 class PatientService:
     @staticmethod
-    def create(name: str, age_raw: str, gender: str) -> int :
-        age = parse_int(age_raw)
-        if age <= 0:
-            raise ValueError("Age must be a positive integer")
-        
-        if not name.strip():
-            raise ValueError("Name cannot be empty")
-        
-        g = gender.strip()
-        if g not in ("M","F","Other","O"):
-            raise ValueError("Gender must be M, F, or Other")
-
-        p = Patient(
-            id=None,
-            name=name.strip(),
-            age=age,
-            gender=gender.strip() or None
-        )
-
-        return PatientRepository.add(p)
+    def validate(name: str, age_raw: str, gender: str, pid: Optional[int] = None) -> Patient:
+        return check_patient(name, age_raw, gender, pid)
+
+    @staticmethod
+    def create(name: str, age_raw: str, gender: str, allow_duplicate: bool = False) -> int :
+        patient = PatientService.validate(name, age_raw, gender)
+        if DEDUP_MODE != 'off' and not allow_duplicate:
+            matches = PatientRepository.dedup_index.find(patient.name, patient.age, patient.gender, DEDUP_THRESHOLD)
+            if matches and DEDUP_MODE == 'reject':
+                raise DuplicatePatient(
+                    f"Likely duplicate of patient {', '.join(str(pid) for pid, _ in matches[:5])}", matches)
+            if matches:
+                dedup_log.warning('new patient %r looks like %s', patient.name, matches[:5])
+        return PatientRepository.add(patient)
+
+    @staticmethod
+    def find_duplicates(name: str, age_raw: str, gender: str, exclude: Optional[int] = None,
+                        threshold: float = DEDUP_THRESHOLD) -> List[Tuple[Patient, float]]:
+        # Likely duplicates of a patient, best match first, from the blocking index.
+        patient = PatientService.validate(name, age_raw, gender)
+        matches = PatientRepository.dedup_index.find(patient.name, patient.age, patient.gender, threshold, exclude)
+        found = PatientRepository.get_many(pid for pid, _ in matches)
+        return [(found[pid], s) for pid, s in matches if pid in found]
     
     @staticmethod
-    def list_all():
-        return PatientRepository.list_all()
+    def list_all(after_id: Optional[int] = None, limit: Optional[int] = None):
+        return PatientRepository.list_all(after_id, limit)
     
     @staticmethod
     def get_by_id(pid: int) -> Optional[Patient]:
         return PatientRepository.get_by_id(pid)
+
+    @staticmethod
+    def get_many(pids: Iterable[int]) -> ById:
+        return PatientRepository.get_many(pids)
     
     @staticmethod
-    def search(name_substr: str):
-        return PatientRepository.search_by_name(name_substr)
+    def search(name_substr: str, after_id: Optional[int] = None, limit: Optional[int] = None):
+        return PatientRepository.search_by_name(name_substr, after_id, limit)
+
+    @staticmethod
+    def search_similar(name: str, limit: int = 10):
+        if not name.strip():
+            return []
+        return PatientRepository.search_similar(name.strip(), limit)
     
     @staticmethod
     def update(pid: int, name: str, age_raw: str, gender: str) -> bool:
-        age = parse_int(age_raw)
-        if age <= 0:
-            raise ValueError("Age must be a positive integer")
-        
-        if not name.strip():
-            raise ValueError("Name cannot be empty")
-        
-        g = gender.strip()
-        if g not in ("M","F","Other","O"):
-            raise ValueError("Gender must be M, F, or Other")
-
-        p = Patient(
-            id=pid,
-            name=name.strip(),
-            age=age,
-            gender=gender.strip() or None
-        )
-        return PatientRepository.update(p)
+        return PatientRepository.update(PatientService.validate(name, age_raw, gender, pid))
 
     @staticmethod
     def delete(pid: int) -> bool:
@@ -72,46 +77,38 @@ class PatientService:
 
 class DoctorService:
     @staticmethod
-    def create(name: str, specialty: str) -> int:
-        if not name.strip():
-            raise ValueError("Doctor name cannot be empty")
-
-        if not specialty.strip():
-            raise ValueError("Specialty cannot be empty")
+    def validate(name: str, specialty: str, did: Optional[int] = None) -> Doctor:
+        return check_doctor(name, specialty, did)
 
-        d = Doctor(
-            id=None,
-            name=name.strip(),
-            specialty=specialty.strip()  # ✔ CORRECT
-        )
-        return DoctorRepository.add(d)
+    @staticmethod
+    def create(name: str, specialty: str) -> int:
+        return DoctorRepository.add(DoctorService.validate(name, specialty))
 
     @staticmethod
-    def list_all():
-        return DoctorRepository.list_all()
+    def list_all(after_id: Optional[int] = None, limit: Optional[int] = None):
+        return DoctorRepository.list_all(after_id, limit)
 
     @staticmethod
     def get_by_id(did: int) -> Optional[Doctor]:
         return DoctorRepository.get_by_id(did)
 
     @staticmethod
-    def search(spec_substr: str):
-        return DoctorRepository.search_by_specialist(spec_substr)
+    def get_many(dids: Iterable[int]) -> ById:
+        return DoctorRepository.get_many(dids)
 
     @staticmethod
-    def update(did: int, name: str, specialty: str) -> bool:
-        if not name.strip():
-            raise ValueError("Doctor name cannot be empty")
+    def search(spec_substr: str, after_id: Optional[int] = None, limit: Optional[int] = None):
+        return DoctorRepository.search_by_specialist(spec_substr, after_id, limit)
 
+    @staticmethod
+    def search_similar(specialty: str, limit: int = 10):
         if not specialty.strip():
-            raise ValueError("Specialty cannot be empty")
+            return []
+        return DoctorRepository.search_similar_specialty(specialty.strip(), limit)
 
-        d = Doctor(
-            id=did,
-            name=name.strip(),
-            specialty=specialty.strip()   # ✔ CORRECT
-        )
-        return DoctorRepository.update(d)
+    @staticmethod
+    def update(did: int, name: str, specialty: str) -> bool:
+        return DoctorRepository.update(DoctorService.validate(name, specialty, did))
 
     @staticmethod
     def delete(did: int) -> bool:
@@ -123,31 +120,133 @@ class DoctorService:
         
 class AppointmentService :
     @staticmethod
-    def schedule(patient_id_raw: str, doctor_id_raw: str, dt_raw: str, notes:str=None) -> int :
-        pid = parse_int(patient_id_raw)
-        did = parse_int(doctor_id_raw)
-        scheduled = parse_datetime(dt_raw)
-        
-        if pid <= 0:
-            raise ValueError("Invalid patient id")
-        
-        if did <= 0:
-            raise ValueError("Invalid doctor id")
-        
-        if scheduled < datetime.now():
-            raise ValueError('Cannot schedule an appointment in the past')
-        
-        appt = Appointment(id= None,patient_id=pid , doctor_id=did,scheduled_at=scheduled,notes=notes)
+    def validate(patient_id_raw: str, doctor_id_raw: str, dt_raw: str, notes: str = None,
+                 duration_raw: str = None) -> Appointment:
+        return check_appointment(patient_id_raw, doctor_id_raw, dt_raw, notes, duration_raw)
+
+    @staticmethod
+    def schedule(patient_id_raw: str, doctor_id_raw: str, dt_raw: str, notes:str=None,
+                 duration_raw: str = None) -> int :
+        appt = AppointmentService.validate(patient_id_raw, doctor_id_raw, dt_raw, notes, duration_raw)
+        with AppointmentRepository.index.doctor_lock(appt.doctor_id):
+            return AppointmentService._book(appt)
+
+    @staticmethod
+    def schedule_many(requests: Iterable[Sequence[str]]) -> List[int]:
+        """Book every (patient_id, doctor_id, datetime[, notes[, duration]]) request, all or nothing.
+
+        The batch runs in one transaction; an invalid row or a conflict (including
+        one between two rows of the batch) rolls back everything booked before it.
+        """
+        appts = [AppointmentService.validate(*r) for r in requests]
+        index = AppointmentRepository.index
+        with ExitStack() as locks:
+            # Doctor locks are held until commit, taken in id order to avoid deadlocks.
+            for did in sorted({a.doctor_id for a in appts}):
+                locks.enter_context(index.doctor_lock(did))
+            with transaction():
+                return [AppointmentService._book(a) for a in appts]
+
+    @staticmethod
+    def _book(appt: Appointment) -> int:
+        # Caller holds the doctor's lock.
+        clash = AppointmentRepository.find_conflicts(appt.doctor_id, appt.scheduled_at, appt.duration_minutes)
+        if clash:
+            raise SchedulingConflict.booked(appt.doctor_id, clash[0])
         return AppointmentRepository.add(appt)
+
+    @staticmethod
+    def find_next_free_slot(doctor_id_raw: str = None, specialty: str = None, after_raw: str = None,
+                            duration_raw: str = None):
+        duration = parse_int(duration_raw) if duration_raw else DEFAULT_APPOINTMENT_MINUTES
+        if duration <= 0:
+            raise ValueError("Duration must be a positive number of minutes")
+
+        after = parse_datetime(after_raw) if after_raw else datetime.now()
+        after = max(after, datetime.now())
+
+        if doctor_id_raw:
+            did = parse_int(doctor_id_raw)
+            if did <= 0:
+                raise ValueError("Invalid doctor id")
+            doctor_ids = [did]
+        elif specialty and specialty.strip():
+            doctor_ids = [d.id for d in DoctorRepository.iter_search_by_specialist(specialty.strip())]
+        else:
+            raise ValueError("Provide a doctor id or a specialty")
+
+        return AppointmentRepository.find_next_free_slot(doctor_ids, after, duration)
     
     @staticmethod
-    def list_upcoming():
-        return AppointmentRepository.list_all(upcoming_only=True)
+    def list_upcoming(after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                      limit: Optional[int] = None, columnar: bool = False):
+        return AppointmentRepository.list_all(True, after_scheduled_at, after_id, limit, columnar)
     
     @staticmethod
-    def list_detailed():
-        return AppointmentRepository.get_detailed_list()
+    def list_detailed(after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                      limit: Optional[int] = None, columnar: bool = False):
+        return AppointmentRepository.get_detailed_list(after_scheduled_at, after_id, limit, columnar)
     
+    @staticmethod
+    def get_many(aids: Iterable[int]) -> ById:
+        return AppointmentRepository.get_many(aids)
+
+    @staticmethod
+    def _window(start_raw: str, end_raw: str = None) -> Tuple[datetime, datetime]:
+        # [start, end); without an end, the day starting at start.
+        start = parse_datetime(start_raw)
+        end = parse_datetime(end_raw) if end_raw else start + timedelta(days=1)
+        if end <= start:
+            raise ValueError("End must be after start")
+        return start, end
+
+    @staticmethod
+    def _positive_id(raw: str, what: str) -> int:
+        value = parse_int(raw)
+        if value <= 0:
+            raise ValueError(f"Invalid {what} id")
+        return value
+
+    @staticmethod
+    def list_for_doctor(doctor_id_raw: str, start_raw: str, end_raw: str = None,
+                        after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                        limit: Optional[int] = None, include_archived: bool = False) -> List[Appointment]:
+        did = AppointmentService._positive_id(doctor_id_raw, "doctor")
+        start, end = AppointmentService._window(start_raw, end_raw)
+        return AppointmentRepository.list_for_doctor(did, start, end, after_scheduled_at, after_id, limit,
+                                                     include_archived)
+
+    @staticmethod
+    def list_for_patient(patient_id_raw: str, start_raw: str, end_raw: str = None,
+                         after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                         limit: Optional[int] = None, include_archived: bool = False) -> List[Appointment]:
+        pid = AppointmentService._positive_id(patient_id_raw, "patient")
+        start, end = AppointmentService._window(start_raw, end_raw)
+        return AppointmentRepository.list_for_patient(pid, start, end, after_scheduled_at, after_id, limit,
+                                                      include_archived)
+
+    @staticmethod
+    def list_for_specialty(specialty: str, start_raw: str, end_raw: str = None,
+                           after_scheduled_at: Optional[datetime] = None, after_id: Optional[int] = None,
+                           limit: Optional[int] = None, include_archived: bool = False) -> List[Appointment]:
+        if not specialty.strip():
+            raise ValueError("Specialty cannot be empty")
+        start, end = AppointmentService._window(start_raw, end_raw)
+        return AppointmentRepository.list_for_specialty(specialty.strip(), start, end, after_scheduled_at,
+                                                        after_id, limit, include_archived)
+
+    @staticmethod
+    def with_names(appointments: Sequence[Appointment]) -> List[AppointmentDetail]:
+        """Appointments with patient and doctor names, two lookups for the whole list."""
+        patients = PatientRepository.get_many(a.patient_id for a in appointments)
+        doctors = DoctorRepository.get_many(a.doctor_id for a in appointments)
+        return [AppointmentDetail(
+            a.id,
+            a.patient_id, patients[a.patient_id].name if a.patient_id in patients else None,
+            a.doctor_id, doctors[a.doctor_id].name if a.doctor_id in doctors else None,
+            a.scheduled_at, a.notes
+        ) for a in appointments]
+
     @staticmethod
     def cancel(aid_raw: str) -> bool:
         aid = parse_int(aid_raw)
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The modules read their settings at import time: point them at a throwaway SQLite
+# database before anything imports database.py.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+TMP_DIR = tempfile.mkdtemp(prefix='hospital-tests-')
+os.environ.update({
+    'DB_BACKEND': 'sqlite',
+    'DB_PATH': os.path.join(TMP_DIR, 'primary.db'),
+    'DB_READ_PATH': '',
+    'DB_RETRY_BASE_DELAY': '0',
+    'METRICS_EXPORT_PATH': '',
+    'SLOW_QUERY_MS': '100000',
+})
+
+TABLES = ('appointment_stats_daily', 'appointments_archive', 'appointments', 'patients', 'doctors')
+
+
+@pytest.fixture
+def db():
+    """A migrated, empty database and cold in-process caches and indexes."""
+    import database
+    from repositories import PatientRepository, DoctorRepository, AppointmentRepository
+
+    database.initialize_db()
+    with database.get_connection() as conn:
+        cur = conn.cursor()
+        for table in TABLES:
+            cur.execute(f'DELETE FROM {table}')
+        conn.commit()
+    for cache in (PatientRepository.cache, DoctorRepository.cache, AppointmentRepository.day_cache):
+        cache.clear()
+    for index in (PatientRepository.name_index, PatientRepository.dedup_index, DoctorRepository.specialty_index,
+                  AppointmentRepository.index):
+        index.reset()
+    yield database
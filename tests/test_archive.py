@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+import reporting
+from models import Appointment, Doctor, Patient
+from repositories import AppointmentRepository, DoctorRepository, PatientRepository
+from services import AppointmentService
+
+NOW = datetime(2030, 6, 3, 12, 0)
+
+
+@pytest.fixture
+def history(db):
+    pid = PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+    did = DoctorRepository.add(Doctor(None, 'Dr. Bell', 'Cardiology'))
+    ids = AppointmentRepository.add_many(
+        Appointment(None, pid, did, NOW - timedelta(days=days, hours=2), None, None, 30)
+        for days in (3000, 400, 10)
+    )
+    archive.archive_appointments(horizon_days=365, now=NOW)
+    return did, ids
+
+
+def _count(db, table):
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'SELECT COUNT(*) FROM {table}')
+        return cur.fetchone()[0]
+
+
+def _booked(db, did):
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT COALESCE(SUM(appointments), 0) FROM appointment_stats_daily WHERE doctor_id = ?',
+                    (did,))
+        return cur.fetchone()[0]
+
+
+def test_cancel_never_deletes_archived_rows(db, history):
+    did, (ancient, old, recent) = history
+    assert _count(db, 'appointments_archive') == 2
+    assert AppointmentService.cancel(str(old)) is False
+    assert _count(db, 'appointments_archive') == 2
+    assert AppointmentService.cancel(str(recent)) is True
+    assert _count(db, 'appointments') == 0
+
+
+def test_purge_deletes_archived_rows_before_the_horizon(db, history):
+    did, (ancient, old, recent) = history
+    before = _booked(db, did)
+    report = archive.purge_archive(horizon_days=1000, batch_size=1, now=NOW)
+    assert report.rows_moved == 1
+    assert [a.id for a in AppointmentRepository.get_many([ancient, old, recent]).values()] == [old, recent]
+    if reporting.ENABLED:
+        assert _booked(db, did) == before - 1
+
+
+def test_purge_needs_a_positive_horizon(db):
+    with pytest.raises(ValueError):
+        archive.purge_archive(horizon_days=0)
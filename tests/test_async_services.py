@@ -0,0 +1,35 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from async_services import AsyncAppointmentService, AsyncPatientService
+from models import Appointment, Doctor, Patient
+from repositories import AppointmentRepository, DoctorRepository, PatientRepository
+
+
+def test_find_duplicates(db):
+    pid = PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+    PatientRepository.add(Patient(None, 'Bob Stone', 60, 'M'))
+
+    matches = asyncio.run(AsyncPatientService.find_duplicates('Lee Ann', '35', 'F'))
+
+    assert [p.id for p, _ in matches] == [pid]
+
+
+def test_calendars(db):
+    pid = PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+    did = DoctorRepository.add(Doctor(None, 'Dr. Bell', 'Cardiology'))
+    day = (datetime.now() + timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0)
+    first = AppointmentRepository.add(Appointment(None, pid, did, day.replace(hour=9), None, None, 30))
+    second = AppointmentRepository.add(Appointment(None, pid, did, day.replace(hour=11), None, None, 30))
+    AppointmentRepository.add(Appointment(None, pid, did, day + timedelta(days=1, hours=9), None, None, 30))
+    start = f'{day:%Y-%m-%d %H:%M}'
+
+    async def calendars():
+        return await asyncio.gather(
+            AsyncAppointmentService.list_for_doctor(str(did), start),
+            AsyncAppointmentService.list_for_patient(str(pid), start),
+            AsyncAppointmentService.list_for_specialty('Cardiology', start),
+        )
+
+    for listing in asyncio.run(calendars()):
+        assert [a.id for a in listing] == [first, second]
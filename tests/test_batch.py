@@ -0,0 +1,72 @@
+import io
+import json
+
+import batch
+from services import PatientService
+
+
+def _run(*commands) -> list:
+    out = io.StringIO()
+    batch.run(batch.read_commands(io.StringIO('\n'.join(json.dumps(c) for c in commands))), out)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_missing_argument_is_reported_before_the_command_runs(db, monkeypatch):
+    calls = []
+    monkeypatch.setitem(batch.COMMANDS, 'delete_patient', lambda c: calls.append(c))
+    result, = [r for r in _run({'op': 'delete_patient'}) if 'line' in r]
+
+    assert not result['ok']
+    assert result['error'] == 'Missing argument: id'
+    assert result['error_type'] == 'MissingArgument'
+    assert not calls
+
+
+def test_key_error_inside_a_command_is_not_a_missing_argument(db, monkeypatch):
+    def broken(cmd):
+        raise KeyError('specialty_index')
+
+    monkeypatch.setitem(batch.COMMANDS, 'add_doctor', broken)
+    result, = [r for r in _run({'op': 'add_doctor', 'name': 'Dr. Bell', 'specialty': 'Cardiology'})
+               if 'line' in r]
+
+    assert not result['ok']
+    assert result['error_type'] == 'KeyError'
+    assert 'Missing argument' not in result['error']
+    assert 'specialty_index' in result['error']
+
+
+def test_commands_with_their_arguments_run(db):
+    results = [r for r in _run({'op': 'add_patient', 'name': 'Ann Lee', 'age': 34, 'gender': 'F'},
+                               {'op': 'add_doctor', 'name': 'Dr. Bell', 'specialty': 'Cardiology'})
+               if 'line' in r]
+
+    assert [r['ok'] for r in results] == [True, True]
+    assert all(isinstance(r['result']['id'], int) for r in results)
+
+
+def test_limit_is_validated_like_the_other_arguments(db):
+    for n in range(3):
+        PatientService.create(f'Patient {n}', '30', 'F')
+    bad, zero, text, default = [r for r in _run({'op': 'list_patients', 'limit': 'many'},
+                                                 {'op': 'list_doctors', 'limit': 0},
+                                                 {'op': 'list_patients', 'limit': '2'},
+                                                 {'op': 'search_patients', 'q': 'Patient'})
+                                if 'line' in r]
+
+    assert (bad['ok'], bad['error_type']) == (False, 'ValueError')
+    assert (zero['ok'], zero['error']) == (False, 'limit must be a positive integer')
+    assert len(text['result']['rows']) == 2 and text['result']['next'] is not None
+    assert len(default['result']['rows']) == 3 and default['result']['next'] is None
+
+
+def test_default_mode_reuses_one_pooled_connection(db):
+    _run({'op': 'add_doctor', 'name': 'Dr. Bell', 'specialty': 'Cardiology'})
+    pool = db.get_pool(db.SERVER, db.DATABASE)
+    created = pool.stats()['created']
+
+    results = [r for r in _run(*({'op': 'add_patient', 'name': f'Patient {n}', 'age': 30, 'gender': 'F'}
+                                 for n in range(5)), {'op': 'list_patients'}) if 'line' in r]
+    assert all(r['ok'] for r in results)
+    assert pool.stats()['created'] == created
+    assert pool.stats()['in_use'] == 0
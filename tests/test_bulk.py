@@ -0,0 +1,55 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import reporting
+from models import Appointment, Doctor, Patient
+from repositories import AppointmentRepository, DoctorRepository, PatientRepository
+
+# Monday of this week, so the calendar reads go through the day-bucket cache.
+MONDAY = datetime.combine(date.today() - timedelta(days=date.today().weekday()), datetime.min.time())
+START = MONDAY.replace(hour=8)
+
+
+@pytest.fixture
+def people(db):
+    pid = PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+    dids = [DoctorRepository.add(Doctor(None, f'Dr. {n}', 'Cardiology')) for n in ('Bell', 'Chen')]
+    return pid, dids
+
+
+def _appointments(pid, dids, count, fail_at=None):
+    for n in range(count):
+        if n == fail_at:
+            raise RuntimeError('source went away')
+        yield Appointment(None, pid, dids[n % 2], START + timedelta(minutes=30 * (n // 2)), None, None, 30)
+
+
+def _totals(db):
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*), COALESCE(SUM(duration_minutes), 0) FROM appointments')
+        live = tuple(cur.fetchone())
+        cur.execute('SELECT COALESCE(SUM(appointments), 0), COALESCE(SUM(minutes), 0) FROM appointment_stats_daily')
+        return live, tuple(cur.fetchone())
+
+
+@pytest.mark.skipif(not reporting.ENABLED, reason='daily stats disabled')
+def test_stats_commit_with_each_batch(db, people):
+    pid, dids = people
+    with pytest.raises(RuntimeError):
+        AppointmentRepository.add_many(_appointments(pid, dids, 25, fail_at=23), batch_size=10)
+    live, stats = _totals(db)
+    assert live == (20, 600) and stats == live
+
+
+def test_index_and_day_cache_follow_each_batch(db, people):
+    pid, dids = people
+    AppointmentRepository.find_conflicts(dids[0], START, 30)       # load the booking index
+    day = (MONDAY, MONDAY + timedelta(days=1))
+    assert AppointmentRepository.list_for_doctor(dids[0], *day) == []
+
+    ids = AppointmentRepository.add_many(_appointments(pid, dids, 12), batch_size=5)
+    assert len(ids) == 12
+    assert AppointmentRepository.find_conflicts(dids[1], START + timedelta(minutes=150), 30) == [ids[11]]
+    assert len(AppointmentRepository.list_for_doctor(dids[0], *day)) == 6
@@ -0,0 +1,99 @@
+import copy
+import dataclasses
+
+import pytest
+
+import repositories
+from cache import LRUCache
+from models import FROZEN_MODELS, Patient
+from repositories import PatientRepository
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def pid(db):
+    return PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+
+
+def test_get_by_id_is_served_from_the_cache(pid):
+    cache = PatientRepository.cache
+    first = PatientRepository.get_by_id(pid)
+    hits = cache.hits
+
+    assert PatientRepository.get_by_id(pid) == first
+    assert cache.hits == hits + 1
+
+
+def test_cached_rows_cannot_be_changed_by_callers(pid):
+    patient = PatientRepository.get_by_id(pid)
+    if FROZEN_MODELS:
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            patient.name = 'Changed'
+    else:
+        patient.name = 'Changed'
+    assert PatientRepository.get_by_id(pid).name == 'Ann Lee'
+
+
+def test_copying_cache_never_shares_values():
+    cache = LRUCache(4, copy=copy.copy)
+    value = ['a']
+    cache.put(1, value)
+    value.append('b')
+    cache.get(1).append('c')
+
+    assert cache.get(1) == ['a']
+    assert cache.get_many([1]) == {1: ['a']}
+
+
+def test_entries_expire_after_the_ttl():
+    clock = _Clock()
+    cache = LRUCache(4, ttl=10, clock=clock)
+    cache.put('k', 'v')
+
+    clock.now = 9.9
+    assert cache.get('k') == 'v'
+    clock.now = 10
+    assert cache.get('k') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_update_and_delete_invalidate(pid):
+    PatientRepository.get_by_id(pid)
+    PatientRepository.update(Patient(pid, 'Ann Lee-Park', 35, 'F'))
+    assert PatientRepository.get_by_id(pid).name == 'Ann Lee-Park'
+
+    PatientRepository.delete(pid)
+    assert PatientRepository.get_by_id(pid) is None
+
+
+def test_row_read_before_a_write_is_not_cached_after_it(pid, monkeypatch):
+    build = repositories._patient
+
+    def read_then_concurrent_update(*row):
+        # Another writer commits between this read and its cache put.
+        monkeypatch.setattr(repositories, '_patient', build)
+        PatientRepository.update(Patient(pid, 'Ann Lee-Park', 35, 'F'))
+        return build(*row)
+
+    monkeypatch.setattr(repositories, '_patient', read_then_concurrent_update)
+    assert PatientRepository.get_by_id(pid).name == 'Ann Lee'
+    assert PatientRepository.get_by_id(pid).name == 'Ann Lee-Park'
+
+
+def test_put_with_a_stale_mark_is_dropped():
+    cache = LRUCache(4)
+    since = cache.mark()
+    cache.invalidate('k')
+    cache.put('k', 'old', since)
+    cache.put_many({'j': 'old'}, since)
+
+    assert cache.get('k') is None and cache.get('j') is None
+    cache.put('k', 'new', cache.mark())
+    assert cache.get('k') == 'new'
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Appointment, AppointmentDetail, Columns, Doctor, Patient, row_mapper
+from repositories import APPOINTMENT_COLUMNS, AppointmentRepository, DoctorRepository, PatientRepository
+
+
+@pytest.fixture
+def booked(db):
+    pids = [PatientRepository.add(Patient(None, name, 30, 'F')) for name in ('Ann Lee', 'Bea Cho')]
+    dids = [DoctorRepository.add(Doctor(None, name, 'Cardiology')) for name in ('Dr. Bell', 'Dr. Chen')]
+    start = (datetime.now() + timedelta(days=3)).replace(hour=9, minute=0, second=0, microsecond=0)
+    AppointmentRepository.add_many([
+        Appointment(None, pids[n % 2], dids[n % 2], start + timedelta(hours=n), 'follow-up' if n % 3 else None)
+        for n in range(6)
+    ])
+
+
+def _as_rows(columns: Columns) -> list:
+    return [columns.row(i) for i in range(len(columns))]
+
+
+def _fields(rows: list, names: list) -> list:
+    return [tuple(getattr(row, name) for name in names) for row in rows]
+
+
+def test_detailed_columns_match_the_rows(booked):
+    rows = AppointmentRepository.get_detailed_list()
+    columns = AppointmentRepository.get_detailed_list(columnar=True)
+
+    assert len(columns) == len(rows) == 6
+    assert _as_rows(columns) == _fields(rows, columns.names())
+    assert [row_mapper(AppointmentDetail)(*columns.row(i)) for i in range(len(columns))] == rows
+    assert columns.datetimes('scheduled_at') == [d.scheduled_at for d in rows]
+
+
+def test_appointment_columns_match_the_rows(booked):
+    rows = AppointmentRepository.list_all(upcoming_only=True)
+    columns = AppointmentRepository.list_all(upcoming_only=True, columnar=True)
+
+    assert columns.names() == [name for name, _ in APPOINTMENT_COLUMNS]
+    assert _as_rows(columns) == _fields(rows, columns.names())
+    assert [row_mapper(Appointment)(*row) for row in _as_rows(columns)] == rows
+
+
+def test_columns_page_like_the_rows(booked):
+    first = AppointmentRepository.get_detailed_list(limit=4)
+    after = (first[-1].scheduled_at, first[-1].appointment_id)
+
+    rest = AppointmentRepository.get_detailed_list(*after, limit=4, columnar=True)
+    assert _as_rows(rest) == _fields(AppointmentRepository.get_detailed_list(*after, limit=4), rest.names())
+    assert len(rest) == 2
+
+
+def test_repeated_strings_are_shared(booked):
+    columns = AppointmentRepository.get_detailed_list(columnar=True)
+    names = columns['patient_name']
+
+    assert names[0] is names[2]
+    assert columns['notes'][0] is None
+    assert columns.nbytes() > 0
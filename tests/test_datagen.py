@@ -0,0 +1,30 @@
+from collections import Counter
+
+import datagen
+from blocking import AGE_TOLERANCE
+
+
+def test_same_seed_same_rows():
+    assert list(datagen.generate_patients(500, seed=4)) == list(datagen.generate_patients(500, seed=4))
+    assert list(datagen.generate_doctors(50, seed=4)) == list(datagen.generate_doctors(50, seed=4))
+
+
+def test_names_are_plain_and_common_ones_recur():
+    patients = list(datagen.generate_patients(20000))
+    assert not any(ch.isdigit() for p in patients for ch in p.name)
+    assert Counter(p.name for p in patients).most_common(1)[0][1] > 5
+
+
+def _collisions(patients) -> int:
+    # Patients whose name and gender an earlier one had within AGE_TOLERANCE years.
+    by_name, collisions = {}, 0
+    for p in patients:
+        ages = by_name.setdefault((p.name, p.gender), [])
+        collisions += any(abs(p.age - a) <= AGE_TOLERANCE for a in ages)
+        ages.append(p.age)
+    return collisions
+
+
+def test_only_the_duplicate_rate_collides_within_age_tolerance():
+    assert _collisions(datagen.generate_patients(20000, duplicate_rate=0)) == 0
+    assert 140 < _collisions(datagen.generate_patients(20000, duplicate_rate=0.01)) < 260
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import importer
+from models import Appointment, Doctor, Patient
+from repositories import AppointmentRepository, DoctorRepository, PatientRepository
+
+
+def _count_commits(db, monkeypatch) -> list:
+    # Rows inserted by each batch the backend commits.
+    commits = []
+    insert_many = db.backend.insert_many
+
+    def counting(conn, table, columns, rows, batch_size, on_batch=None, unless=None):
+        def hook(cur, batch, ids):
+            commits.append(sum(rid is not None for rid in ids))
+            return on_batch(cur, batch, ids) if on_batch else None
+        return insert_many(conn, table, columns, rows, batch_size, hook, unless)
+    monkeypatch.setattr(db.backend, 'insert_many', counting)
+    return commits
+
+
+def test_malformed_jsonl_line_is_rejected_not_fatal(db, tmp_path):
+    path = tmp_path / 'patients.jsonl'
+    path.write_text('{"name": "Ann Lee", "age": 34, "gender": "F"}\n'
+                    '{"name": "Bob Kim", "age": 41,\n'
+                    '\n'
+                    '{"name": "", "age": 50, "gender": "M"}\n'
+                    '{"name": "Cid Roy", "age": 29, "gender": "M"}\n', encoding='utf-8')
+
+    report = importer.import_file('patients', str(path), batch_size=2)
+    assert (report.rows_read, report.rows_inserted, report.rows_rejected) == (4, 2, 2)
+    assert [line for line, _ in report.errors] == [2, 4]
+    assert report.errors[0][1].startswith('Malformed JSON')
+    assert [p.name for p in PatientRepository.list_all()] == ['Ann Lee', 'Cid Roy']
+
+
+def test_batches_count_the_commits_add_many_makes(db, monkeypatch):
+    commits = _count_commits(db, monkeypatch)
+    rows = [(n, {'name': f'Patient {n}' if n % 8 else '', 'age': 30, 'gender': 'F'}) for n in range(1, 26)]
+
+    report = importer.import_rows('patients', iter(rows), batch_size=10)
+    assert (report.rows_inserted, report.rows_rejected) == (22, 3)
+    assert commits == [9, 9, 4]      # each window of 10 rows, less its invalid row
+    assert report.batches == 3
+
+
+def test_batch_left_empty_by_conflicts_is_not_counted(db, monkeypatch):
+    pid = PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+    did = DoctorRepository.add(Doctor(None, 'Dr. Bell', 'Cardiology'))
+    start = (datetime.now() + timedelta(days=7)).replace(hour=9, minute=0, second=0, microsecond=0)
+    AppointmentRepository.add(Appointment(None, pid, did, start, None, None, 120))
+    commits = _count_commits(db, monkeypatch)
+    at = lambda minutes: f'{start + timedelta(minutes=minutes):%Y-%m-%d %H:%M}'
+    rows = [(n, {'patient_id': pid, 'doctor_id': did, 'scheduled_at': at(minutes)})
+            for n, minutes in enumerate((0, 30, 120, 150), start=2)]
+
+    report = importer.import_rows('appointments', iter(rows), batch_size=2)
+    assert (report.rows_inserted, report.rows_rejected) == (2, 2)
+    assert commits == [0, 2]        # the first batch clashed entirely
+    assert report.batches == 1
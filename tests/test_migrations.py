@@ -0,0 +1,81 @@
+import pytest
+
+from migrations import LATEST_VERSION, MIGRATIONS, Migration, current_version, migrate
+
+
+@pytest.fixture
+def baseline(db, monkeypatch, tmp_path):
+    """A database left at migration 1 by an older release, with a row in it; the
+    module's backend points at it for the test."""
+    path = str(tmp_path / 'baseline.db')
+    db.close_pools()
+    monkeypatch.setattr(db.backend, 'path', path)
+    conn = db.backend.connect()
+    cur = conn.cursor()
+    for stmt in db.backend.schema:
+        cur.execute(stmt)
+    conn.commit()
+    assert migrate(conn, db.backend, target=1) == [1]
+    cur.execute("INSERT INTO patients (name, age, gender) VALUES ('Ann Lee', 34, 'F')")
+    conn.commit()
+    conn.close()
+    yield db
+    db.close_pools()
+
+
+def _stored(db):
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT MAX(version) FROM schema_version')
+        version = cur.fetchone()[0]
+        cur.execute('SELECT fingerprint FROM schema_fingerprint')
+        return version, cur.fetchone()[0]
+
+
+def test_baseline_database_upgrades_to_latest(baseline):
+    db = baseline
+    assert not db.schema_is_current()
+
+    db.initialize_db()
+    assert _stored(db) == (LATEST_VERSION, db.schema_fingerprint())
+    assert db.schema_is_current()
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        assert current_version(cur) == LATEST_VERSION
+        cur.execute('SELECT name FROM patients')
+        assert cur.fetchall() == [('Ann Lee',)]
+        # Objects from later migrations are in place.
+        cur.execute('SELECT COUNT(*) FROM appointments_history')
+        cur.execute('SELECT COUNT(*) FROM search_changes')
+
+
+def test_upgrade_applies_each_migration_once(baseline):
+    db = baseline
+    db.initialize_db()
+    with db.get_connection() as conn:
+        assert migrate(conn, db.backend) == []
+        cur = conn.cursor()
+        cur.execute('SELECT version FROM schema_version ORDER BY version')
+        assert [v for v, in cur.fetchall()] == [m.version for m in MIGRATIONS]
+
+
+def test_fingerprint_mismatch_is_reported_and_repaired(baseline):
+    db = baseline
+    db.initialize_db()
+    with db.get_connection() as conn:
+        conn.cursor().execute("UPDATE schema_fingerprint SET fingerprint = 'stale'")
+        conn.commit()
+    assert not db.schema_is_current()
+
+    db.initialize_db()
+    assert db.schema_is_current()
+
+
+def test_new_migration_changes_the_fingerprint(baseline, monkeypatch):
+    db = baseline
+    db.initialize_db()
+    before = db.schema_fingerprint()
+    monkeypatch.setattr(db, 'MIGRATIONS', MIGRATIONS + [Migration(LATEST_VERSION + 1, 'test', (), ('SELECT 1',))])
+
+    assert db.schema_fingerprint() != before
+    assert not db.schema_is_current()
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Doctor, Patient
+from repositories import AppointmentRepository, DoctorRepository, PatientRepository
+
+
+@pytest.fixture
+def tied(db):
+    """Appointments sharing a few scheduled_at values, live upcoming ones and archived
+    past ones, inserted with ids out of time order. Returns their ids by table."""
+    pid = PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+    dids = [DoctorRepository.add(Doctor(None, f'Dr. {n}', 'Cardiology')) for n in range(4)]
+    base = datetime.now().replace(second=0, microsecond=0)
+    future = [base + timedelta(days=d) for d in (3, 1, 2)]
+    past = [base - timedelta(days=d) for d in (5, 9)]
+    live, archived = [], []
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        for at in future:
+            for did in dids:
+                cur.execute('INSERT INTO appointments (patient_id, doctor_id, scheduled_at, duration_minutes) '
+                            'VALUES (?, ?, ?, 30)', (pid, did, at))
+                live.append(db.backend.last_insert_id(cur))
+        for n, at in enumerate(past * 3):
+            archived.append(10_000 + n)
+            cur.execute('INSERT INTO appointments_archive (id, patient_id, doctor_id, scheduled_at, '
+                        'duration_minutes) VALUES (?, ?, ?, ?, 30)', (archived[-1], pid, dids[n % 4], at))
+        conn.commit()
+    return live, archived
+
+
+def _pages(upcoming_only: bool, limit: int) -> list:
+    rows, after = [], (None, None)
+    while True:
+        page = AppointmentRepository.list_all(upcoming_only, *after, limit=limit)
+        rows.extend(page)
+        if len(page) < limit:
+            return rows
+        after = (page[-1].scheduled_at, page[-1].id)
+
+
+@pytest.mark.parametrize('limit', [1, 3, 4, 5])
+def test_upcoming_pages_cover_ties_once_oldest_first(tied, limit):
+    live, _ = tied
+    rows = _pages(True, limit)
+
+    keys = [(a.scheduled_at, a.id) for a in rows]
+    assert sorted(a.id for a in rows) == sorted(live)
+    assert keys == sorted(keys)
+
+
+@pytest.mark.parametrize('limit', [1, 3, 4, 5])
+def test_history_pages_cover_ties_once_newest_first(tied, limit):
+    live, archived = tied
+    rows = _pages(False, limit)
+
+    keys = [(a.scheduled_at, a.id) for a in rows]
+    assert sorted(a.id for a in rows) == sorted(live + archived)
+    assert keys == sorted(keys, reverse=True)
@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from pool import ConnectionPool, PoolClosed, PoolTimeout
+
+
+@pytest.fixture
+def connect(tmp_path):
+    path = str(tmp_path / 'pool.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE t (n INTEGER)')
+    return lambda: sqlite3.connect(path, check_same_thread=False)
+
+
+def test_checkout_is_lifo(connect):
+    pool = ConnectionPool(connect, min_size=0, max_size=3)
+    a, b = pool.acquire(), pool.acquire()
+    pool.release(a)
+    pool.release(b)
+
+    assert pool.acquire() is b
+    assert pool.acquire() is a
+    assert pool.stats()['created'] == 2
+
+
+def test_idle_connections_are_evicted_down_to_min_size(connect):
+    pool = ConnectionPool(connect, min_size=1, max_size=3, max_idle=0.05)
+    conns = [pool.acquire() for _ in range(3)]
+    for conn in conns:
+        pool.release(conn)
+    time.sleep(0.1)
+
+    assert pool.acquire() is conns[-1]
+    stats = pool.stats()
+    assert stats['evicted_idle'] == 2
+    assert (stats['size'], stats['in_use']) == (1, 1)
+
+
+def test_full_pool_times_out(connect):
+    pool = ConnectionPool(connect, min_size=0, max_size=1, timeout=0.05)
+    pool.acquire()
+
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert (pool.stats()['waits'], pool.stats()['timeouts']) == (1, 1)
+
+
+def test_full_pool_waits_for_a_release(connect):
+    pool = ConnectionPool(connect, min_size=0, max_size=1)
+    held = pool.acquire()
+    threading.Timer(0.05, pool.release, (held,)).start()
+
+    assert pool.acquire(timeout=5) is held
+    stats = pool.stats()
+    assert stats['waits'] == 1 and stats['timeouts'] == 0
+    assert stats['max_wait'] >= 0.04
+    assert stats['created'] == 1
+
+
+def test_release_rolls_back_an_open_transaction(connect):
+    pool = ConnectionPool(connect, min_size=0, max_size=1)
+    conn = pool.acquire()
+    conn.execute('INSERT INTO t VALUES (1)')
+    pool.release(conn)
+
+    again = pool.acquire()
+    assert again is conn
+    assert again.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+
+def test_dead_idle_connection_is_replaced_at_checkout(connect):
+    pool = ConnectionPool(connect, min_size=0, max_size=1, ping_after=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()
+
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert fresh.execute('SELECT 1').fetchone() == (1,)
+    assert pool.stats()['ping_failures'] == 1
+
+
+def test_closed_pool_refuses_checkouts(connect):
+    pool = ConnectionPool(connect, min_size=1, max_size=2)
+    pool.fill()
+    pool.close()
+
+    with pytest.raises(PoolClosed):
+        pool.acquire()
+    assert pool.stats()['idle'] == 0
@@ -0,0 +1,100 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import async_services
+from async_services import AsyncPatientService
+from models import Patient
+from repositories import PatientRepository
+
+
+@pytest.fixture
+def replica(db, monkeypatch, tmp_path):
+    """A replica that lags: a snapshot of the primary taken now, which later writes
+    never reach. Returns a function that writes to the primary as another process."""
+    path = str(tmp_path / 'replica.db')
+    with sqlite3.connect(db.backend.path) as src, sqlite3.connect(path) as dst:
+        src.backup(dst)
+    db.close_pools()
+    monkeypatch.setattr(db.backend, 'read_endpoint', path)
+    monkeypatch.setattr(db, 'READ_YOUR_WRITES', 5.0)
+    monkeypatch.setattr(db, '_breakers', {})
+    token = db._last_commit.set(None)
+
+    def elsewhere(name):
+        with sqlite3.connect(db.backend.path) as conn:
+            conn.execute("INSERT INTO patients (name, age, gender) VALUES (?, 40, 'F')", (name,))
+
+    yield elsewhere
+    db._last_commit.reset(token)
+    db.close_pools()
+
+
+def _names():
+    return [p.name for p in PatientRepository.list_all()]
+
+
+def _counted(db, fn):
+    before = db.read_stats()
+    result = fn()
+    after = db.read_stats()
+    return result, {k: after[k] - before[k] for k in after if after[k] != before[k]}
+
+
+def test_reads_go_to_the_replica(db, replica):
+    replica('Ann Lee')
+    assert _counted(db, _names) == ([], {'replica': 1})
+
+
+def test_reads_after_a_write_stay_on_the_primary(db, replica):
+    PatientRepository.add(Patient(None, 'Ann Lee', 40, 'F'))
+    assert _counted(db, _names) == (['Ann Lee'], {'read_your_writes': 1})
+
+    db._last_commit.set(time.monotonic() - 10)      # the window has passed
+    assert _counted(db, _names) == ([], {'replica': 1})
+
+
+def test_transaction_and_primary_reads_use_the_primary(db, replica):
+    replica('Ann Lee')
+    with db.transaction():
+        assert _counted(db, _names) == (['Ann Lee'], {})
+    with db.primary_reads():
+        assert _counted(db, _names) == (['Ann Lee'], {})
+
+
+def test_unreachable_replica_falls_back_to_the_primary(db, replica, monkeypatch, tmp_path):
+    monkeypatch.setattr(db.backend, 'read_endpoint', str(tmp_path / 'missing' / 'replica.db'))
+    replica('Ann Lee')
+    assert _counted(db, _names) == (['Ann Lee'], {'fallback': 1})
+
+
+def test_async_read_your_writes_follows_the_task(db, replica, monkeypatch):
+    # One pool thread, so the writer's and the bystander's calls share it.
+    monkeypatch.setattr(async_services, '_executor', ThreadPoolExecutor(max_workers=1))
+
+    wrote_event = None
+
+    async def writer():
+        await AsyncPatientService.create('Ann Lee', '40', 'F')
+        wrote_event.set()
+        return [p.name for p in await AsyncPatientService.list_all()]
+
+    async def bystander():
+        await wrote_event.wait()
+        return [p.name for p in await AsyncPatientService.list_all()]
+
+    async def main():
+        nonlocal wrote_event
+        wrote_event = asyncio.Event()
+        return await asyncio.gather(writer(), bystander())
+
+    try:
+        wrote, other = asyncio.run(main())
+    finally:
+        async_services.shutdown()
+    assert wrote == ['Ann Lee']
+    assert other == []
+    assert db._last_commit.get() is None        # the test's own context never wrote
@@ -0,0 +1,229 @@
+import random
+import sqlite3
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpen, backoff_delay, call_with_retry
+
+
+class DriverError(Exception):
+    """Shaped like pyodbc.Error: (sqlstate, message)."""
+
+
+LINK_FAILURE = DriverError('08S01', '[08S01] Communication link failure (10054)')
+BAD_LOGIN = DriverError('28000', "[28000] Login failed for user 'app' (18456)")
+
+
+class FakeDriver:
+    """Stands in for the driver's connect(): raises the scripted errors in turn, then
+    opens real SQLite connections."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.connections = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self.connections.append(sqlite3.connect(*args, **kwargs))
+        return self.connections[-1]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def driver(db, monkeypatch):
+    # Fresh pools and breakers, with every new connection going through the fake driver.
+    def install(*errors):
+        fake = FakeDriver(*errors)
+        monkeypatch.setattr(db.backend, 'driver_connect', fake)
+        return fake
+
+    db.close_pools()
+    monkeypatch.setattr(db, '_breakers', {})
+    yield install
+    db.close_pools()
+
+
+# --- call_with_retry --- #
+
+def test_non_transient_error_is_not_retried():
+    calls, sleeps = [], []
+
+    def fn():
+        calls.append(1)
+        raise BAD_LOGIN
+
+    with pytest.raises(DriverError):
+        call_with_retry(fn, max_attempts=5, sleep=sleeps.append)
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_transient_error_is_retried_until_attempts_run_out():
+    calls, sleeps = [], []
+
+    def fn():
+        calls.append(1)
+        raise LINK_FAILURE
+
+    with pytest.raises(DriverError):
+        call_with_retry(fn, max_attempts=4, base_delay=0.1, max_delay=2.0, sleep=sleeps.append)
+    assert len(calls) == 4 and len(sleeps) == 3
+
+
+def test_backoff_stays_within_full_jitter_bounds():
+    rng = random.Random(7)
+    for attempt in range(12):
+        bound = min(2.0, 0.1 * 2 ** attempt)
+        delays = [backoff_delay(attempt, 0.1, 2.0, rng) for _ in range(500)]
+        assert all(0 <= d <= bound for d in delays)
+        # Full jitter covers the whole range, not just its top.
+        assert min(delays) < bound * 0.1 and max(delays) > bound * 0.9
+
+
+def test_retry_sleeps_follow_the_backoff_schedule():
+    sleeps = []
+    outcomes = [LINK_FAILURE] * 6
+
+    def fn():
+        if outcomes:
+            raise outcomes.pop(0)
+        return 'ok'
+
+    assert call_with_retry(fn, max_attempts=7, base_delay=0.1, max_delay=0.5, sleep=sleeps.append,
+                           rng=random.Random(3)) == 'ok'
+    assert len(sleeps) == 6
+    for attempt, delay in enumerate(sleeps):
+        assert 0 <= delay <= min(0.5, 0.1 * 2 ** attempt)
+
+
+# --- CircuitBreaker --- #
+
+def test_breaker_opens_probes_once_then_closes():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise LINK_FAILURE
+
+    for _ in range(2):
+        with pytest.raises(DriverError):
+            call_with_retry(failing, max_attempts=1, breaker=breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpen):
+        call_with_retry(failing, max_attempts=1, breaker=breaker)
+    assert len(calls) == 2
+
+    clock.now = 10
+    breaker.before_call()                   # the one half-open probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()               # everyone else while it is in flight
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert call_with_retry(lambda: 'ok', breaker=breaker) == 'ok'
+    stats = breaker.stats()
+    assert (stats['opened'], stats['probes'], stats['rejected']) == (1, 1, 2)
+
+
+def test_failed_probe_reopens_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    with pytest.raises(DriverError):
+        call_with_retry(lambda: (_ for _ in ()).throw(LINK_FAILURE), max_attempts=1, breaker=breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 15
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+# --- get_connection --- #
+
+def test_get_connection_retries_transient_connect_errors(db, driver):
+    fake = driver(LINK_FAILURE, LINK_FAILURE)
+    with db.get_connection() as conn:
+        conn.cursor().execute('SELECT 1')
+    assert fake.calls == 3
+
+
+def test_get_connection_does_not_retry_non_transient_connect_errors(db, driver):
+    fake = driver(BAD_LOGIN)
+    with pytest.raises(DriverError):
+        with db.get_connection():
+            pass
+    assert fake.calls == 1
+
+
+def test_error_inside_the_block_is_never_retried(db, driver):
+    fake = driver()
+    runs = []
+    with pytest.raises(DriverError):
+        with db.get_connection():
+            runs.append(1)
+            raise LINK_FAILURE
+    assert runs == [1] and fake.calls == 1
+    assert db.get_breaker().state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_fails_fast_without_connecting(db, driver, monkeypatch):
+    monkeypatch.setattr(db, 'BREAKER_THRESHOLD', 2)
+    fake = driver(*[LINK_FAILURE] * 2)
+    with pytest.raises(DriverError):
+        with db.get_connection(max_retries=2):
+            pass
+    assert fake.calls == 2
+    with pytest.raises(CircuitOpen):
+        with db.get_connection():
+            pass
+    assert fake.calls == 2
+
+
+def _half_open(db, monkeypatch, fake):
+    # One pooled connection left idle, then the breaker opened and its reset timeout
+    # already over; the idle connection is well within DB_POOL_PING_AFTER.
+    with db.get_connection():
+        pass
+    monkeypatch.setattr(db, 'BREAKER_RESET', 0)
+    monkeypatch.setattr(db, '_breakers', {})
+    breaker = db.get_breaker()
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    fake.connections[-1].close()            # the server went away under it
+    return breaker
+
+
+def test_half_open_probe_is_not_served_by_a_dead_idle_connection(db, driver, monkeypatch):
+    fake = driver()
+    breaker = _half_open(db, monkeypatch, fake)
+    fake.errors.append(LINK_FAILURE)        # and is still down
+
+    with pytest.raises(DriverError):
+        with db.get_connection(max_retries=1):
+            pass
+    assert fake.calls == 2
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_probe_reconnects_when_the_server_is_back(db, driver, monkeypatch):
+    fake = driver()
+    breaker = _half_open(db, monkeypatch, fake)
+
+    with db.get_connection(max_retries=1) as conn:
+        conn.cursor().execute('SELECT 1')
+    assert fake.calls == 2
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert db.get_pool().stats()['ping_failures'] == 1
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import importer
+import validation
+from models import MAX_APPOINTMENT_MINUTES, Appointment, Doctor, Patient
+from repositories import AppointmentRepository, DoctorRepository, PatientRepository
+from scheduling import SchedulingConflict
+from services import AppointmentService
+
+
+@pytest.fixture
+def booking(db):
+    pid = PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+    did = DoctorRepository.add(Doctor(None, 'Dr. Bell', 'Cardiology'))
+    start = (datetime.now() + timedelta(days=7)).replace(hour=9, minute=0, second=0, microsecond=0)
+    return pid, did, start
+
+
+def _insert_elsewhere(db, pid, did, start, minutes=30):
+    # A booking committed by another process: straight into the table, unseen by this
+    # process's booking index.
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('INSERT INTO appointments (patient_id, doctor_id, scheduled_at, duration_minutes) '
+                    'VALUES (?, ?, ?, ?)', (pid, did, start, minutes))
+        conn.commit()
+
+
+def test_overlap_booked_by_another_process_is_rejected(db, booking):
+    pid, did, start = booking
+    AppointmentService.schedule(str(pid), str(did), f'{start - timedelta(hours=2):%Y-%m-%d %H:%M}')
+    assert AppointmentRepository.index.loaded
+    _insert_elsewhere(db, pid, did, start, 60)
+
+    with pytest.raises(SchedulingConflict):
+        AppointmentService.schedule(str(pid), str(did), f'{start + timedelta(minutes=30):%Y-%m-%d %H:%M}')
+    # The stale index is dropped, so the next check sees the other booking too.
+    assert AppointmentRepository.find_conflicts(did, start, 30)
+
+
+def test_adjacent_and_other_doctor_slots_are_free(db, booking):
+    pid, did, start = booking
+    other = DoctorRepository.add(Doctor(None, 'Dr. Chen', 'Cardiology'))
+    AppointmentRepository.add(Appointment(None, pid, did, start, None, None, 30))
+
+    AppointmentRepository.add(Appointment(None, pid, did, start + timedelta(minutes=30), None, None, 30))
+    AppointmentRepository.add(Appointment(None, pid, other, start, None, None, 30))
+    with pytest.raises(SchedulingConflict):
+        AppointmentRepository.add(Appointment(None, pid, did, start - timedelta(minutes=15), None, None, 30))
+
+
+def test_import_rejects_overlapping_appointments(db, booking):
+    pid, did, start = booking
+    other = DoctorRepository.add(Doctor(None, 'Dr. Chen', 'Cardiology'))
+    _insert_elsewhere(db, pid, did, start - timedelta(hours=2), 60)
+    at = lambda t: f'{t:%Y-%m-%d %H:%M}'
+    rows = [
+        (2, {'patient_id': pid, 'doctor_id': did, 'scheduled_at': at(start), 'duration_minutes': '60'}),
+        (3, {'patient_id': pid, 'doctor_id': did, 'scheduled_at': at(start + timedelta(minutes=30))}),
+        (4, {'patient_id': pid, 'doctor_id': other, 'scheduled_at': at(start + timedelta(minutes=30))}),
+        (5, {'patient_id': pid, 'doctor_id': did, 'scheduled_at': at(start - timedelta(minutes=90))}),
+    ]
+
+    report = importer.import_rows('appointments', iter(rows), batch_size=2)
+    assert (report.rows_inserted, report.rows_rejected) == (2, 2)
+    assert [line for line, _ in report.errors] == [3, 5]
+    assert all('already booked' in msg for _, msg in report.errors)
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*) FROM appointments WHERE doctor_id = ?', (did,))
+        assert cur.fetchone()[0] == 2
+
+
+def test_durations_stay_within_the_conflict_lookbehind():
+    with pytest.raises(ValueError, match='Duration cannot exceed'):
+        validation.check_appointment('1', '2', '2090-01-07 09:00', None, str(MAX_APPOINTMENT_MINUTES + 1))
+    assert AppointmentRepository.CONFLICT_LOOKBEHIND >= timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+
+
+def test_conflict_reloads_only_that_doctor(db, booking, monkeypatch):
+    pid, did, start = booking
+    other = DoctorRepository.add(Doctor(None, 'Dr. Chen', 'Cardiology'))
+    AppointmentRepository.find_conflicts(did, start, 30)        # load the booking index
+    kept = AppointmentRepository.add(Appointment(None, pid, other, start, None, None, 30))
+    _insert_elsewhere(db, pid, did, start, 60)
+    loads = []
+    loader = AppointmentRepository.index._loader
+    monkeypatch.setattr(AppointmentRepository.index, '_loader',
+                        lambda since, d: loads.append(d) or loader(since, d))
+
+    with pytest.raises(SchedulingConflict):
+        AppointmentRepository.add(Appointment(None, pid, did, start + timedelta(minutes=15), None, None, 30))
+    assert loads == [did]
+    assert AppointmentRepository.find_conflicts(other, start, 30) == [kept]
+    assert AppointmentRepository.find_conflicts(did, start, 30)
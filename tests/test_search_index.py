@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+import repositories
+from models import Doctor, Patient
+from repositories import DoctorRepository, PatientRepository
+
+
+def _names(query):
+    return [p.name for p in PatientRepository.iter_search_by_name(query)]
+
+
+def _elsewhere(db, *statements):
+    # Writes made by another process running the same repositories: the rows change
+    # and the change is logged, but this process's index hooks never run.
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        for sql, params in statements:
+            cur.execute(sql, params)
+        conn.commit()
+
+
+def _logged(pid, op='U'):
+    return 'INSERT INTO search_changes (name, row_id, op) VALUES (?, ?, ?)', ('patients', pid, op)
+
+
+def _count_loads(index, monkeypatch) -> list:
+    loads = []
+    loader = index._loader
+    monkeypatch.setattr(index, '_loader', lambda after_id: loads.append(after_id) or loader(after_id))
+    return loads
+
+
+@pytest.fixture
+def patients(db):
+    return [PatientRepository.add(Patient(None, name, 40, 'F'))
+            for name in ('Ann Lee', 'Maria Lopez', 'Mark Hill')]
+
+
+def test_rename_elsewhere_is_found(db, patients):
+    assert _names('lee') == ['Ann Lee']
+    _elsewhere(db, ('UPDATE patients SET name = ? WHERE id = ?', ('Mark Leeds', patients[2])), _logged(patients[2]))
+    assert _names('lee') == ['Ann Lee', 'Mark Leeds']
+    assert PatientRepository.name_index.similar('Mark Leeds')[0][0] == patients[2]
+
+
+def test_delete_elsewhere_drops_from_similar(db, patients):
+    assert PatientRepository.name_index.similar('Maria Lopez')
+    _elsewhere(db, ('DELETE FROM patients WHERE id = ?', (patients[1],)), _logged(patients[1], 'D'))
+    assert PatientRepository.name_index.similar('Maria Lopez') == []
+
+
+def test_insert_elsewhere_is_found_at_once(db, patients):
+    assert _names('ann') == ['Ann Lee']
+    _elsewhere(db, ('INSERT INTO patients (name, age, gender) VALUES (?, ?, ?)', ('Joanna Fox', 30, 'F')))
+    assert _names('ann') == ['Ann Lee', 'Joanna Fox']
+
+
+def test_own_changes_do_not_rebuild(db, patients, monkeypatch):
+    assert _names('lee') == ['Ann Lee']
+    loads = _count_loads(PatientRepository.name_index, monkeypatch)
+
+    PatientRepository.update(Patient(patients[2], 'Mark Leeds', 40, 'F'))
+    PatientRepository.delete(patients[0])
+    assert _names('lee') == ['Mark Leeds']
+    assert loads == []
+
+
+def test_changes_elsewhere_apply_without_a_rebuild(db, patients, monkeypatch):
+    assert _names('lee') == ['Ann Lee']
+    index = PatientRepository.name_index
+    loads = _count_loads(index, monkeypatch)
+    _elsewhere(db, ('UPDATE patients SET name = ? WHERE id = ?', ('Mark Leeds', patients[2])), _logged(patients[2]),
+               ('DELETE FROM patients WHERE id = ?', (patients[0],)), _logged(patients[0], 'D'))
+
+    assert _names('lee') == ['Mark Leeds']
+    assert None not in loads and len(index) == 2
+
+
+def test_pruned_log_rebuilds(db, patients, monkeypatch):
+    assert _names('lee') == ['Ann Lee']
+    index = PatientRepository.name_index
+    _elsewhere(db, ('UPDATE patients SET name = ? WHERE id = ?', ('Mark Leeds', patients[2])), _logged(patients[2]),
+               ('UPDATE patients SET name = ? WHERE id = ?', ('Ann Leigh', patients[0])), _logged(patients[0]))
+    report = archive.prune_search_log(horizon_days=1, now=datetime.now() + timedelta(days=2))
+    assert report.rows_moved >= 1          # all but the newest entry
+    loads = _count_loads(index, monkeypatch)
+
+    assert _names('lee') == ['Mark Leeds']
+    assert _names('leigh') == ['Ann Leigh']
+    assert loads[0] is None
+
+
+QUERIES = ['', ' ', 'a', 'ol', 'ology', 'CARD', 'ann l', 'Lee', 'xyz']
+
+
+def test_index_results_match_like(db, patients, monkeypatch):
+    for specialty in ('Cardiology', None, 'Neurology', '', 'cardiac surgery'):
+        DoctorRepository.add(Doctor(None, 'Dr. Bell', specialty))
+
+    def both(search, query):
+        indexed = [row.id for row in search(query)]
+        monkeypatch.setattr(repositories, 'SEARCH_INDEX_ENABLED', False)
+        like = [row.id for row in search(query)]
+        monkeypatch.setattr(repositories, 'SEARCH_INDEX_ENABLED', True)
+        return indexed, like
+
+    for query in QUERIES:
+        for search in (PatientRepository.search_by_name, DoctorRepository.search_by_specialist):
+            indexed, like = both(search, query)
+            assert indexed == like, (search.__name__, query)
+    assert len(DoctorRepository.specialty_index) == 4
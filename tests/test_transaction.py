@@ -0,0 +1,77 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Appointment, Doctor, Patient
+from repositories import AppointmentRepository, DoctorRepository, PatientRepository
+
+
+class _Boom(Exception):
+    pass
+
+
+def _committed_names(db):
+    # What another process sees: only committed rows.
+    with sqlite3.connect(db.backend.path) as conn:
+        return [name for name, in conn.execute('SELECT name FROM patients ORDER BY id')]
+
+
+def test_nested_blocks_commit_once_at_the_end(db):
+    events = []
+    with db.transaction() as outer:
+        PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+        with db.transaction() as inner:
+            assert inner is outer
+            PatientRepository.add(Patient(None, 'Bob Kim', 41, 'M'))
+            db.on_commit(lambda: events.append('inner'))
+        assert _committed_names(db) == []
+        db.on_commit(lambda: events.append('outer'))
+        assert events == []
+    assert _committed_names(db) == ['Ann Lee', 'Bob Kim']
+    assert events == ['inner', 'outer']
+
+
+def test_on_commit_runs_at_once_outside_a_transaction(db):
+    events = []
+    db.on_commit(lambda: events.append('now'))
+    db.on_rollback(lambda: events.append('never'))
+    assert events == ['now'] and not db.in_transaction()
+
+
+def test_exception_rolls_back_and_fires_only_on_rollback(db):
+    events = []
+    with pytest.raises(_Boom):
+        with db.transaction():
+            PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+            db.on_commit(lambda: events.append('commit'))
+            db.on_rollback(lambda: events.append('rollback'))
+            raise _Boom
+    assert _committed_names(db) == []
+    assert events == ['rollback']
+    assert not db.in_transaction()
+
+
+def test_rolled_back_writes_leave_caches_and_indexes_alone(db):
+    pid = PatientRepository.add(Patient(None, 'Ann Lee', 34, 'F'))
+    did = DoctorRepository.add(Doctor(None, 'Dr. Bell', 'Cardiology'))
+    start = (datetime.now() + timedelta(days=7)).replace(hour=9, minute=0, second=0, microsecond=0)
+    assert PatientRepository.get_by_id(pid).name == 'Ann Lee'
+    assert [p.id for p in PatientRepository.search_by_name('Ann')] == [pid]
+    assert not AppointmentRepository.find_conflicts(did, start, 30)
+    indexed = len(PatientRepository.name_index)
+
+    with pytest.raises(_Boom):
+        with db.transaction():
+            PatientRepository.update(Patient(pid, 'Ann Lee-Park', 35, 'F'))
+            PatientRepository.add(Patient(None, 'Zed Quinn', 50, 'M'))
+            AppointmentRepository.add(Appointment(None, pid, did, start, None, None, 30))
+            assert PatientRepository.get_by_id(pid).name == 'Ann Lee-Park'
+            raise _Boom
+
+    assert PatientRepository.get_by_id(pid).name == 'Ann Lee'
+    assert len(PatientRepository.name_index) == indexed
+    assert [p.id for p in PatientRepository.search_by_name('Ann Lee')] == [pid]
+    assert PatientRepository.search_by_name('Zed') == []
+    assert not AppointmentRepository.find_conflicts(did, start, 30)
+    assert AppointmentRepository.index.loaded
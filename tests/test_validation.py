@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+import importer
+import validation
+from services import AppointmentService, DoctorService, PatientService
+from utils import DatetimeParser, parse_datetime
+
+EDGE_DATETIMES = [
+    '2030-01-07 09:05', '2030-1-7 9:5', '2030-01-07', ' 7-01-2030', '7-1-2030 09:05', '2030-01- 7',
+    '2030-01- 7 9:05', '2030-01-07  9:05', '2030-01-07\t09:05', '07-01-2030  9:05', '0999-01-01',
+    '٢٠٣٠-01-07', '2030-01-07 24:00', '2030-02-30', '2030-01-07 09:60', '2030-01-07 ', '  2030-01-07',
+    '07-01-2030 9: 5', '2030-01-07 09:05:00', '2030-01-07T09:05', '2030-01-07 9', ' 7- 1-2030',
+    '2030- 1- 7 9:05', '', 'tomorrow',
+]
+
+
+def _outcome(parse, value):
+    try:
+        return parse(value)
+    except ValueError as e:
+        return str(e)
+
+
+def test_datetime_parser_matches_strptime_on_edge_inputs():
+    for first in ('2030-01-07 09:00', '07-01-2030'):
+        parser = DatetimeParser()
+        parser(first)
+        for value in EDGE_DATETIMES:
+            assert _outcome(parser, value) == _outcome(parse_datetime, value), value
+
+
+def test_datetime_parser_matches_strptime_on_random_inputs():
+    rng = random.Random(5)
+    parser = DatetimeParser()
+    for _ in range(2000):
+        d, m, y = (rng.choice([str(n), f'{n:02d}', f'{n:2d}']) for n in (rng.randint(0, 32), rng.randint(0, 13), 2030))
+        hh, mm = (rng.choice([str(n), f'{n:02d}', f'{n:2d}']) for n in (rng.randint(0, 25), rng.randint(0, 61)))
+        value = rng.choice([f'{y}-{m}-{d}', f'{d}-{m}-{y}']) + rng.choice(['', f' {hh}:{mm}', f'  {hh}:{mm}'])
+        assert _outcome(parser, value) == _outcome(parse_datetime, value), value
+
+
+@pytest.mark.parametrize('row, call', [
+    ({'name': 'Ann', 'age': '0', 'gender': 'F'}, lambda: PatientService.validate('Ann', '0', 'F')),
+    ({'name': ' ', 'age': '4', 'gender': 'F'}, lambda: PatientService.validate(' ', '4', 'F')),
+    ({'name': 'Ann', 'age': '4', 'gender': 'X'}, lambda: PatientService.validate('Ann', '4', 'X')),
+    ({'name': 'Ann', 'age': 'four', 'gender': 'F'}, lambda: PatientService.validate('Ann', 'four', 'F')),
+])
+def test_batch_and_service_share_patient_rules(row, call):
+    [(_, message)] = validation.validate_batch('patients', [row], workers=0).errors
+    with pytest.raises(ValueError, match=message):
+        call()
+
+
+def test_batch_and_service_build_the_same_records():
+    patient = {'name': ' Ann Lee ', 'age': '34', 'gender': ' F '}
+    doctor = {'name': 'Dr. Bell', 'specialty': ' Cardiology '}
+    appointment = {'patient_id': '1', 'doctor_id': '2', 'scheduled_at': '2090-01-07 09:00', 'notes': 'x',
+                   'duration_minutes': '45'}
+    assert validation.validate_batch('patients', [patient]).valid == [PatientService.validate(*patient.values())]
+    assert validation.validate_batch('doctors', [doctor]).valid == [DoctorService.validate(*doctor.values())]
+    assert validation.validate_batch('appointments', [appointment]).valid == [
+        AppointmentService.validate(*appointment.values())]
+
+
+def test_importer_gives_workers_a_full_parallel_window(monkeypatch):
+    sizes = []
+
+    def validate_batch(entity, rows, workers=None):
+        sizes.append(len(rows))
+        return validation.BatchResult()
+    monkeypatch.setattr(importer, 'validate_batch', validate_batch)
+    monkeypatch.setattr(importer, 'PARALLEL_MIN_ROWS', 50)
+    rows = ((n, {}) for n in range(120))
+
+    report = importer.import_rows('patients', rows, batch_size=10, workers=2)
+    assert sizes == [50, 50, 20] and report.batches == 0      # nothing valid, nothing committed
+    sizes.clear()
+    importer.import_rows('patients', ((n, {}) for n in range(25)), batch_size=10, workers=1)
+    assert sizes == [10, 10, 5]
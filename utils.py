@@ -1,5 +1,6 @@
+import re
 from datetime import datetime 
-from typing import Optional 
+from typing import Iterable, Iterator, List, Optional 
 
 def parse_int(value: str) -> Optional[int]:
     try:
@@ -8,11 +9,60 @@ def parse_int(value: str) -> Optional[int]:
     except ValueError :
         raise ValueError(f'Invalid Integer: {value}')
     
+DATETIME_FORMATS = ['%Y-%m-%d %H:%M', '%Y-%m-%d', '%d-%m-%Y %H:%M',  '%d-%m-%Y']
+
 def parse_datetime(value: str) -> datetime:
-    fmts = ['%Y-%m-%d %H:%M', '%Y-%m-%d', '%d-%m-%Y %H:%M',  '%d-%m-%Y']
+    fmts = DATETIME_FORMATS
     for f in fmts:
         try:
             return datetime.strptime(value,f)
         except ValueError :
             continue
     raise ValueError(f'Invalid datetime. Expected formats: {fmts}')
+
+
+# The same formats as precompiled patterns -> order of (year, month, day, hour, minute) in the match.
+_DATETIME_PATTERNS = [
+    (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})\s+(\d{1,2}):(\d{1,2})'), (0, 1, 2, 3, 4)),
+    (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})'), (0, 1, 2)),
+    (re.compile(r'(\d{1,2})-(\d{1,2})-(\d{4})\s+(\d{1,2}):(\d{1,2})'), (2, 1, 0, 3, 4)),
+    (re.compile(r'(\d{1,2})-(\d{1,2})-(\d{4})'), (2, 1, 0)),
+]
+
+
+class DatetimeParser:
+    """parse_datetime for a column of values: the format of the first value is kept and
+    tried first on the next ones, so a uniform column costs one regex match per value
+    instead of a strptime per format tried. A value the patterns miss or cannot turn
+    into a datetime goes to parse_datetime, so it accepts and rejects exactly what
+    parse_datetime does."""
+
+    def __init__(self):
+        self._pattern, self._order = _DATETIME_PATTERNS[0]
+
+    def __call__(self, value: str) -> datetime:
+        m = self._pattern.fullmatch(value)
+        if m is None:
+            for pattern, order in _DATETIME_PATTERNS:
+                m = pattern.fullmatch(value)
+                if m is not None:
+                    self._pattern, self._order = pattern, order
+                    break
+            else:
+                return parse_datetime(value)
+        parts = m.groups()
+        try:
+            return datetime(*[int(parts[i]) for i in self._order])
+        except ValueError:
+            return parse_datetime(value)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,183 @@
+"""Validation rules for patient, doctor and appointment records, one at a time or in batches.
+
+check_patient, check_doctor and check_appointment hold the rules and messages;
+PatientService/DoctorService/AppointmentService.validate call them for console
+input, and validate_batch calls them for every row of an import:
+
+    result = validate_batch('appointments', rows)      # rows: dicts keyed like the import files
+    result.valid       # [Appointment, ...], ready for add_many
+    result.rows        # index in `rows` of each of them
+    result.errors      # [(row index, message), ...]
+
+A batch reports every bad row instead of raising on the first one. Ids and
+numbers take an isdecimal() fast path, and datetimes a DatetimeParser per
+column, which detects the format once. With workers > 1, batches of at least
+PARALLEL_MIN_ROWS rows are split across a process pool; the importer validates
+that many rows at a time when workers are used, whatever its batch size. This
+module only imports models and utils, so workers start without a database
+connection.
+"""
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from models import Patient, Doctor, Appointment, DEFAULT_APPOINTMENT_MINUTES, MAX_APPOINTMENT_MINUTES
+from utils import DatetimeParser, chunked, parse_datetime, parse_int
+
+GENDERS = frozenset(('M', 'F', 'Other', 'O'))
+VALIDATION_WORKERS = int(os.getenv('VALIDATION_WORKERS', '0'))
+PARALLEL_MIN_ROWS = 20000
+PARALLEL_CHUNK_SIZE = 5000
+
+
+@dataclass
+class BatchResult:
+    # Parallel lists rather than (index, model) pairs: one tuple less per row.
+    valid: list = field(default_factory=list)
+    rows: List[int] = field(default_factory=list)
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    def extend(self, other: 'BatchResult'):
+        self.valid.extend(other.valid)
+        self.rows.extend(other.rows)
+        self.errors.extend(other.errors)
+
+
+def _text(row: dict, key: str) -> str:
+    value = row.get(key)
+    return '' if value is None else str(value)
+
+
+def _int(value: str) -> int:
+    # parse_int, without the exception machinery for plain digit strings.
+    return int(value) if value.isdecimal() else parse_int(value)
+
+
+def check_patient(name: str, age_raw: str, gender: str, pid: Optional[int] = None) -> Patient:
+    age = _int(age_raw)
+    if age <= 0:
+        raise ValueError('Age must be a positive integer')
+    name = name.strip()
+    if not name:
+        raise ValueError('Name cannot be empty')
+    gender = gender.strip()
+    if gender not in GENDERS:
+        raise ValueError('Gender must be M, F, or Other')
+    return Patient(id=pid, name=name, age=age, gender=gender)
+
+
+def check_doctor(name: str, specialty: str, did: Optional[int] = None) -> Doctor:
+    name = name.strip()
+    if not name:
+        raise ValueError('Doctor name cannot be empty')
+    specialty = specialty.strip()
+    if not specialty:
+        raise ValueError('Specialty cannot be empty')
+    return Doctor(id=did, name=name, specialty=specialty)
+
+
+def check_appointment(patient_id_raw: str, doctor_id_raw: str, dt_raw: str, notes: Optional[str] = None,
+                      duration_raw: Optional[str] = None,
+                      parse_datetime: Callable[[str], datetime] = parse_datetime,
+                      now: Optional[datetime] = None) -> Appointment:
+    pid = _int(patient_id_raw)
+    did = _int(doctor_id_raw)
+    scheduled = parse_datetime(dt_raw)
+    duration = _int(duration_raw) if duration_raw else DEFAULT_APPOINTMENT_MINUTES
+    if pid <= 0:
+        raise ValueError('Invalid patient id')
+    if did <= 0:
+        raise ValueError('Invalid doctor id')
+    if scheduled < (now or datetime.now()):
+        raise ValueError('Cannot schedule an appointment in the past')
+    if duration <= 0:
+        raise ValueError('Duration must be a positive number of minutes')
+    if duration > MAX_APPOINTMENT_MINUTES:
+        raise ValueError(f'Duration cannot exceed {MAX_APPOINTMENT_MINUTES} minutes')
+    return Appointment(id=None, patient_id=pid, doctor_id=did, scheduled_at=scheduled, notes=notes,
+                       duration_minutes=duration)
+
+
+def _patient(row: dict) -> Patient:
+    return check_patient(_text(row, 'name'), _text(row, 'age'), _text(row, 'gender'))
+
+
+def _doctor(row: dict) -> Doctor:
+    return check_doctor(_text(row, 'name'), _text(row, 'specialty'))
+
+
+def _appointment_validator() -> Callable[[dict], Appointment]:
+    parse_column = DatetimeParser()
+    now = datetime.now()
+
+    def validate(row: dict) -> Appointment:
+        return check_appointment(_text(row, 'patient_id'), _text(row, 'doctor_id'), _text(row, 'scheduled_at'),
+                                 row.get('notes') or None, _text(row, 'duration_minutes'), parse_column, now)
+    return validate
+
+
+# entity -> factory of a row validator; a fresh one per batch, so per-column state
+# (the detected datetime format, "now") is shared by the rows of one batch only.
+VALIDATORS: Dict[str, Callable[[], Callable[[dict], object]]] = {
+    'patients': lambda: _patient,
+    'doctors': lambda: _doctor,
+    'appointments': _appointment_validator,
+}
+
+
+def _validate(entity: str, rows: Sequence[dict], offset: int = 0) -> BatchResult:
+    validate = VALIDATORS[entity]()
+    result = BatchResult()
+    valid, valid_rows, errors = result.valid.append, result.rows.append, result.errors.append
+    for i, row in enumerate(rows, start=offset):
+        try:
+            valid(validate(row))
+            valid_rows(i)
+        except (ValueError, AttributeError, TypeError) as e:
+            errors((i, str(e)))
+    return result
+
+
+def _validate_chunk(args: Tuple[str, Sequence[dict], int]) -> BatchResult:
+    return _validate(*args)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # Kept between calls: the importer validates one batch at a time.
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown()
+        _pool, _pool_workers = ProcessPoolExecutor(max_workers=workers), workers
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+atexit.register(shutdown)
+
+
+def validate_batch(entity: str, rows: Sequence[dict], workers: Optional[int] = None) -> BatchResult:
+    """Validate every row; results are in row order and carry each row's index in `rows`."""
+    if entity not in VALIDATORS:
+        raise ValueError(f'Unknown entity: {entity}. Expected one of {sorted(VALIDATORS)}')
+    workers = VALIDATION_WORKERS if workers is None else workers
+    if workers <= 1 or len(rows) < PARALLEL_MIN_ROWS:
+        return _validate(entity, rows)
+    tasks = [(entity, chunk, n * PARALLEL_CHUNK_SIZE) for n, chunk in enumerate(chunked(rows, PARALLEL_CHUNK_SIZE))]
+    result = BatchResult()
+    for part in _get_pool(workers).map(_validate_chunk, tasks):
+        result.extend(part)
+    return result
+